@@ -15,3 +15,82 @@ DB_NAME = os.getenv("DB_NAME")
 
 DATASET_FILE = os.getenv("DATASET_FILE", "client_dataset.csv")
 OUTPUT_FILE = os.getenv("OUTPUT_FILE", "matching_results.xlsx")
+
+BLOCKING_INDEX_PATH = os.getenv("BLOCKING_INDEX_PATH", "blocking_index.pkl")
+# 0 scans the whole dataset; tune K with the recall check
+# (python -m app.services.blocking_index) before enabling blocking
+BLOCKING_TOP_K = int(os.getenv("BLOCKING_TOP_K", "0"))
+
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".dataset_cache")
+
+EXTRACTION_MAX_IN_FLIGHT = int(os.getenv("EXTRACTION_MAX_IN_FLIGHT", "4"))
+DOCUMENTAI_QPS = float(os.getenv("DOCUMENTAI_QPS", "2"))
+EXTRACTION_MAX_RETRIES = int(os.getenv("EXTRACTION_MAX_RETRIES", "5"))
+EXTRACTION_BACKOFF_BASE = float(os.getenv("EXTRACTION_BACKOFF_BASE", "0.5"))
+EXTRACTION_BACKOFF_MAX = float(os.getenv("EXTRACTION_BACKOFF_MAX", "20"))
+
+DOCUMENTAI_WARMUP = os.getenv("DOCUMENTAI_WARMUP", "false").lower() in ("1", "true", "yes")
+
+DOCUMENTAI_PAGES_PER_CHUNK = int(os.getenv("DOCUMENTAI_PAGES_PER_CHUNK", "15"))
+DOCUMENTAI_MAX_CHUNK_BYTES = int(os.getenv("DOCUMENTAI_MAX_CHUNK_BYTES", str(20 * 1024 * 1024)))
+
+# "documentai", "local" (pypdf text layer only) or "hybrid" (text layer
+# first, Document AI for scanned pages and missing/low-confidence fields)
+EXTRACTION_BACKEND = os.getenv("EXTRACTION_BACKEND", "documentai")
+# Pages with fewer text-layer characters than this are treated as scanned
+LOCAL_TEXT_MIN_CHARS = int(os.getenv("LOCAL_TEXT_MIN_CHARS", "40"))
+LOCAL_TEXT_REQUIRED_FIELDS = [f.strip() for f in os.getenv("LOCAL_TEXT_REQUIRED_FIELDS", "name,dob").split(",") if f.strip()]
+LOCAL_TEXT_MIN_CONFIDENCE = float(os.getenv("LOCAL_TEXT_MIN_CONFIDENCE", "0.6"))
+
+# Page triage: only pages that look like they hold the fields (KEY_MAP label
+# hits, leading/trailing position, or image-only pages that can't be read
+# locally) are sent for extraction. Documents shorter than MIN_PAGES are
+# sent whole; with FALLBACK the skipped pages are extracted too when
+# REQUIRED_FIELDS come back missing.
+PAGE_TRIAGE_ENABLED = os.getenv("PAGE_TRIAGE_ENABLED", "false").lower() in ("1", "true", "yes")
+PAGE_TRIAGE_MIN_PAGES = int(os.getenv("PAGE_TRIAGE_MIN_PAGES", str(DOCUMENTAI_PAGES_PER_CHUNK)))
+PAGE_TRIAGE_LEAD_PAGES = int(os.getenv("PAGE_TRIAGE_LEAD_PAGES", "2"))
+PAGE_TRIAGE_TAIL_PAGES = int(os.getenv("PAGE_TRIAGE_TAIL_PAGES", "1"))
+PAGE_TRIAGE_MIN_SCORE = float(os.getenv("PAGE_TRIAGE_MIN_SCORE", "1"))
+PAGE_TRIAGE_FALLBACK = os.getenv("PAGE_TRIAGE_FALLBACK", "true").lower() in ("1", "true", "yes")
+PAGE_TRIAGE_REQUIRED_FIELDS = [f.strip() for f in os.getenv("PAGE_TRIAGE_REQUIRED_FIELDS", "name,dob").split(",") if f.strip()]
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "extraction_cache.sqlite3")
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "100000"))
+EXTRACTION_CACHE_TTL_SECONDS = int(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+# Expired / over-cap entries are purged once every this many stores
+EXTRACTION_CACHE_EVICT_EVERY = int(os.getenv("EXTRACTION_CACHE_EVICT_EVERY", "500"))
+
+MATCH_INSERT_BATCH_SIZE = int(os.getenv("MATCH_INSERT_BATCH_SIZE", "1000"))
+MATCH_INSERT_METHOD = os.getenv("MATCH_INSERT_METHOD", "executemany")  # or "copy"
+MATCH_COMMIT_MODE = os.getenv("MATCH_COMMIT_MODE", "batch")  # "document", "message" or "batch"
+
+# Match rows persisted per document: the best K by combined score and/or
+# those scoring at least MIN_SCORE (0-100); unset keeps every row
+MATCH_RETENTION_TOP_K = int(os.getenv("MATCH_RETENTION_TOP_K", "0")) or None
+MATCH_RETENTION_MIN_SCORE = float(os.getenv("MATCH_RETENTION_MIN_SCORE")) if os.getenv("MATCH_RETENTION_MIN_SCORE") else None
+MATCH_SCORE_BLOCK_SIZE = int(os.getenv("MATCH_SCORE_BLOCK_SIZE", "50000"))
+# Documents per transaction of the incremental re-matcher
+REMATCH_BATCH_DOCUMENTS = int(os.getenv("REMATCH_BATCH_DOCUMENTS", "200"))
+# Threads rapidfuzz cdist uses for name/referral scoring; -1 uses every core
+MATCH_WORKERS = int(os.getenv("MATCH_WORKERS", "-1"))
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "1"))
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "4"))
+WORKER_MAX_MESSAGES = int(os.getenv("WORKER_MAX_MESSAGES", "20"))
+WORKER_MAX_BYTES = int(os.getenv("WORKER_MAX_BYTES", str(100 * 1024 * 1024)))
+WORKER_MAX_LEASE_DURATION = int(os.getenv("WORKER_MAX_LEASE_DURATION", "3600"))
+WORKER_LEASE_EXTENSION_SECONDS = int(os.getenv("WORKER_LEASE_EXTENSION_SECONDS", "60"))
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "5"))
+WORKER_BATCH_WAIT_SECONDS = float(os.getenv("WORKER_BATCH_WAIT_SECONDS", "0.5"))
+# Prometheus port of the worker (process i of WORKER_PROCESSES uses port + i); 0 disables
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# Distinct raw date strings memoized by the date parser
+DATE_CACHE_SIZE = int(os.getenv("DATE_CACHE_SIZE", "65536"))
+
+DATASET_INGEST_CHUNK_SIZE = int(os.getenv("DATASET_INGEST_CHUNK_SIZE", "50000"))
+# An upload still unfinished after this long is presumed dead and stops
+# holding back the dataset watermark
+DATASET_INGEST_TIMEOUT_SECONDS = int(os.getenv("DATASET_INGEST_TIMEOUT_SECONDS", "3600"))
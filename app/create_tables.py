@@ -1,5 +1,5 @@
-from app.db import Base, engine
+from app.db import Base, get_engine
 from app.models import tables  # Import your models
 
-Base.metadata.create_all(bind=engine)
+Base.metadata.create_all(bind=get_engine())
 print("✅ Tables created successfully!")
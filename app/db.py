@@ -1,10 +1,15 @@
 # app/db.py
 import os
+import threading
+import time
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
 
+from app.metrics import DB_POOL_WAIT_SECONDS
+
 load_dotenv()
 
 DB_USER = os.environ.get("DB_USER")
@@ -13,11 +18,172 @@ DB_HOST = os.environ.get("DB_HOST")
 DB_PORT = os.environ.get("DB_PORT", "5432")
 DB_NAME = os.environ.get("DB_NAME")
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Process role selecting the pool settings below: "api" or "worker"
+DB_ROLE = os.environ.get("DB_ROLE", "api")
+
+# Defaults per role; each can be overridden with <ROLE>_DB_POOL_SIZE,
+# <ROLE>_DB_MAX_OVERFLOW, <ROLE>_DB_POOL_RECYCLE, <ROLE>_DB_POOL_TIMEOUT and
+# <ROLE>_DB_POOL_PRE_PING, e.g. WORKER_DB_POOL_SIZE=8
+POOL_DEFAULTS = {
+    "api": {"pool_size": 10, "max_overflow": 10, "pool_recycle": 1800, "pool_timeout": 30, "pool_pre_ping": True},
+    "worker": {"pool_size": 5, "max_overflow": 5, "pool_recycle": 1800, "pool_timeout": 60, "pool_pre_ping": True},
+}
+
+def database_url(driver="psycopg2"):
+    return f"postgresql+{driver}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+def pool_settings(role=DB_ROLE):
+    """Pool keyword arguments for ``role``, with environment overrides applied."""
+    settings = dict(POOL_DEFAULTS.get(role, POOL_DEFAULTS["api"]))
+    for key, default in settings.items():
+        value = os.environ.get(f"{role.upper()}_DB_{key.upper()}")
+        if value is None:
+            continue
+        settings[key] = value.lower() in ("1", "true", "yes") if isinstance(default, bool) else int(value)
+    return settings
+
+# -----------------------
+# Pool checkout metrics
+# -----------------------
+class PoolWaitStats:
+    """Time spent waiting for a connection from the pool."""
+
+    BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, float("inf"))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.bucket_counts = [0] * len(self.BUCKETS)
+
+    def observe(self, seconds):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    self.bucket_counts[i] += 1
+                    break
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_buckets": {str(b): c for b, c in zip(self.BUCKETS, self.bucket_counts)},
+            }
+
+_pool_stats = {}
+_pools = {}
+
+class TimedPoolMixin:
+    """Records how long each checkout waited under ``pool_name``."""
+
+    pool_name = None
+    wait_histogram = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            _pool_stats[self.pool_name].observe(waited)
+            self.wait_histogram.observe(waited)
+
+def timed_pool_class(base, name):
+    # A class per engine, because Pool.recreate() (after dispose) only
+    # carries over class attributes
+    _pool_stats.setdefault(name, PoolWaitStats())
+    return type(
+        f"Timed{base.__name__}",
+        (TimedPoolMixin, base),
+        {"pool_name": name, "wait_histogram": DB_POOL_WAIT_SECONDS.labels(name)},
+    )
+
+def pool_metrics():
+    """Checkout wait stats and current occupancy of every engine's pool."""
+    metrics = {}
+    for name, stats in _pool_stats.items():
+        metrics[name] = stats.snapshot()
+        pool = _pools.get(name)
+        if pool is not None:
+            metrics[name].update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            })
+    return metrics
+
+# -----------------------
+# Engine / session factory
+# -----------------------
+def make_engine(role=DB_ROLE):
+    """Sync engine (psycopg2) with the pool settings of ``role``."""
+    engine = create_engine(
+        database_url(),
+        poolclass=timed_pool_class(QueuePool, role),
+        **pool_settings(role),
+    )
+    _pools[role] = engine.pool
+    return engine
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_async_engine(role=DB_ROLE):
+    """Async engine (asyncpg) with the pool settings of ``role``."""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    name = f"{role}-async"
+    engine = create_async_engine(
+        database_url("asyncpg"),
+        poolclass=timed_pool_class(AsyncAdaptedQueuePool, name),
+        **pool_settings(role),
+    )
+    _pools[name] = engine.sync_engine.pool
+    return engine
+
 Base = declarative_base()
 
+_engines = {}
+_session_factories = {}
+_engines_lock = threading.RLock()
+
+def get_engine(role=DB_ROLE):
+    """Process-wide sync engine for ``role``, created on first use, so a
+    process only opens the pool of the role it actually uses."""
+    with _engines_lock:
+        if role not in _engines:
+            _engines[role] = make_engine(role)
+        return _engines[role]
+
+def get_session_factory(role=DB_ROLE):
+    with _engines_lock:
+        if role not in _session_factories:
+            _session_factories[role] = make_session_factory(get_engine(role))
+        return _session_factories[role]
+
+def SessionLocal():
+    """New session on the DB_ROLE engine."""
+    return get_session_factory()()
+
+_async_engine = None
+_async_sessions = None
+
+def get_async_engine():
+    """Process-wide async engine, created on first use."""
+    global _async_engine, _async_sessions
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = make_async_engine()
+        _async_sessions = async_sessionmaker(_async_engine, expire_on_commit=False)
+    return _async_engine
+
 
 # -------------------------------
 # Add this for FastAPI dependency
@@ -28,3 +194,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_sessions() as db:
+        yield db
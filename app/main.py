@@ -1,18 +1,33 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from app.config import DOCUMENTAI_WARMUP, LOCATION
+from app.metrics import render_latest
+from app.services.documentai_service import warm_up
 from app.routes import pdf_routes, upload_routes
 from app.routes.extract_router import router as extract_router
 from app.routes.dataset_routes import router as dataset_router
+from app.routes.timing_routes import router as timing_router
 
 app = FastAPI(title="PDF Processing API")
 
+@app.on_event("startup")
+def warm_up_documentai():
+    if DOCUMENTAI_WARMUP:
+        warm_up(LOCATION)
+
 @app.get("/")
 async def root():
     return {"message": "API is active"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
 app.include_router(pdf_routes.router, prefix="/api/pdf", tags=["PDF Processing"])
 app.include_router(upload_routes.router, prefix="/api", tags=["File Upload"])
 app.include_router(extract_router, prefix="/api")
 app.include_router(dataset_router, prefix="/api")
+app.include_router(timing_router, prefix="/api")
 
 # Local testing only
 if __name__ == "__main__":
@@ -0,0 +1,99 @@
+# app/metrics.py
+"""Prometheus metrics for every pipeline stage.
+
+Served at /metrics by the API and on WORKER_METRICS_PORT by the worker.
+Label values are bound once at import where they are fixed, so a hot-path
+update is a single locked add.
+"""
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+
+# Sub-millisecond to minutes: covers page splits as well as slow Document AI calls
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# -----------------------
+# Histograms
+# -----------------------
+PDF_SPLIT_SECONDS = Histogram(
+    "pdf_split_seconds", "Time to cut and encode one PDF chunk", buckets=LATENCY_BUCKETS
+)
+EXTRACTION_CHUNK_SECONDS = Histogram(
+    "extraction_chunk_seconds",
+    "Per-chunk extraction latency, including throttling and retries",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+)
+MATCH_SECONDS = Histogram(
+    "match_seconds", "Time to match one document against the dataset", ["dataset_size"], buckets=LATENCY_BUCKETS
+)
+DB_WRITE_SECONDS = Histogram(
+    "db_write_seconds", "Time of one bulk write", ["table"], buckets=LATENCY_BUCKETS
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds", "Time waiting for a pooled DB connection", ["pool"], buckets=LATENCY_BUCKETS
+)
+
+# -----------------------
+# Counters
+# -----------------------
+PAGES_PROCESSED = Counter("pages_processed_total", "PDF pages sent for extraction")
+EXTRACTION_CACHE_REQUESTS = Counter(
+    "extraction_cache_requests_total", "Extraction cache lookups", ["result"]
+)
+PAGES_SERVED = Counter(
+    "extraction_pages_served_total", "Pages extracted by the hybrid backend", ["backend"]
+)
+TRIAGE_PAGES = Counter("triage_pages_total", "Pages seen by page triage", ["decision"])
+TRIAGE_FALLBACKS = Counter(
+    "triage_fallbacks_total", "Documents whose skipped pages were extracted after required fields came back missing"
+)
+EXTRACTION_RETRIES = Counter("extraction_retries_total", "Retried chunk extraction attempts")
+PUBSUB_MESSAGES = Counter("pubsub_messages_total", "Pub/Sub messages received by the worker")
+PUBSUB_REDELIVERIES = Counter(
+    "pubsub_redeliveries_total", "Pub/Sub messages received with delivery_attempt > 1"
+)
+PUBSUB_NACKS = Counter("pubsub_nacks_total", "Pub/Sub messages nacked by the worker")
+
+EXTRACTION_OK = EXTRACTION_CHUNK_SECONDS.labels("ok")
+EXTRACTION_ERROR = EXTRACTION_CHUNK_SECONDS.labels("error")
+CACHE_HITS = EXTRACTION_CACHE_REQUESTS.labels("hit")
+CACHE_MISSES = EXTRACTION_CACHE_REQUESTS.labels("miss")
+
+DATASET_SIZE_BUCKETS = ((1_000, "<1k"), (10_000, "<10k"), (100_000, "<100k"), (1_000_000, "<1M"))
+
+def dataset_size_label(rows):
+    """Coarse label for a dataset size, keeping match_seconds' cardinality fixed."""
+    for limit, label in DATASET_SIZE_BUCKETS:
+        if rows < limit:
+            return label
+    return ">=1M"
+
+# -----------------------
+# Exposition
+# -----------------------
+def render_latest():
+    """Body and content type for a /metrics response.
+
+    With PROMETHEUS_MULTIPROC_DIR set (several gunicorn workers) the values
+    of every process are aggregated.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def start_metrics_server(port):
+    """Serve /metrics on ``port`` from a daemon thread (used by the worker)."""
+    start_http_server(port)
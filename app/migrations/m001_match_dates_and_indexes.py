@@ -0,0 +1,128 @@
+# app/migrations/m001_match_dates_and_indexes.py
+"""Convert the matches date columns from varchar to date and add the
+query indexes, without holding long locks on a large table.
+
+    python -m app.migrations.m001_match_dates_and_indexes --batch-size 50000
+
+1. Add nullable ``<col>_new date`` columns (catalog-only change).
+2. Backfill them in id ranges, one short transaction per batch. Values
+   that are not a recognizable date become NULL.
+3. Swap: in one brief transaction, catch up rows inserted meanwhile, drop
+   the varchar columns and rename the new ones.
+4. CREATE INDEX CONCURRENTLY for the indexes declared in app/models/tables.py.
+
+Every step is idempotent, so an interrupted run can simply be restarted.
+Run it before deploying code that writes date values into matches.
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+DATE_COLUMNS = ("dataset_doa", "dataset_dob", "extracted_doa", "extracted_dob")
+
+INDEXES = (
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_matches_document_status "
+    "ON matches (document_id, match_status, id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_matches_document_name_score "
+    "ON matches (document_id, name_score)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_extracted_fields_document_field "
+    "ON extracted_fields (document_id, field_name)",
+)
+
+# Session-scoped parser: ISO and the US formats the worker used to accept,
+# anything else (including 'None', 'NaT', 'N/A' and impossible dates) -> NULL
+TRY_DATE = """
+CREATE OR REPLACE FUNCTION pg_temp.try_date(value text) RETURNS date AS $$
+BEGIN
+    IF value ~ '^\\d{4}-\\d{2}-\\d{2}' THEN
+        RETURN substr(value, 1, 10)::date;
+    ELSIF value ~ '^\\d{2}/\\d{2}/\\d{4}$' THEN
+        RETURN to_date(value, 'MM/DD/YYYY');
+    ELSIF value ~ '^\\d{2}-\\d{2}-\\d{4}$' THEN
+        RETURN to_date(value, 'MM-DD-YYYY');
+    END IF;
+    RETURN NULL;
+EXCEPTION WHEN others THEN
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE
+"""
+
+def column_type(conn, table, column):
+    return conn.execute(
+        text("SELECT data_type FROM information_schema.columns WHERE table_name = :t AND column_name = :c"),
+        {"t": table, "c": column},
+    ).scalar()
+
+def backfill_sql(where):
+    assignments = ", ".join(f"{col}_new = pg_temp.try_date({col})" for col in DATE_COLUMNS)
+    return text(f"UPDATE matches SET {assignments} WHERE {where}")
+
+def add_columns(conn):
+    for col in DATE_COLUMNS:
+        conn.execute(text(f"ALTER TABLE matches ADD COLUMN IF NOT EXISTS {col}_new date"))
+    conn.commit()
+
+def backfill(conn, batch_size, pause):
+    """Fill the new columns for ids up to the current max; returns that max."""
+    conn.execute(text(TRY_DATE))
+    conn.commit()
+    high = conn.execute(text("SELECT coalesce(max(id), 0) FROM matches")).scalar()
+    low = conn.execute(text("SELECT coalesce(min(id), 1) FROM matches")).scalar()
+    update = backfill_sql("id BETWEEN :low AND :high")
+    for start in range(low, high + 1, batch_size):
+        end = min(start + batch_size - 1, high)
+        rows = conn.execute(update, {"low": start, "high": end}).rowcount
+        conn.commit()
+        logger.info(f"🔁 Backfilled matches {start}..{end} ({rows} rows)")
+        if pause:
+            time.sleep(pause)
+    return high
+
+def swap(conn, backfilled_up_to, lock_timeout):
+    """Catch up rows inserted during the backfill and swap the columns in
+    one short transaction. Gives up after ``lock_timeout`` waiting for the lock."""
+    conn.execute(text(f"SET LOCAL lock_timeout = '{int(lock_timeout * 1000)}ms'"))
+    conn.execute(text("LOCK TABLE matches IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(backfill_sql("id > :high"), {"high": backfilled_up_to})
+    for col in DATE_COLUMNS:
+        conn.execute(text(f"ALTER TABLE matches DROP COLUMN {col}"))
+        conn.execute(text(f"ALTER TABLE matches RENAME COLUMN {col}_new TO {col}"))
+    conn.commit()
+    logger.info("✅ matches date columns converted")
+
+def create_indexes():
+    # CONCURRENTLY cannot run inside a transaction block
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in INDEXES:
+            start = time.perf_counter()
+            conn.execute(text(statement))
+            logger.info(f"✅ {statement.split(' ON ')[0].split()[-1]} ({time.perf_counter() - start:.1f}s)")
+
+def migrate(batch_size=50000, pause=0.0, lock_timeout=5.0):
+    with get_engine().connect() as conn:
+        if column_type(conn, "matches", "dataset_doa") == "date":
+            logger.info("matches date columns already converted")
+        else:
+            add_columns(conn)
+            backfilled_up_to = backfill(conn, batch_size, pause)
+            swap(conn, backfilled_up_to, lock_timeout)
+    create_indexes()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=50000)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--lock-timeout", type=float, default=5.0, help="seconds to wait for the swap lock")
+    args = parser.parse_args()
+    migrate(args.batch_size, args.pause, args.lock_timeout)
+
+if __name__ == "__main__":
+    main()
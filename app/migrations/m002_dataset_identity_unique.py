@@ -0,0 +1,90 @@
+# app/migrations/m002_dataset_identity_unique.py
+"""Make (dataset_name, dataset_dob, dataset_doa) unique on dataset_records,
+so concurrent dataset uploads can't insert the same row twice.
+
+    python -m app.migrations.m002_dataset_identity_unique [--dedupe]
+
+1. Report rows sharing an identity. Without ``--dedupe`` the migration
+   stops there; with it, all but the lowest id of each group are deleted.
+2. CREATE UNIQUE INDEX CONCURRENTLY ... NULLS NOT DISTINCT (PostgreSQL 15+),
+   the ON CONFLICT target of dataset_ingest. A leftover invalid index from
+   an interrupted build is dropped first.
+3. Drop the plain ix_dataset_records_identity index it replaces.
+
+Every step is idempotent, so an interrupted run can simply be restarted.
+Run it before deploying code that ingests with ON CONFLICT.
+"""
+import argparse
+import logging
+import time
+
+from sqlalchemy import text
+
+from app.db import get_engine
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = "uq_dataset_records_identity"
+
+DUPLICATES = """
+SELECT id FROM (
+    SELECT id, row_number() OVER (
+        PARTITION BY dataset_name, dataset_dob, dataset_doa ORDER BY id
+    ) AS n
+    FROM dataset_records
+) ranked
+WHERE n > 1
+"""
+
+def duplicate_ids(conn):
+    return conn.execute(text(DUPLICATES)).scalars().all()
+
+def dedupe(conn, ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        conn.execute(text("DELETE FROM dataset_records WHERE id = ANY(:ids)"), {"ids": batch})
+        conn.commit()
+        logger.info(f"🧹 Deleted {start + len(batch)}/{len(ids)} duplicate dataset rows")
+
+def index_valid(conn):
+    """True/False for a valid/invalid existing index, None when missing."""
+    return conn.execute(
+        text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"),
+        {"name": INDEX_NAME},
+    ).scalar()
+
+def create_index():
+    # CONCURRENTLY cannot run inside a transaction block
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if index_valid(conn) is False:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}"))
+        start = time.perf_counter()
+        conn.execute(text(
+            f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+            "ON dataset_records (dataset_name, dataset_dob, dataset_doa) NULLS NOT DISTINCT"
+        ))
+        logger.info(f"✅ {INDEX_NAME} ({time.perf_counter() - start:.1f}s)")
+        conn.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_dataset_records_identity"))
+
+def migrate(remove_duplicates=False, batch_size=10000):
+    with get_engine().connect() as conn:
+        ids = duplicate_ids(conn)
+        conn.commit()
+        if ids and not remove_duplicates:
+            raise SystemExit(
+                f"{len(ids)} dataset_records rows duplicate an earlier row; rerun with --dedupe to delete them"
+            )
+        if ids:
+            dedupe(conn, ids, batch_size)
+    create_index()
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dedupe", action="store_true", help="delete all but the first row of each identity")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows deleted per transaction")
+    args = parser.parse_args()
+    migrate(args.dedupe, args.batch_size)
+
+if __name__ == "__main__":
+    main()
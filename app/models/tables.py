@@ -10,7 +10,8 @@ from sqlalchemy import (
     Boolean,
     Float,
     func,
-    Date
+    Date,
+    Index
 )
 from app.db import Base
 class Document(Base):
@@ -58,6 +59,11 @@ class ExtractedField(Base):
 
     document = relationship("Document", back_populates="extracted_fields")
 
+    # Fields of one document, optionally one field_name
+    __table_args__ = (
+        Index("ix_extracted_fields_document_field", "document_id", "field_name"),
+    )
+
 class DatasetRecord(Base):
     __tablename__ = "dataset_records"
 
@@ -67,6 +73,15 @@ class DatasetRecord(Base):
     dataset_dob = Column(Date, nullable=True)
     dataset_referral = Column(String, nullable=True)
 
+    # Identity used to de-duplicate dataset uploads (ON CONFLICT target);
+    # missing dates compare equal. Existing tables: app/migrations/m002
+    __table_args__ = (
+        Index(
+            "uq_dataset_records_identity", "dataset_name", "dataset_dob", "dataset_doa",
+            unique=True, postgresql_nulls_not_distinct=True,
+        ),
+    )
+
 
 class Match(Base):
     __tablename__ = "matches"
@@ -80,13 +95,13 @@ class Match(Base):
 
     dataset_index = Column(Integer)
     dataset_name = Column(String)
-    dataset_doa = Column(String)
-    dataset_dob = Column(String)
+    dataset_doa = Column(Date)
+    dataset_dob = Column(Date)
     dataset_referral = Column(Text)
 
     extracted_name = Column(String)
-    extracted_doa = Column(String)
-    extracted_dob = Column(String)
+    extracted_doa = Column(Date)
+    extracted_dob = Column(Date)
     extracted_referral = Column(Text)
 
     name_score = Column(Float)
@@ -100,3 +115,96 @@ class Match(Base):
     created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
 
     document = relationship("Document", back_populates="matches")
+
+    # Access patterns of /api/matches: one document's rows by status (paged
+    # on id), and one document's rows ranked by name_score
+    __table_args__ = (
+        Index("ix_matches_document_status", "document_id", "match_status", "id"),
+        Index("ix_matches_document_name_score", "document_id", "name_score"),
+    )
+
+
+class MatchStats(Base):
+    """Per-document audit of the match retention policy."""
+    __tablename__ = "match_stats"
+
+    document_id = Column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+
+    dataset_rows = Column(Integer)
+    candidates_evaluated = Column(Integer)
+    candidates_discarded = Column(Integer)
+    rows_retained = Column(Integer)
+    retention_top_k = Column(Integer)
+    retention_min_score = Column(Float)
+
+    created_at = Column(TIMESTAMP(timezone=True), server_default=func.now())
+
+
+class DocumentStageTiming(Base):
+    """One timed pipeline stage of a document (written by StageLedger)."""
+    __tablename__ = "document_stage_timings"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        nullable=False
+    )
+
+    # enqueue, queue_wait, download, split, extract, extract_chunk, match, persist
+    stage = Column(String(32), nullable=False)
+    chunk_index = Column(Integer)
+    started_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    duration_ms = Column(Float, nullable=False)
+
+    # Per-stage percentiles over a time window, and a document's timeline
+    __table_args__ = (
+        Index("ix_document_stage_timings_stage_started", "stage", "started_at"),
+        Index("ix_document_stage_timings_document", "document_id", "started_at"),
+    )
+
+
+class DatasetIngest(Base):
+    """One dataset upload. Serial ids are handed out at insert, not commit,
+    so while an upload runs the dataset_records ids above its
+    ``floor_record_id`` may still appear; watermarks stop below it."""
+    __tablename__ = "dataset_ingests"
+
+    id = Column(Integer, primary_key=True)
+    filename = Column(String, nullable=True)
+
+    # Highest committed dataset_records.id when the upload registered
+    floor_record_id = Column(Integer, nullable=False)
+
+    started_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_dataset_ingests_running", "finished_at", "started_at"),
+    )
+
+
+class DocumentMatchWatermark(Base):
+    """High-water marks of the dataset rows and extracted fields a document's
+    matches already cover (maintained by the worker and the re-matcher)."""
+    __tablename__ = "document_match_watermarks"
+
+    document_id = Column(
+        Integer,
+        ForeignKey("documents.id", ondelete="CASCADE"),
+        primary_key=True
+    )
+
+    # Max dataset_records.id / extracted_fields.id scored for this document
+    dataset_record_id = Column(Integer, nullable=False)
+    extracted_field_id = Column(Integer, nullable=False)
+
+    updated_at = Column(
+        TIMESTAMP(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now()
+    )
@@ -1,56 +1,85 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+import logging
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-import pandas as pd
-from datetime import datetime
+from app.config import BLOCKING_TOP_K, REMATCH_BATCH_DOCUMENTS
 from app.db import get_db
-from app.models.tables import DatasetRecord
+from app.services.blocking_index import refresh_index
+from app.services.dataset_ingest import abandon_ingest, ingest_dataset
+from app.services.incremental_matcher import count_pending
+from app.services.match_store import dataset_high_water
+from app.services.pubsub_service import publish_rematch
 
-router = APIRouter(tags=["Dataset"])
+logger = logging.getLogger(__name__)
 
-def ensure_date(value):
-    """Convert value to datetime.date or return None"""
-    if pd.isna(value) or value in ("", "N/A"):
-        return None
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y"):
-        try:
-            return datetime.strptime(str(value), fmt).date()
-        except:
-            continue
-    return None
+router = APIRouter(tags=["Dataset"])
 
 @router.post("/upload_dataset")
-def upload_dataset(file: UploadFile = File(...), db: Session = Depends(get_db)):
+def upload_dataset(
+    file: UploadFile = File(...),
+    on_duplicate: str = "skip",
+    rematch_documents: bool = False,
+    db: Session = Depends(get_db)
+):
     """
-    Upload dataset CSV/XLSX and store in DB
+    Upload dataset CSV/XLSX and store in DB.
+    Rows whose (name, DOB, DOA) already exist are skipped, or with
+    on_duplicate=update have their referral refreshed. With
+    rematch_documents=true, a worker is then asked to match processed
+    documents against the new rows.
     """
-    try:
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(file.file)
-        elif file.filename.endswith((".xls", ".xlsx")):
-            df = pd.read_excel(file.file)
-        else:
-            raise HTTPException(status_code=400, detail="Invalid file format. Use CSV or XLSX.")
-
-        records_added = 0
-        for _, row in df.iterrows():
-            dataset_name = row.get("Dataset_Name")
-            dataset_doa = ensure_date(row.get("Dataset_DOA"))
-            dataset_dob = ensure_date(row.get("Dataset_DOB"))
-            dataset_referral = row.get("Dataset_Referral")
-
-            if dataset_name:  # Skip empty rows
-                record = DatasetRecord(
-                    dataset_name=dataset_name,
-                    dataset_doa=dataset_doa,
-                    dataset_dob=dataset_dob,
-                    dataset_referral=dataset_referral
-                )
-                db.add(record)
-                records_added += 1
+    if not file.filename.endswith((".csv", ".xls", ".xlsx")):
+        raise HTTPException(status_code=400, detail="Invalid file format. Use CSV or XLSX.")
+    if on_duplicate not in ("skip", "update"):
+        raise HTTPException(status_code=400, detail="on_duplicate must be 'skip' or 'update'.")
 
+    counts = None
+    try:
+        counts = ingest_dataset(db, file.file, file.filename, on_duplicate)
         db.commit()
-        return {"status": "success", "records_added": records_added}
-
     except Exception as e:
         db.rollback()
+        if counts:
+            # Rolled back after a successful merge: stop holding back the watermark
+            abandon_ingest(db, counts["ingest_id"])
         raise HTTPException(status_code=500, detail=str(e))
+
+    # Fold the new rows into the persisted blocking index; the rows are
+    # committed either way and the worker refreshes it on its next match
+    if BLOCKING_TOP_K:
+        try:
+            refresh_index(db)
+        except Exception as e:
+            logger.error(f"❌ Failed to refresh the blocking index: {e}")
+            counts["index_error"] = str(e)
+    if rematch_documents and counts["records_added"]:
+        # The rows are committed either way; POST /rematch can retry
+        try:
+            counts["rematch_message_id"] = publish_rematch()
+        except Exception as e:
+            logger.error(f"❌ Failed to queue re-match: {e}")
+            counts["rematch_error"] = str(e)
+    return {"status": "success", **counts}
+
+@router.post("/rematch", status_code=202)
+def run_rematch(
+    max_batches: int = Query(10, ge=1),
+    batch_size: int = Query(REMATCH_BATCH_DOCUMENTS, ge=1, le=5000),
+):
+    """
+    Queue a re-match for a worker: stored extractions are matched against
+    dataset rows added since each document was last matched, without
+    re-processing any PDF. Each batch commits on its own; poll
+    GET /rematch/pending and queue again while documents are pending.
+    """
+    try:
+        message_id = publish_rematch(batch_size, max_batches)
+    except Exception as e:
+        logger.error(f"❌ Failed to queue re-match: {e}")
+        raise HTTPException(status_code=503, detail=f"Could not queue re-match: {e}")
+    return {"status": "queued", "message_id": message_id, "batch_size": batch_size, "max_batches": max_batches}
+
+@router.get("/rematch/pending")
+def rematch_pending(db: Session = Depends(get_db)):
+    """Documents whose matches are behind the dataset or their extracted fields."""
+    high_water = dataset_high_water(db)
+    return {"dataset_watermark": high_water, "documents_pending": count_pending(db, high_water)}
@@ -1,42 +1,195 @@
 # app/routes/match_routes.py
-from fastapi import APIRouter, HTTPException
-from sqlalchemy import text
-from app.db import SessionLocal
-from concurrent.futures import ThreadPoolExecutor
+import csv
+import io
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from app.db import get_async_engine
+from app.models.tables import ExtractedField, Match, MatchStats
 import logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
-executor = ThreadPoolExecutor(max_workers=5)  # Adjust based on your load
 
-def fetch_from_db(query, params=None):
-    db = SessionLocal()
-    try:
-        result = db.execute(text(query), params or {}).fetchall()
-        return [dict(row._mapping) for row in result]
-    finally:
-        db.close()
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 5000
+
+# -----------------------
+# Query building
+# -----------------------
+def project(table, fields):
+    """Columns of ``table`` named in the comma-separated ``fields`` (all when empty).
+
+    ``id`` is always included since it is the pagination key.
+    """
+    if not fields:
+        return list(table.c)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in table.c]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in names:
+        names.insert(0, "id")
+    return [table.c[name] for name in names]
+
+def keyset_query(table, fields, conditions, after_id, limit):
+    query = select(*project(table, fields)).where(*conditions).order_by(table.c.id)
+    if after_id is not None:
+        query = query.where(table.c.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+def created_conditions(table, created_after, created_before):
+    conditions = []
+    if created_after is not None:
+        conditions.append(table.c.created_at >= created_after)
+    if created_before is not None:
+        conditions.append(table.c.created_at < created_before)
+    return conditions
+
+# -----------------------
+# Responses
+# -----------------------
+async def fetch_page(query):
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(query)
+        return [dict(row._mapping) for row in result.fetchall()]
+
+def page_response(response, rows):
+    """Return a page; the cursor for the next page goes in X-Next-After-Id."""
+    if rows:
+        response.headers["X-Next-After-Id"] = str(rows[-1]["id"])
+    return rows
+
+async def stream_rows(query, fmt):
+    """Yield the full result of ``query`` as NDJSON or CSV using a server-side
+    cursor, so memory stays constant regardless of the result size."""
+    async with get_async_engine().connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=STREAM_BATCH_SIZE))
+        columns = list(result.keys())
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(columns)
+        async for rows in result.partitions():
+            for row in rows:
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(columns, row)), default=str))
+                    buffer.write("\n")
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+def streaming_response(query, fmt):
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_rows(query, fmt), media_type=media_type)
 
+# -----------------------
+# Endpoints
+# -----------------------
 @router.get("/extract_fields")
-def get_extract_fields(limit: int = 100):
+async def get_extract_fields(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    document_id: Optional[int] = None,
+    field_name: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+):
+    """Keyset-paginated extracted fields, ordered by id.
+
+    Pass the X-Next-After-Id header back as ``after_id`` for the next page.
+    ``format=ndjson|csv`` streams every matching row and ignores ``limit``.
+    """
+    table = ExtractedField.__table__
+    conditions = created_conditions(table, created_after, created_before)
+    if document_id is not None:
+        conditions.append(table.c.document_id == document_id)
+    if field_name is not None:
+        conditions.append(table.c.field_name == field_name)
+
+    if format != "json":
+        return streaming_response(keyset_query(table, fields, conditions, after_id, None), format)
     try:
-        future = executor.submit(
-            fetch_from_db,
-            "SELECT * FROM extracted_fields LIMIT :limit",
-            {"limit": limit}
-        )
-        return future.result(timeout=10)  # wait max 10 sec
+        return page_response(response, await fetch_page(keyset_query(table, fields, conditions, after_id, limit)))
+    except HTTPException:
+        raise
     except Exception as e:
+        logger.error("DB Error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/matches")
-def get_matches(limit: int = 100):
-    db = SessionLocal()
+async def get_matches(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    document_id: Optional[int] = None,
+    match_status: Optional[List[str]] = Query(None),
+    min_name_score: Optional[float] = None,
+    max_name_score: Optional[float] = None,
+    min_referral_score: Optional[float] = None,
+    max_referral_score: Optional[float] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+):
+    """Keyset-paginated matches, ordered by id, with filters and projection.
+
+    Pass the X-Next-After-Id header back as ``after_id`` for the next page.
+    ``format=ndjson|csv`` streams every matching row and ignores ``limit``.
+    """
+    table = Match.__table__
+    conditions = created_conditions(table, created_after, created_before)
+    if document_id is not None:
+        conditions.append(table.c.document_id == document_id)
+    if match_status:
+        conditions.append(table.c.match_status.in_(match_status))
+    if min_name_score is not None:
+        conditions.append(table.c.name_score >= min_name_score)
+    if max_name_score is not None:
+        conditions.append(table.c.name_score <= max_name_score)
+    if min_referral_score is not None:
+        conditions.append(table.c.referral_score >= min_referral_score)
+    if max_referral_score is not None:
+        conditions.append(table.c.referral_score <= max_referral_score)
+
+    if format != "json":
+        return streaming_response(keyset_query(table, fields, conditions, after_id, None), format)
+    try:
+        return page_response(response, await fetch_page(keyset_query(table, fields, conditions, after_id, limit)))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("DB Error: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/match_stats")
+async def get_match_stats(document_id: Optional[int] = None):
+    """Totals of the match retention counters, optionally for one document."""
+    query = select(
+        func.count().label("documents"),
+        func.coalesce(func.sum(MatchStats.dataset_rows), 0).label("dataset_rows"),
+        func.coalesce(func.sum(MatchStats.candidates_evaluated), 0).label("candidates_evaluated"),
+        func.coalesce(func.sum(MatchStats.candidates_discarded), 0).label("candidates_discarded"),
+        func.coalesce(func.sum(MatchStats.rows_retained), 0).label("rows_retained"),
+    )
+    if document_id is not None:
+        query = query.where(MatchStats.document_id == document_id)
     try:
-        result = db.execute(text("SELECT * FROM matches LIMIT :limit"), {"limit": limit}).fetchall()
-        return [dict(row._mapping) for row in result]
+        return (await fetch_page(query))[0]
     except Exception as e:
         logger.error("DB Error: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        db.close()
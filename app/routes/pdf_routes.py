@@ -2,6 +2,12 @@
 from fastapi import APIRouter, HTTPException
 from app.models.pdf_models import PDFProcessRequest, PDFProcessResponse
 from pdf_processing import process_pdf
+from app.db import pool_metrics
+from app.services.date_normalization import cache_info as date_cache_info
+from app.services.documentai_service import pool_stats
+from app.services.extraction_backends import hybrid_stats
+from app.services.extraction_cache import get_extraction_cache
+from app.services.page_triage import triage_stats
 from dotenv import load_dotenv
 import os
 
@@ -21,3 +27,33 @@ def process_single_pdf(request: PDFProcessRequest):
         result = process_pdf(pdf_path, request.dataset_file, PROJECT_ID, LOCATION, PROCESSOR_ID)
         all_results.extend(result)
     return PDFProcessResponse(results=all_results)
+
+@router.get("/client_pool")
+def get_client_pool_stats():
+    """Document AI client creations vs. reuses since process start."""
+    return pool_stats()
+
+@router.get("/extraction_cache")
+def get_extraction_cache_stats():
+    """Extraction cache hit/miss counts since process start."""
+    return get_extraction_cache().stats()
+
+@router.get("/db_pool")
+def get_db_pool_stats():
+    """DB connection pool occupancy and checkout wait times per engine."""
+    return pool_metrics()
+
+@router.get("/extraction_backend")
+def get_extraction_backend_stats():
+    """Pages served from the PDF text layer vs. Document AI, and the latency saved."""
+    return hybrid_stats.snapshot()
+
+@router.get("/page_triage")
+def get_page_triage_stats():
+    """Pages sent for extraction after triage, and full-document fallbacks."""
+    return triage_stats.snapshot()
+
+@router.get("/date_cache")
+def get_date_cache_stats():
+    """Hit/miss counts of the memoized date parser since process start."""
+    return date_cache_info()
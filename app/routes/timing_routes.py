@@ -0,0 +1,79 @@
+# app/routes/timing_routes.py
+from datetime import datetime, timedelta, timezone
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlalchemy import extract, func, select
+
+from app.db import get_async_engine
+from app.models.tables import Document, DocumentStageTiming
+
+router = APIRouter(tags=["Timings"])
+
+timings = DocumentStageTiming.__table__
+
+async def fetch_all(query):
+    async with get_async_engine().connect() as conn:
+        result = await conn.execute(query)
+        return [dict(row._mapping) for row in result.fetchall()]
+
+@router.get("/timings/stages")
+async def stage_latencies(hours: float = Query(24, gt=0)):
+    """p50/p95/avg/max duration per stage over the last ``hours`` hours."""
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    query = (
+        select(
+            timings.c.stage,
+            func.count().label("count"),
+            func.percentile_cont(0.5).within_group(timings.c.duration_ms).label("p50_ms"),
+            func.percentile_cont(0.95).within_group(timings.c.duration_ms).label("p95_ms"),
+            func.avg(timings.c.duration_ms).label("avg_ms"),
+            func.max(timings.c.duration_ms).label("max_ms"),
+        )
+        .where(timings.c.started_at >= since)
+        .group_by(timings.c.stage)
+        .order_by(timings.c.stage)
+    )
+    return {"since": since, "stages": await fetch_all(query)}
+
+@router.get("/timings/slowest")
+async def slowest_documents(limit: int = Query(10, ge=1, le=100)):
+    """Documents first seen today (UTC) with the longest end-to-end span,
+    from their first recorded stage to the end of their last."""
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    start_ms = extract("epoch", timings.c.started_at) * 1000
+    span = (func.max(start_ms + timings.c.duration_ms) - func.min(start_ms)).label("total_ms")
+    query = (
+        select(timings.c.document_id, Document.file_name, Document.status, span)
+        .join(Document, Document.id == timings.c.document_id)
+        .group_by(timings.c.document_id, Document.file_name, Document.status)
+        .having(func.min(timings.c.started_at) >= today)
+        .order_by(span.desc())
+        .limit(limit)
+    )
+    documents = await fetch_all(query)
+    if not documents:
+        return []
+
+    breakdown = await fetch_all(
+        select(timings.c.document_id, timings.c.stage, func.sum(timings.c.duration_ms).label("ms"))
+        .where(timings.c.document_id.in_([doc["document_id"] for doc in documents]))
+        .group_by(timings.c.document_id, timings.c.stage)
+    )
+    stages = {}
+    for row in breakdown:
+        stages.setdefault(row["document_id"], {})[row["stage"]] = row["ms"]
+    for doc in documents:
+        doc["stages_ms"] = stages.get(doc["document_id"], {})
+    return documents
+
+@router.get("/documents/{document_id}/timeline")
+async def document_timeline(document_id: int):
+    """Every recorded stage of one document, in start order."""
+    rows = await fetch_all(
+        select(timings.c.stage, timings.c.chunk_index, timings.c.started_at, timings.c.duration_ms)
+        .where(timings.c.document_id == document_id)
+        .order_by(timings.c.started_at, timings.c.id)
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No timings for document {document_id}")
+    return rows
@@ -1,64 +1,176 @@
 # app/routes/upload_routes.py
-from fastapi import APIRouter, UploadFile, File, Depends
+import logging
+import os
+import shutil
+import tempfile
+import time
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends
+from sqlalchemy import insert, update
 from sqlalchemy.orm import Session
 from uuid import uuid4
 
-from app.db import get_db
+from app.db import SessionLocal, get_db
 from app.models.tables import Document
-from app.services.gcs_service import upload_file_to_gcs
-from app.services.pubsub_service import publish_document_message
+from app.services.gcs_service import HashingReader, gcs_path_for, upload_files_to_gcs
+from app.services.pubsub_service import publish_documents, resolve_publishes
+from app.services.stage_ledger import StageLedger
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Upload"])
 
-@router.post("/upload")
-def upload_documents(
-    files: list[UploadFile] = File(...),
-    db: Session = Depends(get_db)
-):
-    """
-    Upload one or more PDFs to GCS, save in DB, and queue for processing via Pub/Sub.
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+def set_status(db: Session, document_ids, status, expected):
+    """Move documents still in one of the ``expected`` states to ``status``.
+
+    Guarding on the previous state keeps a late write from overriding the
+    worker (e.g. setting a "completed" document back to "queued").
     """
-    uploaded_docs = []
+    if document_ids:
+        db.execute(
+            update(Document)
+            .where(Document.id.in_(document_ids), Document.status.in_(expected))
+            .values(status=status)
+        )
+        db.commit()
 
-    for file in files:
+def remove_spool_files(paths):
+    for path in paths:
         try:
-            # 1️⃣ Generate unique filename
-            unique_name = f"{uuid4()}_{file.filename}"
-
-            # 2️⃣ Upload file to GCS
-            gcs_path = upload_file_to_gcs(file.file, unique_name)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"⚠️ Could not remove spool file {path}: {e}")
 
-            # 3️⃣ Save record in DB
-            document = Document(
-                file_name=file.filename,
-                gcs_path=gcs_path,
-                status="uploaded"
-            )
-            db.add(document)
-            db.commit()
-            db.refresh(document)
+def store_and_queue(documents):
+    """Background half of /upload: store the spooled files, then publish them.
 
-            # 4️⃣ Publish to Pub/Sub for worker
-            publish_document_message(
-                document_id=document.id,
-                gcs_path=gcs_path
+    Moves each Document through uploaded → stored → queued, or to "failed",
+    recording "store" and "enqueue" stage timings for each. "queued" is
+    written before publishing, since the worker may pick a document up as
+    soon as it is published.
+    """
+    db = SessionLocal()
+    ledger = StageLedger()
+    try:
+        # 3️⃣ Upload all files to GCS in parallel
+        handles = []
+        started, clock = time.time(), time.perf_counter()
+        try:
+            for doc in documents:
+                handles.append(open(doc["spool_path"], "rb"))
+            uploads = upload_files_to_gcs(
+                [(handle, doc["unique_name"]) for handle, doc in zip(handles, documents)]
             )
+        finally:
+            for handle in handles:
+                handle.close()
+            remove_spool_files(doc["spool_path"] for doc in documents)
+        for doc in documents:
+            ledger.record(doc["document_id"], "store", started, time.perf_counter() - clock)
 
-            uploaded_docs.append({
-                "document_id": document.id,
-                "file_name": document.file_name,
-                "status": "queued"
-            })
+        stored, failed = [], []
+        for doc, upload in zip(documents, uploads):
+            if "error" in upload:
+                failed.append(doc["document_id"])
+                continue
+            stored.append(doc)
+        ledger.flush(db)  # committed with the status updates below
+        set_status(db, failed, "failed", ("uploaded",))
+        set_status(db, [doc["document_id"] for doc in stored], "stored", ("uploaded",))
+        db.commit()
 
+        # 4️⃣ Publish all stored documents to Pub/Sub for the worker
+        if not stored:
+            return
+        set_status(db, [doc["document_id"] for doc in stored], "queued", ("stored",))
+        started, clock = time.time(), time.perf_counter()
+        try:
+            outcomes = resolve_publishes(publish_documents(
+                [{"document_id": doc["document_id"], "gcs_path": doc["gcs_path"]} for doc in stored]
+            ))
         except Exception as e:
+            logger.error(f"❌ Failed to publish documents: {e}")
+            outcomes = {doc["document_id"]: {"error": str(e)} for doc in stored}
+        queued = [doc_id for doc_id, outcome in outcomes.items() if "error" not in outcome]
+        for doc_id in queued:
+            ledger.record(doc_id, "enqueue", started, time.perf_counter() - clock)
+        ledger.flush(db)
+        # Never published, so the worker can't have moved these on
+        set_status(db, [doc_id for doc_id in outcomes if doc_id not in queued], "failed", ("queued",))
+        db.commit()
+    except Exception as e:
+        logger.error(f"❌ Background upload failed: {e}")
+        db.rollback()
+        # Only documents not yet handed to Pub/Sub
+        try:
+            set_status(db, [doc["document_id"] for doc in documents], "failed", ("uploaded", "stored"))
+        except Exception as status_error:
             db.rollback()
-            uploaded_docs.append({
+            logger.error(
+                f"❌ Could not mark documents {[doc['document_id'] for doc in documents]} failed: {status_error}"
+            )
+    finally:
+        db.close()
+
+@router.post("/upload", status_code=202)
+def upload_documents(
+    background_tasks: BackgroundTasks,
+    files: list[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Accept one or more PDFs: record them in the DB and return right away.
+    Storing in GCS and queueing via Pub/Sub happen in the background.
+    Each file's sha256 is returned, and files repeating an earlier file of
+    the same request carry "duplicate_of" with its stored name.
+    """
+    documents = []
+    first_by_hash = {}
+    spool_paths = []  # removed here unless handed to store_and_queue
+    try:
+        for file in files:
+            # 1️⃣ Generate unique filename and spool the upload, since request
+            # files are closed once the response is sent; hashed on the way
+            unique_name = f"{uuid4()}_{file.filename}"
+            reader = HashingReader(file.file)
+            with tempfile.NamedTemporaryFile(dir=UPLOAD_SPOOL_DIR, suffix=".pdf", delete=False) as spool:
+                spool_paths.append(spool.name)
+                shutil.copyfileobj(reader, spool)
+            sha256 = reader.digests()["sha256"]
+            documents.append({
                 "file_name": file.filename,
-                "status": "failed",
-                "error": str(e)
+                "unique_name": unique_name,
+                "gcs_path": gcs_path_for(unique_name),
+                "spool_path": spool.name,
+                "sha256": sha256,
+                "duplicate_of": first_by_hash.setdefault(sha256, unique_name),
             })
 
-    return {"uploaded": uploaded_docs}
-
+        # 2️⃣ Save all records in one statement
+        try:
+            document_ids = db.execute(
+                insert(Document).returning(Document.id, sort_by_parameter_order=True),
+                [{"file_name": doc["file_name"], "gcs_path": doc["gcs_path"], "status": "uploaded"} for doc in documents]
+            ).scalars().all()
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        spool_paths = []
+    finally:
+        remove_spool_files(spool_paths)
 
+    for doc, document_id in zip(documents, document_ids):
+        doc["document_id"] = document_id
+    background_tasks.add_task(store_and_queue, documents)
 
+    uploaded = []
+    for doc in documents:
+        entry = {"document_id": doc["document_id"], "file_name": doc["file_name"], "sha256": doc["sha256"], "status": "uploaded"}
+        if doc["duplicate_of"] != doc["unique_name"]:
+            entry["duplicate_of"] = doc["duplicate_of"]
+        uploaded.append(entry)
+    return {"uploaded": uploaded}
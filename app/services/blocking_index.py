@@ -0,0 +1,261 @@
+# app/services/blocking_index.py
+import heapq
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from app.config import BLOCKING_INDEX_PATH, BLOCKING_TOP_K
+from app.services.date_normalization import parse_date
+from app.services.match_store import dataset_high_water
+from app.services.matching_service import (
+    NAME_MATCH_THRESHOLD,
+    preprocess_string,
+    score_dataset,
+)
+
+logger = logging.getLogger(__name__)
+
+# Weight of each key family when ranking candidates
+KEY_WEIGHTS = {"tok": 3, "sdx": 2, "dob": 2, "doa": 1}
+
+# -----------------------
+# Blocking keys
+# -----------------------
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+def soundex(token):
+    letters = [c for c in token.lower() if c.isalpha()]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    last = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != last:
+            code += digit
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            last = digit
+    return code.ljust(4, "0")
+
+def month_bucket(value):
+    dt = parse_date(value)
+    if dt is None or pd.isna(dt):
+        return None
+    return f"{dt.year:04d}-{dt.month:02d}"
+
+def month_buckets(values):
+    """Vectorized month_bucket over a datetime64 array."""
+    buckets = np.datetime_as_string(values, unit="M")
+    return [None if b == "NaT" else b for b in buckets]
+
+def blocking_keys(name, dob_bucket=None, doa_bucket=None):
+    """Return the blocking keys for one record: name tokens, their soundex
+    codes and the DOB/DOA year-month buckets."""
+    keys = set()
+    for token in preprocess_string(name).replace(",", " ").split():
+        if len(token) < 2:
+            continue
+        keys.add(("tok", token))
+        keys.add(("sdx", soundex(token)))
+    if dob_bucket:
+        keys.add(("dob", dob_bucket))
+    if doa_bucket:
+        keys.add(("doa", doa_bucket))
+    return keys
+
+# -----------------------
+# Index
+# -----------------------
+class BlockingIndex:
+    """Inverted index from blocking keys to dataset record ids.
+
+    ``watermark`` is the dataset_records id up to which every row is indexed
+    (see match_store.dataset_high_water), which lets the index be extended
+    with only the rows added since it was last saved.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(list)
+        self.size = 0
+        self.watermark = 0
+
+    def add(self, record_id, name, dob_bucket=None, doa_bucket=None):
+        for key in blocking_keys(name, dob_bucket, doa_bucket):
+            self.postings[key].append(record_id)
+        self.size += 1
+        self.watermark = max(self.watermark, record_id)
+
+    def add_records(self, rows):
+        for row in rows:
+            self.add(row.id, row.dataset_name, month_bucket(row.dataset_dob), month_bucket(row.dataset_doa))
+
+    def candidates(self, extracted, top_k=BLOCKING_TOP_K):
+        """Return up to ``top_k`` record ids ranked by weighted key overlap."""
+        hits = Counter()
+        keys = blocking_keys(
+            extracted.get("name"), month_bucket(extracted.get("dob")), month_bucket(extracted.get("doa"))
+        )
+        for key in keys:
+            weight = KEY_WEIGHTS[key[0]]
+            for record_id in self.postings.get(key, ()):
+                hits[record_id] += weight
+        return [record_id for record_id, _ in heapq.nlargest(top_k, hits.items(), key=lambda kv: (kv[1], -kv[0]))]
+
+    def save(self, path=BLOCKING_INDEX_PATH):
+        # A private temp file per writer: API and worker processes refresh concurrently
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"postings": dict(self.postings), "size": self.size, "watermark": self.watermark},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path=BLOCKING_INDEX_PATH):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        index = cls()
+        index.postings = defaultdict(list, state["postings"])
+        index.size = state["size"]
+        index.watermark = state["watermark"]
+        return index
+
+def index_dataset(dataset):
+    """Build an in-memory index over a DatasetColumns, keyed by row position."""
+    index = BlockingIndex()
+    dob_buckets = month_buckets(dataset.dob)
+    doa_buckets = month_buckets(dataset.doa)
+    for pos in range(len(dataset)):
+        index.add(pos, dataset.raw_name[pos], dob_buckets[pos], doa_buckets[pos])
+    return index
+
+def candidate_positions(dataset, extracted, top_k=BLOCKING_TOP_K):
+    """Top-K row positions of ``dataset`` for ``extracted``, or None (scan
+    every row) when no row shares a blocking key with it. The index is
+    built on first use and kept on the dataset object."""
+    index = getattr(dataset, "_blocking_index", None)
+    if index is None:
+        index = dataset._blocking_index = index_dataset(dataset)
+    return sorted(index.candidates(extracted, top_k)) or None
+
+def dataset_candidates(index, dataset, extracted, top_k=BLOCKING_TOP_K):
+    """Positions in ``dataset`` (indexed by record id) of the top-K records
+    ``index`` returns for ``extracted``, or None (scan every row) when it
+    shares no blocking key with any record."""
+    record_ids = index.candidates(extracted, top_k)
+    if not record_ids:
+        return None
+    positions = getattr(dataset, "_positions", None)
+    if positions is None:
+        positions = dataset._positions = {record_id: pos for pos, record_id in enumerate(dataset.index)}
+    return sorted(positions[record_id] for record_id in record_ids if record_id in positions)
+
+# -----------------------
+# Persisted dataset_records index
+# -----------------------
+_index = None
+_index_lock = threading.Lock()
+
+def _fetch_records(db, after_id, up_to_id):
+    return db.execute(
+        text(
+            "SELECT id, dataset_name, dataset_doa, dataset_dob FROM dataset_records "
+            "WHERE id > :after_id AND id <= :up_to_id ORDER BY id"
+        ),
+        {"after_id": after_id, "up_to_id": up_to_id},
+    ).fetchall()
+
+def refresh_index(db, path=BLOCKING_INDEX_PATH):
+    """Load the persisted index (building it on first use) and fold in the
+    dataset_records rows added since its watermark, up to dataset_high_water
+    so rows of uploads still committing aren't skipped."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if os.path.exists(path):
+                _index = BlockingIndex.load(path)
+            else:
+                _index = BlockingIndex()
+        horizon = dataset_high_water(db)
+        if horizon <= _index.watermark:
+            return _index
+        new_rows = _fetch_records(db, _index.watermark, horizon)
+        _index.add_records(new_rows)
+        _index.watermark = horizon
+        if new_rows:
+            _index.save(path)
+            logger.info(f"🗂️ Blocking index updated with {len(new_rows)} records (watermark {_index.watermark})")
+        return _index
+
+def get_index(db):
+    return _index if _index is not None else refresh_index(db)
+
+# -----------------------
+# Recall check
+# -----------------------
+def measure_recall(index, dataset, extracted_records, top_k_values=(10, 25, 50, 100, 200)):
+    """Compare blocked candidates against an exhaustive scan.
+
+    A dataset row is relevant to an extracted record when the exhaustive scan
+    gives it a name match. Returns ``{k: recall}`` over all relevant rows.
+    ``index`` ids must be the ``dataset.index`` labels.
+    """
+    relevant = []
+    for extracted in extracted_records:
+        _, scores = score_dataset(extracted, dataset)
+        hits = np.flatnonzero(scores["name_score"] > NAME_MATCH_THRESHOLD)
+        relevant.append({dataset.index[i] for i in hits})
+
+    total = sum(len(r) for r in relevant)
+    recall = {}
+    for k in top_k_values:
+        found = sum(
+            len(rel & set(index.candidates(extracted, k)))
+            for extracted, rel in zip(extracted_records, relevant)
+        )
+        recall[k] = found / total if total else 1.0
+    return recall
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from app.db import SessionLocal
+    from app.services.matching_service import prepare_records
+
+    # Usage: python -m app.services.blocking_index extracted_samples.json
+    logging.basicConfig(level=logging.INFO)
+    with open(sys.argv[1]) as f:
+        samples = json.load(f)
+    db = SessionLocal()
+    try:
+        index = refresh_index(db)
+        rows = db.execute(
+            text("SELECT id, dataset_name, dataset_doa, dataset_dob, dataset_referral FROM dataset_records ORDER BY id")
+        ).fetchall()
+        for k, value in measure_recall(index, prepare_records(rows), samples).items():
+            print(f"top_k={k}: recall={value:.3f}")
+    finally:
+        db.close()
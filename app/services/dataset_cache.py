@@ -0,0 +1,261 @@
+# app/services/dataset_cache.py
+import hashlib
+import json
+import logging
+import operator
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from app.config import DATASET_CACHE_DIR
+from app.services.matching_service import (
+    DOA_COLUMNS,
+    DOB_COLUMNS,
+    NAME_COLUMNS,
+    REFERRAL_COLUMNS,
+    DatasetColumns,
+    detect_column,
+    prepare_dataset,
+)
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 3
+_RAW_COLUMNS = ("raw_name", "raw_doa", "raw_dob", "raw_referral")
+
+# -----------------------
+# Source file helpers
+# -----------------------
+def read_dataset_file(file_path):
+    if file_path.endswith(".csv"):
+        df = pd.read_csv(file_path)
+    elif file_path.endswith(".xlsx"):
+        df = pd.read_excel(file_path)
+    else:
+        raise ValueError("Only CSV or XLSX supported")
+    df.columns = [c.strip() for c in df.columns]
+    return df
+
+def content_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+# Maps (path, mtime_ns, size) -> content hash, so unchanged files are not
+# rehashed; least recently used entries are dropped past _HASH_CACHE_SIZE
+_HASH_CACHE_SIZE = 256
+_hash_by_stat = OrderedDict()
+_hash_lock = threading.Lock()
+
+def _artifact_key(file_path):
+    stat = os.stat(file_path)
+    stat_key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _hash_lock:
+        key = _hash_by_stat.get(stat_key)
+        if key is not None:
+            _hash_by_stat.move_to_end(stat_key)
+            return stat_key, key
+    key = f"{content_hash(file_path)}-v{ARTIFACT_VERSION}"
+    with _hash_lock:
+        _hash_by_stat[stat_key] = key
+        while len(_hash_by_stat) > _HASH_CACHE_SIZE:
+            _hash_by_stat.popitem(last=False)
+    return stat_key, key
+
+# -----------------------
+# Compile / load
+# -----------------------
+def _save_strings(directory, name, values):
+    """Store strings as UTF-8 in one byte blob plus int64 offsets, so a
+    single long value doesn't widen every row as a fixed-width array would."""
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{name}_blob.npy"), np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+def _load_strings(directory, name):
+    offsets = np.load(os.path.join(directory, f"{name}_offsets.npy"), mmap_mode="r").tolist()
+    blob = np.load(os.path.join(directory, f"{name}_blob.npy"), mmap_mode="r").tobytes()
+    return [blob[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+# Raw cells are stored as text plus a kind, so they load back as the type
+# pandas read them as; anything else is stored as its str()
+(KIND_STR, KIND_INT, KIND_FLOAT, KIND_NAN, KIND_NONE, KIND_NAT,
+ KIND_BOOL, KIND_TIMESTAMP, KIND_DATETIME, KIND_DATE) = range(10)
+_DECODERS = {
+    KIND_STR: str,
+    KIND_INT: int,
+    KIND_FLOAT: float,
+    KIND_NAN: lambda text: float("nan"),
+    KIND_NONE: lambda text: None,
+    KIND_NAT: lambda text: pd.NaT,
+    KIND_BOOL: lambda text: text == "True",
+    KIND_TIMESTAMP: pd.Timestamp,
+    KIND_DATETIME: datetime.fromisoformat,
+    KIND_DATE: date.fromisoformat,
+}
+
+def _encode_cell(value):
+    if value is None:
+        return KIND_NONE, ""
+    if value is pd.NaT:
+        return KIND_NAT, ""
+    if isinstance(value, (bool, np.bool_)):
+        return KIND_BOOL, str(bool(value))
+    if isinstance(value, (int, np.integer)):
+        return KIND_INT, str(int(value))
+    if isinstance(value, (float, np.floating)):
+        return (KIND_NAN, "") if value != value else (KIND_FLOAT, repr(float(value)))
+    if isinstance(value, pd.Timestamp):
+        return KIND_TIMESTAMP, value.isoformat()
+    if isinstance(value, datetime):
+        return KIND_DATETIME, value.isoformat()
+    if isinstance(value, date):
+        return KIND_DATE, value.isoformat()
+    return KIND_STR, str(value)
+
+def _save_raw(directory, name, values):
+    """Save a raw cell column as strings plus the kind of each cell."""
+    kinds, texts = zip(*map(_encode_cell, values)) if len(values) else ((), ())
+    _save_strings(directory, name, texts)
+    np.save(os.path.join(directory, f"{name}_kinds.npy"), np.array(kinds, dtype=np.uint8))
+
+class MappedCells(Sequence):
+    """Read-only view of a raw cell column in a compiled artifact.
+
+    Offsets, blob and kinds stay memory-mapped; a cell is decoded only when
+    indexed, so result records touch just the rows they report.
+    """
+
+    def __init__(self, offsets, blob, kinds):
+        self.offsets = offsets
+        self.blob = blob
+        self.kinds = kinds
+
+    @classmethod
+    def load(cls, directory, name):
+        def load(suffix):
+            return np.load(os.path.join(directory, f"{name}_{suffix}.npy"), mmap_mode="r")
+        return cls(load("offsets"), load("blob"), load("kinds"))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            stop = max(start, stop)
+            return MappedCells(self.offsets[start:stop + 1], self.blob, self.kinds[start:stop])
+        i = operator.index(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("cell index out of range")
+        text = self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode("utf-8")
+        return _DECODERS[int(self.kinds[i])](text)
+
+def compile_dataset(file_path, cache_dir=DATASET_CACHE_DIR):
+    """Parse ``file_path`` once and store its normalized columns as .npy files.
+
+    The artifact lives in ``cache_dir/<sha256>-v<version>/`` together with a
+    meta.json holding the resolved column mapping. Returns the artifact path.
+    """
+    _, key = _artifact_key(file_path)
+    artifact_dir = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(artifact_dir, "meta.json")):
+        return artifact_dir
+
+    df = read_dataset_file(file_path)
+    dataset = prepare_dataset(df)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".compile-")
+    try:
+        index = np.asarray(dataset.index)
+        if index.dtype == object:
+            index = index.astype(str)
+        np.save(os.path.join(tmp_dir, "index.npy"), index)
+        for column in _RAW_COLUMNS:
+            _save_raw(tmp_dir, column, getattr(dataset, column))
+        _save_strings(tmp_dir, "names", dataset.names)
+        _save_strings(tmp_dir, "referrals", dataset.referrals)
+        np.save(os.path.join(tmp_dir, "doa.npy"), dataset.doa)
+        np.save(os.path.join(tmp_dir, "dob.npy"), dataset.dob)
+
+        meta = {
+            "version": ARTIFACT_VERSION,
+            "source": os.path.abspath(file_path),
+            "rows": len(dataset),
+            "columns": {
+                "name": detect_column(df, NAME_COLUMNS),
+                "doa": detect_column(df, DOA_COLUMNS),
+                "dob": detect_column(df, DOB_COLUMNS),
+                "referral": detect_column(df, REFERRAL_COLUMNS),
+            },
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+        try:
+            os.rename(tmp_dir, artifact_dir)
+        except OSError:
+            # Another process compiled the same content first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    logger.info(f"🗜️ Compiled dataset {file_path} ({meta['rows']} rows) -> {artifact_dir}")
+    return artifact_dir
+
+def load_artifact(artifact_dir):
+    """Load a compiled artifact.
+
+    The date arrays and the raw cells stay memory-mapped, the cells decoded
+    per access (see MappedCells). The normalized names and referrals are
+    decoded into lists up front: every match scores all of them.
+    """
+    def load(name):
+        return np.load(os.path.join(artifact_dir, f"{name}.npy"), mmap_mode="r")
+
+    return DatasetColumns.from_arrays(
+        index=load("index").tolist(),
+        **{column: MappedCells.load(artifact_dir, column) for column in _RAW_COLUMNS},
+        names=_load_strings(artifact_dir, "names"),
+        referrals=_load_strings(artifact_dir, "referrals"),
+        doa=load("doa"),
+        dob=load("dob"),
+    )
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+def load_compiled_dataset(file_path, cache_dir=DATASET_CACHE_DIR):
+    """Return the DatasetColumns for ``file_path``, compiling it if needed.
+
+    Loaded datasets are memoized per process on the file's path, mtime and
+    size, so repeated calls within and across requests are free.
+    """
+    stat_key, key = _artifact_key(file_path)
+    with _loaded_lock:
+        cached = _loaded.get(stat_key)
+        if cached is not None:
+            return cached
+        dataset = load_artifact(compile_dataset(file_path, cache_dir))
+        # Keep only the latest version of each source file
+        for old_key in [k for k in _loaded if k[0] == stat_key[0]]:
+            del _loaded[old_key]
+        _loaded[stat_key] = dataset
+        return dataset
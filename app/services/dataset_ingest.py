@@ -0,0 +1,138 @@
+# app/services/dataset_ingest.py
+import logging
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import func, insert, select, text, update
+
+from app.config import DATASET_INGEST_CHUNK_SIZE
+from app.models.tables import DatasetIngest, DatasetRecord
+from app.services.date_normalization import infer_date_format, parse_date_column
+from app.services.pg_copy import copy_rows
+
+logger = logging.getLogger(__name__)
+
+STAGING_COLUMNS = ("dataset_name", "dataset_doa", "dataset_dob", "dataset_referral")
+
+# -----------------------
+# Reading
+# -----------------------
+def read_chunks(file_obj, filename, chunk_size=DATASET_INGEST_CHUNK_SIZE):
+    """Yield the uploaded dataset as DataFrames of at most ``chunk_size`` rows.
+
+    CSV is streamed; XLSX has to be read whole by openpyxl and is sliced.
+    """
+    if filename.endswith(".csv"):
+        yield from pd.read_csv(file_obj, chunksize=chunk_size, dtype=str, keep_default_na=True)
+    elif filename.endswith((".xls", ".xlsx")):
+        df = pd.read_excel(file_obj)
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+    else:
+        raise ValueError("Invalid file format. Use CSV or XLSX.")
+
+def normalize_chunk(df, date_formats):
+    """Map an uploaded chunk onto dataset_records columns, dropping rows
+    without a name. ``date_formats`` caches the inferred format per column."""
+    frame = pd.DataFrame(index=df.index)
+    frame["dataset_name"] = df.get("Dataset_Name")
+    frame["dataset_referral"] = df.get("Dataset_Referral")
+    for source, target in (("Dataset_DOA", "dataset_doa"), ("Dataset_DOB", "dataset_dob")):
+        if source not in df:
+            frame[target] = None
+            continue
+        if source not in date_formats:
+            date_formats[source] = infer_date_format(df[source])
+        frame[target] = parse_date_column(df[source], date_formats[source])
+
+    names = frame["dataset_name"]
+    frame = frame[names.notna() & (names.astype(str).str.strip() != "")]
+    return frame.astype(object).where(frame.notna(), None)
+
+# -----------------------
+# Loading
+# -----------------------
+def copy_into_staging(db, frame):
+    copy_rows(db, "dataset_staging", STAGING_COLUMNS, frame[list(STAGING_COLUMNS)].itertuples(index=False))
+
+# -----------------------
+# Upload registry
+# -----------------------
+def begin_ingest(db, filename):
+    """Register an upload in its own, already committed transaction, before
+    any of its rows get an id; dataset_high_water stops at its floor until
+    it finishes. Returns the dataset_ingests id."""
+    with db.get_bind().begin() as conn:
+        floor = conn.execute(select(func.coalesce(func.max(DatasetRecord.id), 0))).scalar()
+        return conn.execute(
+            insert(DatasetIngest)
+            .values(filename=filename, floor_record_id=floor, started_at=datetime.now(timezone.utc))
+            .returning(DatasetIngest.id)
+        ).scalar()
+
+def finish_ingest(conn, ingest_id):
+    conn.execute(
+        update(DatasetIngest).where(DatasetIngest.id == ingest_id).values(finished_at=datetime.now(timezone.utc))
+    )
+
+def abandon_ingest(db, ingest_id):
+    """Close the registration of an upload whose rows were rolled back."""
+    with db.get_bind().begin() as conn:
+        finish_ingest(conn, ingest_id)
+
+def ingest_dataset(db, file_obj, filename, on_duplicate="skip"):
+    """Stream a dataset upload into dataset_records.
+
+    Chunks are COPY'd into a temporary staging table, then merged in one
+    INSERT ... ON CONFLICT that skips rows whose (name, dob, doa) already
+    exists (or, with ``on_duplicate="update"``, refreshes their referral).
+    Needs the uq_dataset_records_identity index (app/migrations/m002). The caller
+    commits; the upload is marked finished in the same transaction, and
+    closed separately if this raises. A caller that rolls back a successful
+    ingest calls abandon_ingest(db, counts["ingest_id"]). Returns counts of
+    rows read, inserted and updated.
+    """
+    ingest_id = begin_ingest(db, filename)
+    try:
+        counts = _merge_upload(db, file_obj, filename, on_duplicate)
+        finish_ingest(db, ingest_id)
+    except BaseException:
+        db.rollback()
+        abandon_ingest(db, ingest_id)
+        raise
+    return {"ingest_id": ingest_id, **counts}
+
+def _merge_upload(db, file_obj, filename, on_duplicate):
+    db.execute(text(
+        "CREATE TEMP TABLE dataset_staging ("
+        "dataset_name text, dataset_doa date, dataset_dob date, dataset_referral text"
+        ") ON COMMIT DROP"
+    ))
+
+    rows_read = 0
+    date_formats = {}
+    for chunk in read_chunks(file_obj, filename):
+        frame = normalize_chunk(chunk, date_formats)
+        rows_read += len(frame)
+        copy_into_staging(db, frame)
+    logger.info(f"📥 Staged {rows_read} dataset rows from {filename} (date formats {date_formats})")
+
+    # Concurrent uploads of the same rows are settled by the unique identity
+    # index; xmax = 0 tells freshly inserted rows from updated ones
+    on_conflict = "DO NOTHING"
+    if on_duplicate == "update":
+        on_conflict = """DO UPDATE SET dataset_referral = EXCLUDED.dataset_referral
+            WHERE dataset_records.dataset_referral IS DISTINCT FROM EXCLUDED.dataset_referral"""
+    inserted, updated = db.execute(text(f"""
+        WITH written AS (
+            INSERT INTO dataset_records (dataset_name, dataset_doa, dataset_dob, dataset_referral)
+            SELECT DISTINCT ON (s.dataset_name, s.dataset_dob, s.dataset_doa)
+                   s.dataset_name, s.dataset_doa, s.dataset_dob, s.dataset_referral
+            FROM dataset_staging s
+            ON CONFLICT (dataset_name, dataset_dob, dataset_doa) {on_conflict}
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM written
+    """)).one()
+
+    return {"rows_read": rows_read, "records_added": inserted, "records_updated": updated}
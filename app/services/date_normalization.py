@@ -0,0 +1,173 @@
+# app/services/date_normalization.py
+"""One date parser for ingest, extraction, matching and persistence.
+
+Columns are parsed vectorized with a format inferred once from a sample;
+only the values that miss it go through the scalar parser. Scalars (an
+extracted DOB repeats on every chunk and every document of a patient) are
+memoized in a bounded LRU cache.
+
+- parse_date(value): lenient, pd.Timestamp or NaT (pandas' parser as a
+  fallback, timezones dropped, time of day kept).
+- to_date(value): strict, datetime.date or None, for DB date columns.
+- parse_dates(values): vectorized parse_date into a datetime64[us] array.
+"""
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from app.config import DATE_CACHE_SIZE
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m-%d-%Y")
+# Accepted by to_date after DATE_FORMATS, e.g. "November 18, 1978"
+TEXT_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y")
+
+MISSING = ("", "NaT", "None", "nan")
+
+# Numeric layouts are dispatched by pattern, without a strptime per attempt
+ISO_DATE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:[ T][\d:.]+)?")
+US_DATE = re.compile(r"(\d{1,2})([/-])(\d{1,2})\2(\d{4})")
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT
+
+# -----------------------
+# Scalars
+# -----------------------
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _to_date_str(value):
+    value = value.strip()
+    if value in MISSING or "N/A" in value:
+        return None
+    match = ISO_DATE.fullmatch(value)
+    parts = (match.group(1), match.group(2), match.group(3)) if match else None
+    if parts is None:
+        match = US_DATE.fullmatch(value)
+        parts = (match.group(4), match.group(1), match.group(3)) if match else None
+    if parts is not None:
+        year, month, day = (int(p) for p in parts)
+        if 1 <= month <= 12 and 1 <= day <= 31:
+            try:
+                return date(year, month, day)
+            except ValueError:  # e.g. Feb 30
+                return None
+        return None
+    if value[:1].isalpha():
+        for fmt in TEXT_DATE_FORMATS:
+            try:
+                return datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+def to_date(value):
+    """Convert value to datetime.date, or None for missing/unparseable dates."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if _is_missing(value):
+        return None
+    return _to_date_str(str(value))
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date_str(value):
+    # The fast path is date-only; a time of day goes through pandas so it
+    # is kept, as the old preprocess_date did
+    parsed = None if ":" in value else _to_date_str(value)
+    if parsed is not None:
+        return pd.Timestamp(parsed)
+    try:
+        dt = pd.to_datetime(value, errors="coerce")
+    except (TypeError, ValueError):
+        return pd.NaT
+    if dt is not pd.NaT and dt.tzinfo is not None:
+        dt = dt.tz_localize(None)
+    return dt
+
+def parse_date(value):
+    """Parse one raw value into a naive pd.Timestamp, or NaT."""
+    if isinstance(value, str):
+        return _parse_date_str(value)
+    if _is_missing(value):
+        return pd.NaT
+    try:
+        dt = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return pd.NaT
+    return dt.tz_localize(None) if dt.tzinfo is not None else dt
+
+def cache_info():
+    """Hit/miss counts of the scalar memo caches."""
+    return {"to_date": _to_date_str.cache_info()._asdict(), "parse_date": _parse_date_str.cache_info()._asdict()}
+
+# -----------------------
+# Columns
+# -----------------------
+def infer_date_format(values, formats=DATE_FORMATS, sample_size=200):
+    """Pick the format that parses the most of a sample of ``values``."""
+    sample = pd.Series(values, dtype=object).dropna().astype(str).head(sample_size)
+    if sample.empty:
+        return formats[0]
+    return max(formats, key=lambda fmt: pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+
+def _parse_strings(series, fmt):
+    """Parse a Series of strings/None with ``fmt``; only misses go through
+    parse_date, once per distinct value."""
+    parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+    missing = parsed.isna() & series.notna()
+    if missing.any():
+        retry = series[missing]
+        uniques = {v: parse_date(v) for v in retry.unique()}
+        parsed[missing] = pd.to_datetime(retry.map(uniques), errors="coerce")
+    return parsed
+
+def _parse_objects(series):
+    """Vectorized parse of date/datetime/None values; per distinct value
+    through parse_date when they mix timezones."""
+    try:
+        parsed = pd.to_datetime(series, errors="coerce")
+        if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+            parsed = parsed.dt.tz_localize(None)
+        if not pd.api.types.is_datetime64_dtype(parsed.dtype):
+            raise TypeError("mixed timezones")
+        return parsed
+    except (TypeError, ValueError):
+        return pd.to_datetime(series.map(parse_date), errors="coerce")
+
+def parse_dates(values, fmt=None):
+    """Parse a sequence of raw values into a naive datetime64[us] array.
+
+    Strings are parsed with ``fmt`` (inferred from a sample when not given),
+    anything else (date, Timestamp, None) is converted directly.
+    """
+    series = pd.Series(values, dtype=object)
+    series = series.where(series.notna() & ~series.isin(MISSING), None)
+    strings = series.map(lambda v: isinstance(v, str)).astype(bool)
+    parsed = pd.Series(np.datetime64("NaT", "us"), index=series.index, dtype="datetime64[us]")
+    if strings.any():
+        text = series[strings]
+        parsed[strings] = _parse_strings(text, fmt or infer_date_format(text)).astype("datetime64[us]")
+    if not strings.all():
+        parsed[~strings] = _parse_objects(series[~strings]).astype("datetime64[us]")
+    return parsed.to_numpy(dtype="datetime64[us]")
+
+def parse_date_column(values, primary_format, formats=DATE_FORMATS):
+    """Parse a column with ``primary_format``, retrying only the misses with
+    the other formats and then to_date. Returns a Series of datetime.date or None."""
+    raw = values.astype(object).where(values.notna(), None)
+    raw = raw.where(~raw.isin(["", "N/A"]), None).astype("string")
+    parsed = pd.to_datetime(raw, format=primary_format, errors="coerce")
+    for fmt in formats:
+        missing = parsed.isna() & raw.notna()
+        if not missing.any():
+            break
+        if fmt != primary_format:
+            parsed[missing] = pd.to_datetime(raw[missing], format=fmt, errors="coerce")
+    dates = parsed.dt.date.astype(object).where(parsed.notna(), None)
+    missing = parsed.isna() & raw.notna()
+    if missing.any():
+        dates[missing] = raw[missing].astype(object).map(to_date)
+    return dates
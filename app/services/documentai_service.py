@@ -0,0 +1,155 @@
+# app/services/documentai_service.py
+import logging
+import threading
+
+import grpc
+from google.api_core import exceptions as google_exceptions
+from google.api_core.client_options import ClientOptions
+from google.cloud import documentai
+
+from app.config import EXTRACTION_CACHE_ENABLED
+from app.services.extraction_cache import get_extraction_cache
+
+logger = logging.getLogger(__name__)
+
+KEY_MAP = {
+    "name": "name",
+    "client name": "name",
+    "patient name": "name",
+    "doa": "doa",
+    "date of accident": "doa",
+    "date of injury": "doa",
+    "service date": "doa",
+    "dob": "dob",
+    "date of birth": "dob",
+    "birth date": "dob",
+    "birth": "dob",
+    "referral": "referral",
+    "reason for visit": "referral",
+    "referral details": "referral",
+    "referral note": "referral",
+    "instructions": "referral"
+}
+
+# -----------------------
+# Client pool
+# -----------------------
+_clients = {}
+_clients_lock = threading.Lock()
+_pool_stats = {"created": 0, "reused": 0, "discarded": 0}
+
+def api_endpoint(location):
+    return f"{location}-documentai.googleapis.com"
+
+def get_client(location):
+    """Return the process-wide DocumentProcessorServiceClient for ``location``.
+
+    gRPC clients are thread-safe, so one channel per endpoint is shared by
+    every request and extraction thread.
+    """
+    endpoint = api_endpoint(location)
+    with _clients_lock:
+        client = _clients.get(endpoint)
+        if client is None:
+            client = documentai.DocumentProcessorServiceClient(
+                client_options=ClientOptions(api_endpoint=endpoint)
+            )
+            _clients[endpoint] = client
+            _pool_stats["created"] += 1
+            logger.info(f"🔌 Created Document AI client for {endpoint}")
+        else:
+            _pool_stats["reused"] += 1
+        return client
+
+def discard_client(location, client):
+    """Drop ``client`` from the pool so the next call opens a fresh channel."""
+    endpoint = api_endpoint(location)
+    with _clients_lock:
+        if _clients.get(endpoint) is client:
+            del _clients[endpoint]
+            _pool_stats["discarded"] += 1
+            logger.warning(f"🔌 Discarded unhealthy Document AI client for {endpoint}")
+
+def warm_up(location, timeout=10):
+    """Create the client for ``location`` and wait for its channel to connect."""
+    client = get_client(location)
+    try:
+        grpc.channel_ready_future(client.transport.grpc_channel).result(timeout=timeout)
+        logger.info(f"🔥 Document AI channel for {api_endpoint(location)} is ready")
+    except Exception as e:
+        logger.warning(f"Document AI warm-up for {location} did not complete: {e}")
+    return client
+
+def pool_stats():
+    with _clients_lock:
+        return {**_pool_stats, "clients": len(_clients)}
+
+def _is_channel_failure(exc):
+    """UNAVAILABLE (connection lost or refused) or an RPC on a closed channel;
+    other errors leave the pooled client in place."""
+    if isinstance(exc, google_exceptions.ServiceUnavailable):
+        return True
+    if isinstance(exc, grpc.RpcError) and exc.code() == grpc.StatusCode.UNAVAILABLE:
+        return True
+    # grpc raises ValueError("Cannot invoke RPC on closed channel!")
+    return isinstance(exc, ValueError) and "closed channel" in str(exc)
+
+# -----------------------
+# Extraction
+# -----------------------
+def entities_to_fields(document):
+    """Collapse Document AI entities into the normalized name/doa/dob/referral dict."""
+    extracted = {}
+    for entity in document.entities:
+        key = entity.type_.lower()
+        if key in KEY_MAP:
+            if KEY_MAP[key] in extracted:
+                extracted[KEY_MAP[key]] += f"; {entity.mention_text}"
+            else:
+                extracted[KEY_MAP[key]] = entity.mention_text
+    return extracted
+
+def merge_extracted(parts):
+    """Merge per-chunk extracted dicts, in the order given."""
+    combined = {}
+    for part in parts:
+        for k, v in part.items():
+            if k in combined:
+                combined[k] += f"; {v}"
+            else:
+                combined[k] = v
+    return combined
+
+def extract_fields(project_id, location, processor_id, content, processor_version_id=None):
+    """Send one PDF chunk to Document AI and return its extracted fields.
+
+    Unlike extract_fields_from_pdf this raises on API errors, so callers can
+    decide whether to retry.
+    """
+    client = get_client(location)
+
+    if processor_version_id:
+        name = client.processor_version_path(project_id, location, processor_id, processor_version_id)
+    else:
+        name = client.processor_path(project_id, location, processor_id)
+
+    raw_doc = documentai.RawDocument(content=content, mime_type="application/pdf")
+    request = documentai.ProcessRequest(name=name, raw_document=raw_doc)
+    try:
+        result = client.process_document(request=request)
+    except Exception as e:
+        if _is_channel_failure(e):
+            discard_client(location, client)
+        raise
+    return entities_to_fields(result.document)
+
+def extract_fields_cached(project_id, location, processor_id, content, processor_version_id=None):
+    """extract_fields behind the content-addressed extraction cache."""
+    if not EXTRACTION_CACHE_ENABLED:
+        return extract_fields(project_id, location, processor_id, content, processor_version_id)
+    return get_extraction_cache().get_or_extract(
+        content,
+        processor_id,
+        processor_version_id,
+        lambda data: extract_fields(project_id, location, processor_id, data, processor_version_id),
+    )
@@ -0,0 +1,353 @@
+# app/services/extraction_backends.py
+"""Pluggable extraction backends.
+
+Every backend turns one PdfChunk into the normalized name/doa/dob/referral
+dict and raises on remote errors, like documentai_service.extract_fields,
+so the ExtractionScheduler can retry it.
+
+- DocumentAIBackend: the remote processor, through the extraction cache.
+- LocalTextBackend: reads the PDF text layer with pypdf and picks fields
+  out with patterns built from the KEY_MAP labels.
+- HybridBackend: LocalTextBackend first; only scanned pages, and text
+  pages of documents whose required fields are missing or low-confidence,
+  go to Document AI.
+
+A document's chunks go through ``backend.document()``: its ``extract`` per
+chunk (optionally given the page texts already read), then ``finish`` on
+the merged result.
+"""
+import io
+import logging
+import re
+import threading
+import time
+
+import pandas as pd
+from pypdf import PdfReader
+
+from app.config import (
+    EXTRACTION_BACKEND,
+    LOCAL_TEXT_MIN_CHARS,
+    LOCAL_TEXT_MIN_CONFIDENCE,
+    LOCAL_TEXT_REQUIRED_FIELDS,
+    LOCATION,
+    PROCESSOR_ID,
+    PROJECT_ID,
+)
+from app.metrics import PAGES_SERVED
+from app.services.date_normalization import parse_date
+from app.services.documentai_service import KEY_MAP, extract_fields_cached, merge_extracted
+from app.services.extraction_scheduler import get_scheduler
+from app.services.pdf_splitter import chunk_subset
+
+logger = logging.getLogger(__name__)
+
+# -----------------------
+# Field patterns
+# -----------------------
+MONTHS = r"(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?"
+DATE_VALUE = (
+    rf"(?:\d{{1,2}}/\d{{1,2}}/\d{{2,4}}|\d{{4}}-\d{{2}}-\d{{2}}|\d{{1,2}}-\d{{1,2}}-\d{{4}}|{MONTHS}\s+\d{{1,2}},?\s+\d{{4}})"
+)
+# Capitalized words on one line; a word followed by ":" is the next label
+NAME_WORD = r"[A-Z][\w'.\-]*"
+NAME_VALUE = rf"{NAME_WORD}(?:,?[ ](?![\w'.\-]*:){NAME_WORD}){{0,3}}"
+REFERRAL_VALUE = r"[^\n]{3,200}"
+
+VALUE_PATTERNS = {"name": NAME_VALUE, "doa": DATE_VALUE, "dob": DATE_VALUE, "referral": REFERRAL_VALUE}
+
+# Labels printed on bills and records that Document AI has no entity type
+# for, e.g. "Patient:\nThomas Ybarra" on a statement of account
+LOCAL_KEY_MAP = {**KEY_MAP, "patient": "name"}
+
+def _label_pattern(label):
+    words = r"\s+".join(re.escape(word) for word in label.split())
+    if label.endswith("birth"):
+        words += "(?:date)?"  # "Birthdate"
+    # A bare "Name" must not be the tail of another label ("Provider Name");
+    # the value follows a colon, on the same or the next line, or, for dates,
+    # a space
+    return rf"(?<!\w)(?<![A-Za-z][^\S\n]){words}(?:[^\S\n]*[:#][^\S\n]*\n?|[^\S\n]+(?=\d))[^\w\n]*"
+
+def compile_field_patterns(key_map=LOCAL_KEY_MAP):
+    """One case-insensitive-label regex per field, longest labels first."""
+    labels = {}
+    for label, field in key_map.items():
+        labels.setdefault(field, []).append(label)
+    patterns = {}
+    for field, field_labels in labels.items():
+        alternatives = "|".join(_label_pattern(label) for label in sorted(field_labels, key=len, reverse=True))
+        # Labels match case-insensitively, values keep their own case rules
+        patterns[field] = re.compile(rf"(?i:{alternatives})({VALUE_PATTERNS[field]})")
+    return patterns
+
+FIELD_PATTERNS = compile_field_patterns()
+
+def field_confidence(field, value):
+    """Heuristic 0-1 confidence of a locally extracted value."""
+    if field in ("doa", "dob"):
+        return 0.95 if not pd.isna(parse_date(value)) else 0.2
+    if field == "name":
+        return 0.9 if len(re.split(r"[ ,]+", value)) >= 2 else 0.4
+    return 0.8
+
+def unique_values(extracted):
+    """Collapse repeated "; "-joined values, e.g. the same name found in
+    every chunk, keeping the first occurrence of each."""
+    return {field: "; ".join(dict.fromkeys(value.split("; "))) for field, value in extracted.items()}
+
+# -----------------------
+# Backends
+# -----------------------
+class DocumentAIBackend:
+    name = "documentai"
+
+    def __init__(self, project_id=PROJECT_ID, location=LOCATION, processor_id=PROCESSOR_ID, processor_version_id=None):
+        self.project_id = project_id
+        self.location = location
+        self.processor_id = processor_id
+        self.processor_version_id = processor_version_id
+
+    def extract(self, chunk, texts=None):
+        return extract_fields_cached(
+            self.project_id, self.location, self.processor_id, chunk.content, self.processor_version_id
+        )
+
+    def document(self):
+        return DocumentExtraction(self)
+
+class LocalTextBackend:
+    name = "local"
+
+    def __init__(self, min_chars=LOCAL_TEXT_MIN_CHARS, patterns=FIELD_PATTERNS):
+        self.min_chars = min_chars
+        self.patterns = patterns
+
+    def page_texts(self, chunk, texts=None):
+        """Text layer of each page of ``chunk``; entries of ``texts`` that
+        are not None (e.g. read during page triage) are used as they are."""
+        if texts is not None and all(text is not None for text in texts):
+            return list(texts)
+        reader = PdfReader(io.BytesIO(chunk.content))
+        result = []
+        for i, page in enumerate(reader.pages):
+            if texts is not None and texts[i] is not None:
+                result.append(texts[i])
+                continue
+            try:
+                result.append(page.extract_text() or "")
+            except Exception as e:  # malformed content streams: treat as scanned
+                logger.warning(f"Text extraction failed on chunk {chunk.index}: {e}")
+                result.append("")
+        return result
+
+    def is_scanned(self, text):
+        return len(text.strip()) < self.min_chars
+
+    def extract_texts(self, texts):
+        """Fields and their confidences found in ``texts``; repeated values
+        (e.g. the DOB in every page header) are kept once."""
+        values, confidence = {}, {}
+        for text in texts:
+            for field, pattern in self.patterns.items():
+                for match in pattern.finditer(text):
+                    value = match.group(1).strip()
+                    if value and value not in values.setdefault(field, []):
+                        values[field].append(value)
+                        confidence[field] = max(confidence.get(field, 0.0), field_confidence(field, value))
+        return {field: "; ".join(found) for field, found in values.items()}, confidence
+
+    def extract(self, chunk, texts=None):
+        return self.extract_texts(self.page_texts(chunk, texts))[0]
+
+    def document(self):
+        return DocumentExtraction(self, dedupe=True)
+
+class DocumentExtraction:
+    """One document's pass through a backend: ``extract`` runs per chunk
+    (concurrently, from the scheduler) and ``finish`` once on the merged
+    result. With ``dedupe`` values repeated across chunks are kept once."""
+
+    def __init__(self, backend, dedupe=False):
+        self.backend = backend
+        self.dedupe = dedupe
+
+    def extract(self, chunk, texts=None):
+        return self.backend.extract(chunk, texts)
+
+    def finish(self, extracted):
+        return unique_values(extracted) if self.dedupe else extracted
+
+class HybridStats:
+    """Pages/chunks served locally vs. remotely, and the time spent on each."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages_local = 0
+        self.pages_remote = 0
+        self.chunks_local = 0
+        self.chunks_remote = 0
+        self.remote_calls = 0
+        self.local_seconds = 0.0
+        self.remote_seconds = 0.0
+
+    def add(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def snapshot(self):
+        with self.lock:
+            pages = self.pages_local + self.pages_remote
+            remote_avg = self.remote_seconds / self.remote_calls if self.remote_calls else None
+            return {
+                "pages_local": self.pages_local,
+                "pages_remote": self.pages_remote,
+                "local_page_fraction": self.pages_local / pages if pages else 0.0,
+                "chunks_local": self.chunks_local,
+                "chunks_remote": self.chunks_remote,
+                "remote_calls": self.remote_calls,
+                "local_seconds": self.local_seconds,
+                "remote_seconds": self.remote_seconds,
+                "avg_remote_call_seconds": remote_avg,
+                # Remote calls avoided, at the observed remote latency, minus
+                # all local work (including chunks that fell back anyway)
+                "latency_saved_seconds": (
+                    self.chunks_local * remote_avg - self.local_seconds if remote_avg is not None else None
+                ),
+            }
+
+hybrid_stats = HybridStats()
+
+class HybridBackend:
+    """Local text layer first, Document AI only where it is needed.
+
+    Scanned pages (too little text) are sent to ``remote`` as a sub-chunk.
+    If ``required_fields`` are still missing or below ``min_confidence``
+    once the whole document is merged, its text pages go to ``remote`` too,
+    chunk by chunk in page order, and fill only those fields.
+    """
+    name = "hybrid"
+
+    def __init__(
+        self,
+        remote,
+        local=None,
+        required_fields=LOCAL_TEXT_REQUIRED_FIELDS,
+        min_confidence=LOCAL_TEXT_MIN_CONFIDENCE,
+        stats=hybrid_stats,
+    ):
+        self.remote = remote
+        self.local = local or LocalTextBackend()
+        self.required_fields = tuple(required_fields)
+        self.min_confidence = min_confidence
+        self.stats = stats
+
+    def remote_extract(self, chunk, positions):
+        subset = chunk if len(positions) == len(chunk.pages) else chunk_subset(chunk, positions)
+        started = time.perf_counter()
+        try:
+            return self.remote.extract(subset)
+        finally:
+            self.stats.add(remote_calls=1, remote_seconds=time.perf_counter() - started)
+
+    def document(self):
+        return HybridDocument(self)
+
+    def extract(self, chunk, texts=None):
+        """A single chunk, treated as a whole document."""
+        document = self.document()
+        return document.finish(document.extract(chunk, texts))
+
+class HybridDocument(DocumentExtraction):
+    """HybridBackend state for one document.
+
+    Chunks with text pages are kept until ``finish``, which sends them to
+    Document AI only when the merged document still lacks a required field.
+    """
+
+    def __init__(self, backend):
+        super().__init__(backend, dedupe=True)
+        self.lock = threading.Lock()
+        self.confidence = {}
+        self.chunks = []  # (chunk, text page positions, scanned page count)
+
+    def extract(self, chunk, texts=None):
+        backend = self.backend
+        started = time.perf_counter()
+        texts = backend.local.page_texts(chunk, texts)
+        text_pages = [i for i, text in enumerate(texts) if not backend.local.is_scanned(text)]
+        scanned_pages = [i for i, text in enumerate(texts) if backend.local.is_scanned(text)]
+        fields, confidence = backend.local.extract_texts([texts[i] for i in text_pages])
+        backend.stats.add(local_seconds=time.perf_counter() - started)
+
+        parts = [fields]
+        if scanned_pages:
+            scanned = backend.remote_extract(chunk, scanned_pages)
+            parts.append(scanned)
+            confidence.update({field: 1.0 for field in scanned})
+        with self.lock:
+            for field, value in confidence.items():
+                self.confidence[field] = max(self.confidence.get(field, 0.0), value)
+            self.chunks.append((chunk, text_pages, len(scanned_pages)))
+        return merge_extracted(parts)
+
+    def finish(self, extracted):
+        backend = self.backend
+        extracted = super().finish(extracted)
+        weak = [f for f in backend.required_fields if self.confidence.get(f, 0.0) < backend.min_confidence]
+        sent = set()
+        for chunk, text_pages, _ in sorted(self.chunks, key=lambda item: item[0].index):
+            if not weak:
+                break
+            if not text_pages:
+                continue
+            remote = get_scheduler().run(lambda c: backend.remote_extract(c, text_pages), chunk)
+            sent.add(chunk.index)
+            if "error" in remote:
+                continue
+            for field in [f for f in weak if f in remote]:
+                extracted[field] = remote[field]
+                weak.remove(field)
+
+        pages_local = pages_remote = chunks_remote = 0
+        for chunk, _, scanned in self.chunks:
+            remote_pages = len(chunk.pages) if chunk.index in sent else scanned
+            pages_remote += remote_pages
+            pages_local += len(chunk.pages) - remote_pages
+            chunks_remote += int(remote_pages > 0)
+        backend.stats.add(
+            pages_local=pages_local,
+            pages_remote=pages_remote,
+            chunks_local=len(self.chunks) - chunks_remote,
+            chunks_remote=chunks_remote,
+        )
+        PAGES_SERVED.labels("local").inc(pages_local)
+        PAGES_SERVED.labels("remote").inc(pages_remote)
+        return extracted
+
+# -----------------------
+# Selection
+# -----------------------
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_extraction_backend(
+    project_id=PROJECT_ID, location=LOCATION, processor_id=PROCESSOR_ID, kind=EXTRACTION_BACKEND, processor_version_id=None
+):
+    """Process-wide backend of ``kind`` ("documentai", "local" or "hybrid")
+    for the given processor."""
+    key = (kind, project_id, location, processor_id, processor_version_id)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if kind == "documentai":
+                backend = DocumentAIBackend(project_id, location, processor_id, processor_version_id)
+            elif kind == "local":
+                backend = LocalTextBackend()
+            elif kind == "hybrid":
+                backend = HybridBackend(DocumentAIBackend(project_id, location, processor_id, processor_version_id))
+            else:
+                raise ValueError(f"Unknown extraction backend: {kind}")
+            _backends[key] = backend
+        return backend
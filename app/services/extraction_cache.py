@@ -0,0 +1,178 @@
+# app/services/extraction_cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from app.config import (
+    EXTRACTION_CACHE_EVICT_EVERY,
+    EXTRACTION_CACHE_MAX_ENTRIES,
+    EXTRACTION_CACHE_PATH,
+    EXTRACTION_CACHE_TTL_SECONDS,
+)
+from app.metrics import CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+def cache_key(content, processor_id, processor_version_id=None):
+    """Content address of a chunk for a given processor (and version)."""
+    digest = hashlib.sha256()
+    digest.update(f"{processor_id}:{processor_version_id or ''}:".encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """SQLite-backed store of extracted dicts keyed by chunk hash.
+
+    Entries older than ``ttl_seconds`` are ignored; every ``evict_every``
+    stores the expired ones are purged and, above ``max_entries``, the least
+    recently used ones evicted.
+
+    The cache fails open: if the file can't be opened (e.g. a read-only
+    filesystem) or a lookup/store errors (e.g. "database is locked" while
+    other processes write), the error is logged and treated as a miss or a
+    skipped store.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+                 ttl_seconds=EXTRACTION_CACHE_TTL_SECONDS, evict_every=EXTRACTION_CACHE_EVICT_EVERY):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_every = max(evict_every, 1)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.puts = 0
+        self.lock = threading.Lock()
+        self.conn = None
+        try:
+            self.conn = self._connect(path)
+        except sqlite3.Error as e:
+            self.errors += 1
+            logger.warning(f"⚠️ Extraction cache disabled, can't open {path}: {e}")
+
+    @staticmethod
+    def _connect(path):
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS extraction_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_accessed ON extraction_cache (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_created ON extraction_cache (created_at)")
+            conn.commit()
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    def _failed(self, action, error):
+        self.errors += 1
+        logger.warning(f"⚠️ Extraction cache {action} failed, continuing without it: {error}")
+        if self.conn is not None and self.conn.in_transaction:
+            try:
+                self.conn.rollback()
+            except sqlite3.Error:
+                pass
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = None
+            if self.conn is not None:
+                try:
+                    row = self.conn.execute(
+                        "SELECT value, created_at FROM extraction_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None and not (self.ttl_seconds and now - row[1] > self.ttl_seconds):
+                        self.conn.execute("UPDATE extraction_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                        self.conn.commit()
+                        extracted = json.loads(row[0])
+                        self.hits += 1
+                        CACHE_HITS.inc()
+                        return extracted
+                except (sqlite3.Error, ValueError) as e:
+                    self._failed("lookup", e)
+            self.misses += 1
+        CACHE_MISSES.inc()
+        return None
+
+    def put(self, key, extracted):
+        now = time.time()
+        with self.lock:
+            if self.conn is None:
+                return
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(extracted), now, now),
+                )
+                self.puts += 1
+                if self.puts % self.evict_every == 0:
+                    self._evict(now)
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self._failed("store", e)
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self.conn.execute("DELETE FROM extraction_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        if self.max_entries:
+            excess = self.conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    """
+                    DELETE FROM extraction_cache WHERE key IN (
+                        SELECT key FROM extraction_cache ORDER BY accessed_at LIMIT ?
+                    )
+                    """,
+                    (excess,),
+                )
+
+    def get_or_extract(self, content, processor_id, processor_version_id, extract):
+        """Return the cached dict for ``content`` or call ``extract(content)``
+        and store its result. Errors raised by ``extract`` are not cached."""
+        key = cache_key(content, processor_id, processor_version_id)
+        extracted = self.get(key)
+        if extracted is None:
+            extracted = extract(content)
+            self.put(key, extracted)
+        return extracted
+
+    def stats(self):
+        entries = None
+        with self.lock:
+            if self.conn is not None:
+                try:
+                    entries = self.conn.execute("SELECT COUNT(*) FROM extraction_cache").fetchone()[0]
+                except sqlite3.Error as e:
+                    self._failed("count", e)
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.conn is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "errors": self.errors,
+            "entries": entries,
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_extraction_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
@@ -0,0 +1,134 @@
+# app/services/extraction_scheduler.py
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.config import (
+    DOCUMENTAI_QPS,
+    EXTRACTION_BACKOFF_BASE,
+    EXTRACTION_BACKOFF_MAX,
+    EXTRACTION_MAX_IN_FLIGHT,
+    EXTRACTION_MAX_RETRIES,
+)
+from app.metrics import EXTRACTION_ERROR, EXTRACTION_OK, EXTRACTION_RETRIES
+from app.services.documentai_service import merge_extracted
+
+logger = logging.getLogger(__name__)
+
+# HTTP codes google.api_core exceptions carry for throttling and server errors
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+def is_retryable(exc):
+    return getattr(exc, "code", None) in RETRYABLE_CODES
+
+class TokenBucket:
+    """Thread-safe token bucket; ``acquire`` blocks until a token is free."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_for = (1 - self.tokens) / self.rate
+            time.sleep(wait_for)
+
+class ExtractionScheduler:
+    """Runs chunk extractions concurrently under an in-flight limit and a QPS cap.
+
+    ``extract_fn(chunk)`` must return the extracted dict for one chunk and
+    raise on API errors. Throttling and 5xx errors are retried with
+    full-jitter exponential backoff; anything else (or retries running out)
+    becomes ``{"error": ...}`` for that chunk, as extract_fields_from_pdf does.
+    """
+
+    def __init__(
+        self,
+        max_in_flight=EXTRACTION_MAX_IN_FLIGHT,
+        qps=DOCUMENTAI_QPS,
+        max_retries=EXTRACTION_MAX_RETRIES,
+        backoff_base=EXTRACTION_BACKOFF_BASE,
+        backoff_max=EXTRACTION_BACKOFF_MAX,
+    ):
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(qps) if qps else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="extract")
+        self.retries = 0
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _run_one(self, extract_fn, chunk):
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            if self.bucket:
+                self.bucket.acquire()
+            try:
+                result = extract_fn(chunk)
+                EXTRACTION_OK.observe(time.perf_counter() - started)
+                return result
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    EXTRACTION_ERROR.observe(time.perf_counter() - started)
+                    logger.error(f"❌ Chunk extraction failed after {attempt + 1} attempt(s): {e}")
+                    return {"error": str(e)}
+                delay = self._backoff(attempt)
+                attempt += 1
+                self.retries += 1
+                EXTRACTION_RETRIES.inc()
+                logger.warning(f"🔁 Retrying chunk (attempt {attempt}) in {delay:.2f}s: {e}")
+                time.sleep(delay)
+
+    def run(self, extract_fn, chunk):
+        """Extract one chunk on the calling thread, under the same QPS cap
+        and retry policy."""
+        return self._run_one(extract_fn, chunk)
+
+    def map(self, extract_fn, chunks):
+        """Extract every chunk and return the results in chunk order.
+
+        ``chunks`` may be a lazy iterable; at most ``max_in_flight`` chunks
+        from it are pending at any time.
+        """
+        results = {}
+        pending = {}
+        for position, chunk in enumerate(chunks):
+            if len(pending) >= self.max_in_flight:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+            pending[self.executor.submit(self._run_one, extract_fn, chunk)] = position
+        for future in list(pending):
+            results[pending.pop(future)] = future.result()
+        return [results[i] for i in range(len(results))]
+
+    def extract(self, extract_fn, chunks):
+        """Extract every chunk and merge the results in page order."""
+        return merge_extracted(self.map(extract_fn, chunks))
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Process-wide scheduler, so the QPS cap holds across concurrent requests."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ExtractionScheduler()
+        return _scheduler
@@ -0,0 +1,53 @@
+# app/services/fake_documentai.py
+import hashlib
+import random
+import threading
+import time
+from collections import deque
+
+from google.api_core import exceptions
+
+class FakeDocumentAIProcessor:
+    """Local stand-in for the Document AI processor.
+
+    Simulates per-call latency and enforces its own QPS quota, raising
+    TooManyRequests (HTTP 429) when it is exceeded. ``error_rate`` adds
+    random ServiceUnavailable (503) failures. Results are derived from the
+    chunk bytes, so the same chunk always extracts the same fields.
+    """
+
+    def __init__(self, latency=0.2, jitter=0.0, quota_qps=None, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_qps = quota_qps
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = deque()
+        self.requests = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def _admit(self):
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] >= 1.0:
+                self.calls.popleft()
+            if self.quota_qps and len(self.calls) >= self.quota_qps:
+                self.throttled += 1
+                raise exceptions.TooManyRequests("Quota exceeded for online processing requests")
+            self.calls.append(now)
+            if self.error_rate and self.rng.random() < self.error_rate:
+                self.failed += 1
+                raise exceptions.ServiceUnavailable("The service is currently unavailable")
+            return self.latency + self.rng.uniform(0, self.jitter)
+
+    def extract(self, content):
+        time.sleep(self._admit())
+        digest = hashlib.sha256(content).hexdigest()
+        return {
+            "name": f"patient {digest[:6]}",
+            "dob": f"19{int(digest[6:8], 16) % 90 + 10}-0{int(digest[8], 16) % 9 + 1}-1{int(digest[9], 16) % 9}",
+            "referral": f"chunk {digest[10:16]}",
+        }
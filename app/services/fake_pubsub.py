@@ -0,0 +1,96 @@
+# app/services/fake_pubsub.py
+import itertools
+import threading
+from concurrent.futures import Future
+
+class FakeMessage:
+    """In-process stand-in for a received Pub/Sub message."""
+
+    def __init__(self, subscriber, data, message_id, delivery_attempt=1):
+        self.subscriber = subscriber
+        self.data = data
+        self.message_id = message_id
+        self.delivery_attempt = delivery_attempt
+        self.ack_deadline_extensions = 0
+        self.settled = False
+
+    def ack(self):
+        self.subscriber._settle(self, acked=True)
+
+    def nack(self):
+        self.subscriber._settle(self, acked=False)
+
+    def modify_ack_deadline(self, seconds):
+        self.ack_deadline_extensions += 1
+
+class FakeSubscriber:
+    """Drives a subscriber callback the way SubscriberClient.subscribe does.
+
+    Published messages are delivered on a background thread, holding at most
+    ``flow_control.max_messages`` unacked messages at once. Nacked messages
+    are redelivered with an incremented delivery_attempt.
+    """
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+        self.condition = threading.Condition()
+        self.queue = []
+        self.outstanding = 0
+        self.acked = []
+        self.nacked = []
+        self.callback = None
+        self.max_messages = None
+        self.future = None
+
+    def subscription_path(self, project, subscription):
+        return f"projects/{project}/subscriptions/{subscription}"
+
+    def publish(self, data):
+        with self.condition:
+            self.queue.append(FakeMessage(self, data, str(next(self.ids))))
+            self.condition.notify_all()
+
+    def subscribe(self, subscription_path, callback, flow_control=None, scheduler=None):
+        self.callback = callback
+        self.max_messages = getattr(flow_control, "max_messages", None)
+        self.future = Future()
+        threading.Thread(target=self._deliver, name="fake-pull", daemon=True).start()
+        return self.future
+
+    def _deliver(self):
+        while not self.future.done():
+            with self.condition:
+                while not self.future.done() and (
+                    not self.queue or (self.max_messages and self.outstanding >= self.max_messages)
+                ):
+                    self.condition.wait(0.1)
+                if self.future.done():
+                    return
+                message = self.queue.pop(0)
+                self.outstanding += 1
+            self.callback(message)
+
+    def _settle(self, message, acked):
+        with self.condition:
+            # Like the real client, only the first ack/nack counts
+            if message.settled:
+                return
+            message.settled = True
+            self.outstanding -= 1
+            if acked:
+                self.acked.append(message)
+            else:
+                self.nacked.append(message)
+                self.queue.append(
+                    FakeMessage(self, message.data, message.message_id, message.delivery_attempt + 1)
+                )
+            self.condition.notify_all()
+
+    def wait_until_idle(self, timeout=10):
+        """Block until every published message has been acked."""
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.outstanding, timeout)
+
+    def close(self):
+        if self.future:
+            self.future.cancel()
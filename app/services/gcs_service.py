@@ -1,14 +1,184 @@
 from google.cloud import storage
+import hashlib
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+logger = logging.getLogger(__name__)
+
 BUCKET_NAME = os.getenv("GCS_BUCKET_NAME")
 
+# "gcs" or "local"; the local backend stores objects under LOCAL_GCS_DIR
+GCS_BACKEND = os.getenv("GCS_BACKEND", "gcs")
+LOCAL_GCS_DIR = os.getenv("LOCAL_GCS_DIR", "local_gcs")
+# Resumable upload chunk size; must be a multiple of 256 KiB
+UPLOAD_CHUNK_SIZE = int(os.getenv("GCS_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_WORKERS = int(os.getenv("GCS_UPLOAD_WORKERS", "8"))
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_storage_client():
+    """Process-wide storage client, so its authorized HTTP session is reused."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = storage.Client()
+        return _client
+
+
+class HashingReader:
+    """File wrapper computing MD5/SHA-256 of the bytes read through it.
+
+    Bytes re-read after a seek (resumable upload retries) are hashed once.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.md5 = hashlib.md5()
+        self.sha256 = hashlib.sha256()
+        self.position = 0
+        self.hashed = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        end = self.position + len(data)
+        if end > self.hashed:
+            tail = data[self.hashed - self.position:]
+            self.md5.update(tail)
+            self.sha256.update(tail)
+            self.hashed = end
+        self.position = end
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        self.position = self.raw.seek(offset, whence)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+    def digests(self):
+        return {"md5": self.md5.hexdigest(), "sha256": self.sha256.hexdigest(), "size": self.hashed}
+
+
+# -----------------------
+# Backends
+# -----------------------
+class GCSBackend:
+    def path_for(self, filename):
+        return f"gs://{BUCKET_NAME}/{filename}"
+
+    def upload(self, stream, filename, content_type):
+        blob = get_storage_client().bucket(BUCKET_NAME).blob(filename, chunk_size=UPLOAD_CHUNK_SIZE)
+        blob.upload_from_file(stream, content_type=content_type)
+        return self.path_for(filename)
+
+    def download(self, bucket_name, blob_name):
+        return get_storage_client().bucket(bucket_name).blob(blob_name).download_as_bytes()
+
+
+class LocalStorageBackend:
+    """Offline stand-in for GCS that stores objects as files under ``root``.
+
+    ``latency`` seconds are slept per UPLOAD_CHUNK_SIZE chunk to simulate
+    network round trips in benchmarks.
+    """
+
+    def __init__(self, root=LOCAL_GCS_DIR, latency=0.0):
+        self.root = root
+        self.latency = latency
+
+    def path_for(self, filename):
+        return f"gs://{BUCKET_NAME or 'local'}/{filename}"
+
+    def _path(self, bucket_name, blob_name):
+        return os.path.join(self.root, bucket_name or "local", blob_name)
+
+    def upload(self, stream, filename, content_type):
+        path = self._path(BUCKET_NAME, filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            for chunk in iter(lambda: stream.read(UPLOAD_CHUNK_SIZE), b""):
+                if self.latency:
+                    time.sleep(self.latency)
+                f.write(chunk)
+        return self.path_for(filename)
+
+    def download(self, bucket_name, blob_name):
+        with open(self._path(bucket_name, blob_name), "rb") as f:
+            return f.read()
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = LocalStorageBackend() if GCS_BACKEND == "local" else GCSBackend()
+    return _backend
+
+
+# -----------------------
+# Uploads / downloads
+# -----------------------
+def upload_file(file_obj, filename: str, content_type="application/pdf") -> dict:
+    """Stream ``file_obj`` to storage, hashing it on the way.
+
+    Returns {"gcs_path", "md5", "sha256", "size"}.
+    """
+    reader = HashingReader(file_obj)
+    gcs_path = get_backend().upload(reader, filename, content_type)
+    return {"gcs_path": gcs_path, **reader.digests()}
+
+
+def gcs_path_for(filename: str) -> str:
+    """The gs:// path ``filename`` will have once uploaded."""
+    return get_backend().path_for(filename)
+
+
 def upload_file_to_gcs(file_obj, filename: str) -> str:
-    client = storage.Client()
-    bucket = client.bucket(BUCKET_NAME)
-    blob = bucket.blob(filename)
+    return upload_file(file_obj, filename)["gcs_path"]
+
+
+def upload_files_to_gcs(files, max_workers=UPLOAD_WORKERS):
+    """Upload (file_obj, filename) pairs in parallel.
+
+    Returns one result per input, in order: the upload_file dict, or
+    {"error": ...}. Files whose SHA-256 matches an earlier file in the same
+    call carry "duplicate_of" with that file's filename.
+    """
+    def upload_one(item):
+        file_obj, filename = item
+        try:
+            return upload_file(file_obj, filename)
+        except Exception as e:
+            logger.error(f"❌ Failed to upload {filename}: {e}")
+            return {"error": str(e)}
+
+    if not files:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(files))) as executor:
+        results = list(executor.map(upload_one, files))
+
+    first_by_hash = {}
+    for (_, filename), result in zip(files, results):
+        sha256 = result.get("sha256")
+        if sha256 is None:
+            continue
+        if sha256 in first_by_hash:
+            result["duplicate_of"] = first_by_hash[sha256]
+        else:
+            first_by_hash[sha256] = filename
+    return results
 
-    blob.upload_from_file(file_obj, content_type="application/pdf")
 
-    return f"gs://{BUCKET_NAME}/{filename}"
\ No newline at end of file
+def download_file_from_gcs(gcs_path: str) -> bytes:
+    """Download a gs://bucket/name object into memory."""
+    bucket_name, blob_name = gcs_path[len("gs://"):].split("/", 1)
+    return get_backend().download(bucket_name, blob_name)
@@ -0,0 +1,241 @@
+# app/services/incremental_matcher.py
+"""Incrementally re-match stored extractions when the dataset changes.
+
+    python -m app.services.incremental_matcher --batch-size 200
+
+extracted_fields is the durable input, so no PDF is re-read and Document AI
+is never called. A document's matches cover the dataset rows up to its
+``document_match_watermarks.dataset_record_id`` and its extracted fields up
+to ``extracted_field_id``:
+
+- documents with newer extracted fields (or no watermark yet, or any
+  document when BLOCKING_TOP_K is set) are matched against the whole
+  dataset and their matches replaced;
+- the others only score the dataset rows added since their watermark, and
+  the survivors are merged into their retained matches.
+
+Both go through match_policy, so blocking and retention are the worker's.
+Each batch of documents is committed together with its watermarks, so an
+interrupted run resumes where it stopped.
+"""
+import argparse
+import logging
+
+import numpy as np
+from sqlalchemy import delete, func, or_, select
+
+from app.config import BLOCKING_TOP_K, MATCH_RETENTION_MIN_SCORE, MATCH_RETENTION_TOP_K, REMATCH_BATCH_DOCUMENTS
+from app.db import SessionLocal
+from app.models.tables import Document, Match, MatchStats
+from app.services.match_policy import match_documents
+from app.services.match_store import (
+    dataset_high_water,
+    latest_field_id,
+    load_dataset_records,
+    load_extracted_many,
+    record_watermarks,
+    watermarks,
+)
+from app.services.match_writer import MatchWriter, match_params
+from app.services.matching_service import combined_scores
+
+logger = logging.getLogger(__name__)
+
+# Result record keys of the columns combined_scores weighs
+RECORD_SCORE_KEYS = {"name_score": "Name_Score", "dob_match": "DOB_Match", "doa_match": "DOA_Match", "referral_score": "Referral_Score"}
+
+# -----------------------
+# Watermarks
+# -----------------------
+def _pending_query(high_water):
+    latest = latest_field_id()
+    return (
+        select(
+            Document.id,
+            watermarks.c.dataset_record_id,
+            watermarks.c.extracted_field_id,
+            latest.label("latest_field_id"),
+        )
+        .outerjoin(watermarks, watermarks.c.document_id == Document.id)
+        .where(Document.status == "completed", latest.is_not(None))
+        .where(or_(
+            watermarks.c.document_id.is_(None),
+            watermarks.c.dataset_record_id < high_water,
+            latest > watermarks.c.extracted_field_id,
+        ))
+    )
+
+def pending_documents(db_session, high_water, limit):
+    """Completed documents whose matches are behind the dataset or their extractions."""
+    return db_session.execute(_pending_query(high_water).order_by(Document.id).limit(limit)).fetchall()
+
+def count_pending(db_session, high_water=None):
+    if high_water is None:
+        high_water = dataset_high_water(db_session)
+    return db_session.execute(select(func.count()).select_from(_pending_query(high_water).subquery())).scalar()
+
+# -----------------------
+# Matching
+# -----------------------
+def _retention_stats(document_id, dataset_rows, evaluated, retained):
+    return MatchStats(
+        document_id=document_id,
+        dataset_rows=dataset_rows,
+        candidates_evaluated=evaluated,
+        candidates_discarded=evaluated - retained,
+        rows_retained=retained,
+        retention_top_k=MATCH_RETENTION_TOP_K,
+        retention_min_score=MATCH_RETENTION_MIN_SCORE,
+    )
+
+def rematch_full(db_session, document_ids, extracted, dataset, writer):
+    """Replace the matches of ``document_ids`` with a match against all of ``dataset``.
+    Returns ``(written, removed, rows_scored)``."""
+    removed = db_session.execute(delete(Match).where(Match.document_id.in_(document_ids))).rowcount
+    written = scored = 0
+    results = match_documents(db_session, [extracted[i] for i in document_ids], dataset)
+    for document_id, (records, evaluated) in zip(document_ids, results):
+        writer.add_many(match_params(document_id, record, extracted[document_id]) for record in records)
+        db_session.merge(_retention_stats(document_id, len(dataset), evaluated, len(records)))
+        written += len(records)
+        scored += evaluated
+    return written, removed, scored
+
+def _combined(values_by_key):
+    """combined_scores over per-column value lists; NULLs count as 0/False."""
+    return combined_scores({
+        key: np.array([value or 0 for value in values], dtype=bool if key.endswith("_match") else np.float64)
+        for key, values in values_by_key.items()
+    }).tolist()
+
+def _retained_scores(db_session, document_ids):
+    """Combined score and id of every retained match, per document."""
+    rows = db_session.execute(
+        select(Match.id, Match.document_id, *(getattr(Match, key) for key in RECORD_SCORE_KEYS))
+        .where(Match.document_id.in_(document_ids))
+    ).fetchall()
+    retained = {document_id: [] for document_id in document_ids}
+    combined = _combined({key: [row._mapping[key] for row in rows] for key in RECORD_SCORE_KEYS})
+    for row, score in zip(rows, combined):
+        retained[row.document_id].append((score, row.id))
+    return retained
+
+def rematch_delta(db_session, document_ids, extracted, delta, writer):
+    """Score only the new dataset rows in ``delta`` and merge the survivors
+    into the retained matches of ``document_ids``.
+    Returns ``(written, removed, rows_scored)``."""
+    results = match_documents(db_session, [extracted[i] for i in document_ids], delta)
+    retained = _retained_scores(db_session, document_ids) if MATCH_RETENTION_TOP_K else {}
+    stats = {
+        row.document_id: row
+        for row in db_session.execute(select(MatchStats).where(MatchStats.document_id.in_(document_ids))).scalars()
+    }
+    written, scored, evicted = 0, 0, []
+    for document_id, (records, evaluated) in zip(document_ids, results):
+        scored += evaluated
+        kept, dropped = records, []
+        if MATCH_RETENTION_TOP_K and records:
+            # Existing rows win ties, as earlier dataset rows do in match_retained
+            new_scores = _combined({key: [r[name] for r in records] for key, name in RECORD_SCORE_KEYS.items()})
+            candidates = [(score, 1, match_id) for score, match_id in retained[document_id]]
+            candidates += [(score, 0, record) for score, record in zip(new_scores, records)]
+            candidates.sort(key=lambda item: item[:2], reverse=True)
+            kept = [item for _, existing, item in candidates[:MATCH_RETENTION_TOP_K] if not existing]
+            dropped = [item for _, existing, item in candidates[MATCH_RETENTION_TOP_K:] if existing]
+            evicted += dropped
+        writer.add_many(match_params(document_id, record, extracted[document_id]) for record in kept)
+        written += len(kept)
+
+        previous = stats.get(document_id)
+        db_session.merge(_retention_stats(
+            document_id,
+            (previous.dataset_rows or 0 if previous else 0) + len(delta),
+            (previous.candidates_evaluated or 0 if previous else 0) + evaluated,
+            (previous.rows_retained or 0 if previous else 0) + len(kept) - len(dropped),
+        ))
+    if evicted:
+        db_session.execute(delete(Match).where(Match.id.in_(evicted)))
+    return written, len(evicted), scored
+
+def rematch(db_session, batch_size=REMATCH_BATCH_DOCUMENTS, max_batches=None):
+    """Bring the matches of every completed document up to the current dataset.
+
+    Runs until nothing is pending or ``max_batches`` batches of
+    ``batch_size`` documents were committed. Returns counts of the work done
+    and of the documents still pending.
+    """
+    high_water = dataset_high_water(db_session)
+    totals = {
+        "dataset_watermark": high_water,
+        "batches": 0,
+        "documents_full": 0,
+        "documents_incremental": 0,
+        "dataset_rows_scored": 0,
+        "matches_written": 0,
+        "matches_removed": 0,
+    }
+    full_dataset, deltas = None, {}
+    while max_batches is None or totals["batches"] < max_batches:
+        pending = pending_documents(db_session, high_water, batch_size)
+        if not pending:
+            break
+        extracted = load_extracted_many(db_session, [row.id for row in pending])
+        writer = MatchWriter(db_session)
+
+        # A document's blocking candidates shift as the dataset grows, so with
+        # blocking every document is re-matched in full; that only scores its
+        # BLOCKING_TOP_K candidates, not the whole dataset
+        full = [
+            row.id for row in pending
+            if BLOCKING_TOP_K or row.dataset_record_id is None or row.latest_field_id > row.extracted_field_id
+        ]
+        if full:
+            if full_dataset is None:
+                full_dataset = load_dataset_records(db_session, up_to_id=high_water)
+            written, removed, scored = rematch_full(db_session, full, extracted, full_dataset, writer)
+            totals["documents_full"] += len(full)
+            totals["dataset_rows_scored"] += scored
+            totals["matches_written"] += written
+            totals["matches_removed"] += removed
+
+        # Documents last matched at the same watermark share one delta
+        by_watermark = {}
+        full_ids = set(full)
+        for row in pending:
+            if row.id not in full_ids:
+                by_watermark.setdefault(row.dataset_record_id, []).append(row.id)
+        for watermark, document_ids in by_watermark.items():
+            if watermark not in deltas:
+                deltas[watermark] = load_dataset_records(db_session, after_id=watermark, up_to_id=high_water)
+            delta = deltas[watermark]
+            written, removed, scored = rematch_delta(db_session, document_ids, extracted, delta, writer)
+            totals["documents_incremental"] += len(document_ids)
+            totals["dataset_rows_scored"] += scored
+            totals["matches_written"] += written
+            totals["matches_removed"] += removed
+
+        writer.flush()
+        record_watermarks(db_session, [row.id for row in pending], high_water)
+        db_session.commit()
+        totals["batches"] += 1
+        logger.info(
+            f"🔄 Re-matched {len(pending)} documents ({len(full)} full) up to dataset row {high_water}"
+        )
+
+    totals["documents_pending"] = count_pending(db_session, high_water)
+    return totals
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=REMATCH_BATCH_DOCUMENTS, help="documents per transaction")
+    parser.add_argument("--max-batches", type=int, help="stop after this many batches (resume later)")
+    args = parser.parse_args()
+    db = SessionLocal()
+    try:
+        print(rematch(db, args.batch_size, args.max_batches))
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+# app/services/match_policy.py
+"""Blocking and retention policy applied to every match that gets persisted.
+
+The worker and the incremental re-matcher both match through here, so a
+document's stored matches don't depend on which of them produced them.
+"""
+from app.config import BLOCKING_TOP_K, MATCH_RETENTION_MIN_SCORE, MATCH_RETENTION_TOP_K, MATCH_SCORE_BLOCK_SIZE
+from app.services.blocking_index import dataset_candidates, refresh_index
+from app.services.matching_service import match_retained, match_retained_batch
+
+def blocking_candidates(db_session, dataset, extracted_list):
+    """Candidate positions in ``dataset`` per extracted dict, or None when
+    blocking is off.
+
+    Only the rows sharing blocking keys with a document are fuzzy-scored; a
+    document sharing no key at all gets None, i.e. the full scan. ``dataset``
+    may be a slice of dataset_records (e.g. the rows added since a
+    watermark): candidates outside it are dropped.
+    """
+    if not BLOCKING_TOP_K:
+        return None
+    index = refresh_index(db_session)
+    return [dataset_candidates(index, dataset, extracted, BLOCKING_TOP_K) for extracted in extracted_list]
+
+def match_documents(db_session, extracted_list, dataset):
+    """Match each extracted dict against ``dataset`` under BLOCKING_TOP_K and
+    MATCH_RETENTION_*. Returns ``[(records, evaluated), ...]`` in order."""
+    candidates = blocking_candidates(db_session, dataset, extracted_list)
+    if len(extracted_list) == 1:
+        return [match_retained(
+            extracted_list[0],
+            dataset,
+            top_k=MATCH_RETENTION_TOP_K,
+            min_score=MATCH_RETENTION_MIN_SCORE,
+            candidates=candidates[0] if candidates else None,
+            block_size=MATCH_SCORE_BLOCK_SIZE,
+        )]
+    # Several documents share one N×M pass over the union of their candidates
+    return match_retained_batch(
+        extracted_list,
+        dataset,
+        top_k=MATCH_RETENTION_TOP_K,
+        min_score=MATCH_RETENTION_MIN_SCORE,
+        block_size=MATCH_SCORE_BLOCK_SIZE,
+        candidates=candidates,
+    )
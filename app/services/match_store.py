@@ -0,0 +1,100 @@
+# app/services/match_store.py
+"""Stored matching inputs and watermarks, shared by the worker and the
+incremental re-matcher."""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from app.config import DATASET_INGEST_TIMEOUT_SECONDS
+from app.models.tables import DatasetIngest, DatasetRecord, Document, DocumentMatchWatermark, ExtractedField
+from app.services.matching_service import prepare_records
+
+watermarks = DocumentMatchWatermark.__table__
+
+# -----------------------
+# Loading
+# -----------------------
+def load_dataset_records(db_session, after_id=0, up_to_id=None):
+    """Prepared dataset_records with ``after_id < id <= up_to_id``, indexed by id."""
+    query = select(
+        DatasetRecord.id,
+        DatasetRecord.dataset_name,
+        DatasetRecord.dataset_doa,
+        DatasetRecord.dataset_dob,
+        DatasetRecord.dataset_referral,
+    ).where(DatasetRecord.id > after_id)
+    if up_to_id is not None:
+        query = query.where(DatasetRecord.id <= up_to_id)
+    return prepare_records(db_session.execute(query.order_by(DatasetRecord.id)).fetchall())
+
+def load_dataset_snapshot(db_session):
+    """The dataset_records up to dataset_high_water, with that horizon as
+    ``dataset.watermark`` for record_watermarks."""
+    horizon = dataset_high_water(db_session)
+    dataset = load_dataset_records(db_session, up_to_id=horizon)
+    dataset.watermark = horizon
+    return dataset
+
+def load_extracted_many(db_session, document_ids):
+    """Rebuild the extracted dict of each document from its extracted_fields rows."""
+    rows = db_session.execute(
+        select(ExtractedField.document_id, ExtractedField.field_name, ExtractedField.field_value)
+        .where(ExtractedField.document_id.in_(document_ids))
+        .order_by(ExtractedField.id)
+    ).fetchall()
+    extracted = {document_id: {} for document_id in document_ids}
+    for document_id, field_name, field_value in rows:
+        fields = extracted[document_id]
+        if field_name in fields:
+            fields[field_name] += f"; {field_value}"
+        else:
+            fields[field_name] = field_value
+    return extracted
+
+def load_extracted_fields(db_session, document_id):
+    """Rebuild the extracted dict for a document from its extracted_fields rows."""
+    return load_extracted_many(db_session, [document_id])[document_id]
+
+# -----------------------
+# Watermarks
+# -----------------------
+def dataset_high_water(db_session):
+    """Highest dataset_records id below which every row is committed.
+
+    Ids are assigned at insert, so an upload still running may commit ids
+    lower than rows already visible; max(id) alone would let a watermark
+    skip them for good. The horizon therefore stops at the floor of the
+    oldest unfinished upload (see dataset_ingest.begin_ingest). Rows inserted
+    without registering an upload are not covered.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=DATASET_INGEST_TIMEOUT_SECONDS)
+    # One statement, so both values come from the same snapshot
+    high, floor = db_session.execute(select(
+        select(func.coalesce(func.max(DatasetRecord.id), 0)).scalar_subquery(),
+        select(func.min(DatasetIngest.floor_record_id))
+        .where(DatasetIngest.finished_at.is_(None), DatasetIngest.started_at > cutoff)
+        .scalar_subquery(),
+    )).one()
+    return high if floor is None else min(high, floor)
+
+def latest_field_id():
+    """Correlated subquery: the newest extracted_fields id of ``Document.id``."""
+    return (
+        select(func.max(ExtractedField.id))
+        .where(ExtractedField.document_id == Document.id)
+        .scalar_subquery()
+    )
+
+def record_watermarks(db_session, document_ids, dataset_record_id):
+    """Mark ``document_ids`` as matched against the dataset rows up to
+    ``dataset_record_id`` and their extracted fields as of now."""
+    if not document_ids:
+        return
+    db_session.execute(delete(watermarks).where(watermarks.c.document_id.in_(document_ids)))
+    db_session.execute(
+        insert(watermarks).from_select(
+            ["document_id", "dataset_record_id", "extracted_field_id"],
+            select(Document.id, literal(dataset_record_id), func.coalesce(latest_field_id(), 0))
+            .where(Document.id.in_(document_ids)),
+        )
+    )
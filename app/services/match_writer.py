@@ -0,0 +1,90 @@
+# app/services/match_writer.py
+import logging
+import time
+
+from sqlalchemy import insert
+
+from app.config import MATCH_INSERT_BATCH_SIZE, MATCH_INSERT_METHOD
+from app.metrics import DB_WRITE_SECONDS
+from app.models.tables import Match
+from app.services.date_normalization import MISSING, to_date
+from app.services.pg_copy import copy_rows
+
+logger = logging.getLogger(__name__)
+
+MATCH_COLUMNS = [
+    "document_id", "dataset_index", "dataset_name", "dataset_doa", "dataset_dob", "dataset_referral",
+    "extracted_name", "extracted_doa", "extracted_dob", "extracted_referral",
+    "name_score", "doa_match", "dob_match", "referral_score", "referral_match", "match_status",
+]
+
+WRITE_SECONDS = DB_WRITE_SECONDS.labels("matches")
+
+def ensure_date(value):
+    """Convert value to datetime.date or return None for invalid/unparseable dates."""
+    parsed = to_date(value)
+    if parsed is None and isinstance(value, str) and value.strip() not in MISSING and "N/A" not in value:
+        logger.warning(f"Failed to parse date: {value}")
+    return parsed
+
+def match_params(document_id, result, extracted):
+    """Map one matcher result onto the columns of the matches table."""
+    return {
+        "document_id": document_id,
+        "dataset_index": result["Dataset_Index"],
+        "dataset_name": result["Dataset_Name"],
+        "dataset_doa": ensure_date(result["Dataset_DOA"]),
+        "dataset_dob": ensure_date(result["Dataset_DOB"]),
+        "dataset_referral": result["Dataset_Referral"],
+        "extracted_name": result["Extracted_Name"],
+        "extracted_doa": ensure_date(extracted.get("doa")),
+        "extracted_dob": ensure_date(extracted.get("dob")),
+        "extracted_referral": result["Extracted_Referral"],
+        "name_score": result["Name_Score"],
+        "doa_match": result["DOA_Match"],
+        "dob_match": result["DOB_Match"],
+        "referral_score": result["Referral_Score"],
+        "referral_match": result["Referral_Match"],
+        "match_status": result["Match_Status"],
+    }
+
+class MatchWriter:
+    """Buffers match rows and writes them to ``matches`` in bulk.
+
+    ``method`` is "executemany" (multi-row INSERT batches through SQLAlchemy's
+    insertmanyvalues) or "copy" (a Postgres COPY stream). Rows are flushed
+    every ``batch_size`` rows; committing is left to the caller.
+    """
+
+    def __init__(self, db_session, batch_size=MATCH_INSERT_BATCH_SIZE, method=MATCH_INSERT_METHOD):
+        if method not in ("executemany", "copy"):
+            raise ValueError(f"Unknown match insert method: {method}")
+        self.db_session = db_session
+        self.batch_size = batch_size
+        self.method = method
+        self.buffer = []
+        self.rows_written = 0
+
+    def add(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        started = time.perf_counter()
+        if self.method == "copy":
+            self._copy(self.buffer)
+        else:
+            self.db_session.execute(insert(Match.__table__), self.buffer)
+        WRITE_SECONDS.observe(time.perf_counter() - started)
+        self.rows_written += len(self.buffer)
+        self.buffer = []
+
+    def _copy(self, rows):
+        copy_rows(self.db_session, "matches", MATCH_COLUMNS, ([row.get(col) for col in MATCH_COLUMNS] for row in rows))
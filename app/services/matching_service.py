@@ -0,0 +1,385 @@
+# app/services/matching_service.py
+import heapq
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+from app.config import MATCH_WORKERS
+from app.metrics import MATCH_SECONDS, dataset_size_label
+from app.services.date_normalization import parse_date, parse_dates
+
+NAME_COLUMNS = ["Name", "Client Name", "Patient Name", "Full Name"]
+DOA_COLUMNS = ["DOA", "Date of Accident", "Date of Injury", "Service Date"]
+DOB_COLUMNS = ["DOB", "Date of Birth", "Birth Date", "Birth"]
+REFERRAL_COLUMNS = ["Referral", "Reason for Visit", "Referral Notes", "Instructions"]
+
+NAME_MATCH_THRESHOLD = 90
+REFERRAL_MATCH_THRESHOLD = 70
+
+# Weights of the 0-100 combined score used to rank candidates for retention
+COMBINED_WEIGHTS = {"name_score": 0.5, "dob_match": 0.2, "doa_match": 0.15, "referral_score": 0.15}
+
+# -----------------------
+# Normalization helpers
+# -----------------------
+def preprocess_string(value):
+    return str(value).strip().lower() if value else ""
+
+def detect_column(df, possible_names, threshold=80):
+    best_col, best_score = None, 0
+    for col in df.columns:
+        for name in possible_names:
+            score = fuzz.ratio(preprocess_string(col), preprocess_string(name))
+            if score > best_score:
+                best_score = score
+                best_col = col
+    return best_col if best_score >= threshold else None
+
+def normalize_strings(values):
+    """Vectorized preprocess_string over a sequence of raw values."""
+    return [str(v).strip().lower() if v else "" for v in values]
+
+def _scalar_date(value):
+    if value is None or pd.isna(value):
+        return np.datetime64("NaT", "us")
+    return np.datetime64(value.to_datetime64(), "us")
+
+# -----------------------
+# Columnar dataset
+# -----------------------
+class DatasetColumns:
+    """Dataset normalized once into arrays for bulk scoring.
+
+    ``raw_*`` hold the original cell values used in result records; ``names``,
+    ``referrals``, ``doa`` and ``dob`` hold the normalized arrays the scorers
+    run against.
+    """
+
+    def __init__(self, index, raw_name, raw_doa, raw_dob, raw_referral):
+        self.index = list(index)
+        self.raw_name = list(raw_name)
+        self.raw_doa = list(raw_doa)
+        self.raw_dob = list(raw_dob)
+        self.raw_referral = list(raw_referral)
+
+        self.names = normalize_strings(self.raw_name)
+        self.referrals = normalize_strings(self.raw_referral)
+        self.doa = parse_dates(self.raw_doa)
+        self.dob = parse_dates(self.raw_dob)
+
+    @classmethod
+    def from_arrays(cls, index, raw_name, raw_doa, raw_dob, raw_referral, names, referrals, doa, dob):
+        """Wrap already normalized arrays (e.g. a compiled dataset artifact).
+        The raw columns are kept as given, e.g. lazily decoded sequences."""
+        dataset = object.__new__(cls)
+        dataset.index = list(index)
+        dataset.raw_name = raw_name
+        dataset.raw_doa = raw_doa
+        dataset.raw_dob = raw_dob
+        dataset.raw_referral = raw_referral
+        dataset.names = names
+        dataset.referrals = referrals
+        dataset.doa = doa
+        dataset.dob = dob
+        return dataset
+
+    def __len__(self):
+        return len(self.index)
+
+    def take(self, positions):
+        """Return a DatasetColumns holding only the rows at ``positions``."""
+        subset = object.__new__(DatasetColumns)
+        if isinstance(positions, range) and positions.step == 1:
+            # Contiguous block: slice, leaving the date arrays as views
+            rows = slice(positions.start, positions.stop)
+            for attr in ("index", "raw_name", "raw_doa", "raw_dob", "raw_referral", "names", "referrals", "doa", "dob"):
+                setattr(subset, attr, getattr(self, attr)[rows])
+            return subset
+        positions = list(positions)
+        for attr in ("index", "raw_name", "raw_doa", "raw_dob", "raw_referral", "names", "referrals"):
+            values = getattr(self, attr)
+            setattr(subset, attr, [values[i] for i in positions])
+        subset.doa = self.doa[positions]
+        subset.dob = self.dob[positions]
+        return subset
+
+def prepare_records(rows):
+    """Build a DatasetColumns from ``dataset_records`` rows, indexed by id."""
+    rows = list(rows)
+    return DatasetColumns(
+        index=[r.id for r in rows],
+        raw_name=[r.dataset_name for r in rows],
+        raw_doa=[r.dataset_doa for r in rows],
+        raw_dob=[r.dataset_dob for r in rows],
+        raw_referral=[r.dataset_referral for r in rows],
+    )
+
+def prepare_dataset(df):
+    """Resolve the dataset columns of ``df`` and build a DatasetColumns."""
+    n = len(df)
+
+    def column(candidates):
+        col = detect_column(df, candidates)
+        return df[col].tolist() if col is not None else [""] * n
+
+    return DatasetColumns(
+        index=df.index,
+        raw_name=column(NAME_COLUMNS),
+        raw_doa=column(DOA_COLUMNS),
+        raw_dob=column(DOB_COLUMNS),
+        raw_referral=column(REFERRAL_COLUMNS),
+    )
+
+# -----------------------
+# Scoring
+# -----------------------
+def _status_labels(name_match, doa_match, dob_match):
+    return np.select(
+        [
+            name_match & doa_match & dob_match,
+            name_match & (doa_match | dob_match),
+            name_match,
+        ],
+        ["Strong Match", "Probable Match", "Name Match Only"],
+        default="Mismatch",
+    )
+
+def _within_days(ex_dates, dataset_dates, date_tolerance_days):
+    """N×M: whether each extracted date lies within the tolerance of each row's date."""
+    diff = ex_dates[:, None] - dataset_dates[None, :]
+    valid = ~np.isnat(diff)
+    days = np.where(valid, diff, np.timedelta64(0, "us")) // np.timedelta64(1, "D")
+    return valid & (np.abs(days) <= date_tolerance_days)
+
+def _cdist(queries, choices, scorer, workers):
+    # cdist parallelizes over query rows. With fewer documents than threads
+    # the dataset column becomes the queries so every core gets work; both
+    # scorers are symmetric, so the transpose is the same N×M matrix.
+    threads = (os.cpu_count() or 1) if workers == -1 else workers
+    if len(queries) >= threads:
+        return process.cdist(queries, choices, scorer=scorer, dtype=np.float64, workers=workers)
+    return process.cdist(choices, queries, scorer=scorer, dtype=np.float64, workers=workers).T
+
+def score_batch(extracted_list, dataset, date_tolerance_days=3, workers=MATCH_WORKERS):
+    """Score N extracted records against every row of ``dataset`` in one pass.
+
+    Returns the per-record extracted values and a dict of N×M score arrays.
+    Names and referrals are scored with one multi-threaded ``cdist`` each;
+    dates are compared by broadcasting.
+    """
+    values = [
+        (
+            preprocess_string(extracted.get("name")),
+            parse_date(extracted.get("doa")),
+            parse_date(extracted.get("dob")),
+            preprocess_string(extracted.get("referral")),
+        )
+        for extracted in extracted_list
+    ]
+    n, m = len(values), len(dataset)
+
+    if m:
+        name_scores = _cdist([v[0] for v in values], dataset.names, fuzz.token_sort_ratio, workers)
+    else:
+        name_scores = np.zeros((n, 0))
+
+    referral_scores = np.zeros((n, m))
+    with_referral = [i for i, v in enumerate(values) if v[3]]
+    if with_referral and m:
+        referral_scores[with_referral] = _cdist(
+            [values[i][3] for i in with_referral], dataset.referrals, fuzz.partial_ratio, workers
+        )
+        referral_scores[:, np.array([not r for r in dataset.referrals], dtype=bool)] = 0
+
+    ex_doa = np.array([_scalar_date(v[1]) for v in values], dtype="datetime64[us]")
+    ex_dob = np.array([_scalar_date(v[2]) for v in values], dtype="datetime64[us]")
+    doa_match = _within_days(ex_doa, dataset.doa, date_tolerance_days)
+    dob_match = ex_dob[:, None] == dataset.dob[None, :]  # NaT never compares equal
+
+    name_match = name_scores > NAME_MATCH_THRESHOLD
+    scores = {
+        "name_score": name_scores,
+        "doa_match": doa_match,
+        "dob_match": dob_match,
+        "referral_score": referral_scores,
+        "referral_match": referral_scores > REFERRAL_MATCH_THRESHOLD,
+        "match_status": _status_labels(name_match, doa_match, dob_match),
+    }
+    return values, scores
+
+def score_dataset(extracted, dataset, date_tolerance_days=3):
+    """Score one extracted record against every row of ``dataset``.
+
+    Returns the extracted values and a dict of per-row score arrays.
+    """
+    values, scores = score_batch([extracted], dataset, date_tolerance_days)
+    return values[0], {key: matrix[0] for key, matrix in scores.items()}
+
+def build_records(extracted_values, scores, dataset, positions=None):
+    """Turn score arrays into the list of result dicts the API returns."""
+    ex_name, ex_doa, ex_dob, ex_referral = extracted_values
+    if positions is None:
+        positions = range(len(dataset))
+
+    name_scores = scores["name_score"].tolist()
+    doa_match = scores["doa_match"].tolist()
+    dob_match = scores["dob_match"].tolist()
+    referral_scores = scores["referral_score"].tolist()
+    referral_match = scores["referral_match"].tolist()
+    statuses = scores["match_status"].tolist()
+
+    ex_doa_str, ex_dob_str = str(ex_doa), str(ex_dob)
+    return [
+        {
+            "Dataset_Index": dataset.index[i],
+            "Dataset_Name": dataset.raw_name[i],
+            "Dataset_DOA": str(dataset.raw_doa[i]),
+            "Dataset_DOB": str(dataset.raw_dob[i]),
+            "Dataset_Referral": dataset.raw_referral[i],
+            "Extracted_Name": ex_name,
+            "Extracted_DOA": ex_doa_str,
+            "Extracted_DOB": ex_dob_str,
+            "Extracted_Referral": ex_referral,
+            "Name_Score": name_scores[i],
+            "DOA_Match": doa_match[i],
+            "DOB_Match": dob_match[i],
+            "Referral_Score": referral_scores[i],
+            "Referral_Match": referral_match[i],
+            "Match_Status": statuses[i],
+        }
+        for i in positions
+    ]
+
+def match_prepared(extracted, dataset, date_tolerance_days=3, candidates=None):
+    """Match ``extracted`` against ``dataset``.
+
+    ``candidates`` optionally restricts scoring to those row positions, e.g.
+    the top-K positions returned by the blocking index.
+    """
+    with MATCH_SECONDS.labels(dataset_size_label(len(dataset))).time():
+        if candidates is not None:
+            dataset = dataset.take(candidates)
+        extracted_values, scores = score_dataset(extracted, dataset, date_tolerance_days)
+        return build_records(extracted_values, scores, dataset)
+
+# -----------------------
+# Retention
+# -----------------------
+def combined_scores(scores):
+    """Weighted 0-100 score per row; date matches count as 100."""
+    return sum(weight * np.asarray(scores[key], dtype=np.float64) * (100 if scores[key].dtype == bool else 1)
+               for key, weight in COMBINED_WEIGHTS.items())
+
+def match_retained(extracted, dataset, top_k=None, min_score=None, date_tolerance_days=3,
+                   candidates=None, block_size=50000):
+    """Match ``extracted`` against ``dataset``, keeping only the rows worth persisting.
+
+    Rows are scored ``block_size`` at a time. Rows below ``min_score``
+    (combined score) are dropped, and with ``top_k`` a min-heap keeps the
+    best K seen so far, so only survivors are ever turned into records.
+    Returns ``(records, evaluated)``; with ``top_k`` records are ordered by
+    descending combined score, otherwise by dataset order. With neither
+    limit every row is kept, as in match_prepared.
+    """
+    with MATCH_SECONDS.labels(dataset_size_label(len(dataset))).time():
+        if candidates is not None:
+            dataset = dataset.take(candidates)
+        return _match_retained([extracted], dataset, top_k, min_score, date_tolerance_days, block_size)[0]
+
+def _candidate_masks(dataset, candidates):
+    """Restrict ``dataset`` to the union of per-document candidate positions.
+
+    Returns the (possibly smaller) dataset and, per document, a boolean mask
+    over its rows, or None for documents scanning every row.
+    """
+    if candidates is None or all(c is None for c in candidates):
+        return dataset, None
+    if any(c is None for c in candidates):
+        union = range(len(dataset))
+    else:
+        union = sorted(set().union(*candidates))
+        dataset = dataset.take(union)
+    slot = {position: i for i, position in enumerate(union)}
+    masks = []
+    for positions in candidates:
+        if positions is None:
+            masks.append(None)
+            continue
+        mask = np.zeros(len(union), dtype=bool)
+        mask[[slot[p] for p in positions]] = True
+        masks.append(mask)
+    return dataset, masks
+
+def match_retained_batch(extracted_list, dataset, top_k=None, min_score=None, date_tolerance_days=3,
+                         block_size=50000, candidates=None):
+    """match_retained for N documents at once: each block of rows is scored
+    against all of them in one N×M pass. ``candidates`` optionally gives
+    each document's row positions (None: every row), as match_retained
+    takes them; the batch is then scored against their union only. Returns
+    one ``(records, evaluated)`` per document, in order."""
+    if not extracted_list:
+        return []
+    started = time.perf_counter()
+    dataset, masks = _candidate_masks(dataset, candidates)
+    results = _match_retained(extracted_list, dataset, top_k, min_score, date_tolerance_days, block_size, masks)
+    # Observed once per document, at its share of the batch
+    histogram = MATCH_SECONDS.labels(dataset_size_label(len(dataset)))
+    per_document = (time.perf_counter() - started) / len(extracted_list)
+    for _ in extracted_list:
+        histogram.observe(per_document)
+    return results
+
+def match_batch(extracted_list, dataset, date_tolerance_days=3):
+    """Every dataset row for each of N documents, as match_prepared returns
+    for one, scored in a single N×M pass."""
+    return [records for records, _ in match_retained_batch(extracted_list, dataset, date_tolerance_days=date_tolerance_days,
+                                                           block_size=max(len(dataset), 1))]
+
+def _retain(kept, heap, extracted_values, scores, combined, block, start, top_k, min_score, mask=None):
+    positions = np.arange(len(block))
+    if mask is not None:
+        positions = positions[mask]
+    if min_score is not None:
+        positions = positions[combined[positions] >= min_score]
+    if top_k is None:
+        kept.extend(build_records(extracted_values, scores, block, positions.tolist()))
+        return
+    if len(positions) > top_k:
+        # The block's best K, earlier rows winning ties at the cutoff, so
+        # the result doesn't depend on how rows are grouped into blocks
+        values = combined[positions]
+        kth = np.partition(values, len(values) - top_k)[len(values) - top_k]
+        above = positions[values > kth]
+        positions = np.concatenate([above, positions[values == kth][:top_k - len(above)]])
+    if len(heap) == top_k:
+        positions = positions[combined[positions] >= heap[0][0]]
+    positions = positions.tolist()
+    records = build_records(extracted_values, scores, block, positions)
+    for pos, record in zip(positions, records):
+        item = (float(combined[pos]), -(start + pos), record)
+        if len(heap) < top_k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+def _match_retained(extracted_list, dataset, top_k, min_score, date_tolerance_days, block_size, masks=None):
+    n = len(dataset)
+    masks = masks or [None] * len(extracted_list)
+    kept = [[] for _ in extracted_list]
+    heaps = [[] for _ in extracted_list]
+    for start in range(0, n, block_size) if n else ():
+        end = min(start + block_size, n)
+        block = dataset if block_size >= n else dataset.take(range(start, end))
+        values, scores = score_batch(extracted_list, block, date_tolerance_days)
+        combined = combined_scores(scores)
+        for d, extracted_values in enumerate(values):
+            row_scores = {key: matrix[d] for key, matrix in scores.items()}
+            mask = None if masks[d] is None else masks[d][start:end]
+            _retain(kept[d], heaps[d], extracted_values, row_scores, combined[d], block, start, top_k, min_score, mask)
+
+    if top_k is not None:
+        kept = [[record for _, _, record in sorted(heap, key=lambda item: item[:2], reverse=True)] for heap in heaps]
+    return [(records, n if mask is None else int(mask.sum())) for records, mask in zip(kept, masks)]
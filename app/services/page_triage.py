@@ -0,0 +1,148 @@
+# app/services/page_triage.py
+"""Send only the pages likely to hold the fields to the remote processor.
+
+Each page gets a cheap score from its text layer: one point per KEY_MAP
+field whose label appears, plus one for leading/trailing pages (intake and
+billing sheets). Image-only pages can't be scored locally and are always
+sent. Pages are scored lazily while earlier chunks are already being
+extracted.
+"""
+import io
+import logging
+import re
+import threading
+
+from pypdf import PdfReader
+
+from app.config import (
+    LOCAL_TEXT_MIN_CHARS,
+    PAGE_TRIAGE_ENABLED,
+    PAGE_TRIAGE_FALLBACK,
+    PAGE_TRIAGE_LEAD_PAGES,
+    PAGE_TRIAGE_MIN_PAGES,
+    PAGE_TRIAGE_MIN_SCORE,
+    PAGE_TRIAGE_REQUIRED_FIELDS,
+    PAGE_TRIAGE_TAIL_PAGES,
+)
+from app.metrics import TRIAGE_FALLBACKS, TRIAGE_PAGES
+from app.services.documentai_service import KEY_MAP, merge_extracted
+from app.services.extraction_scheduler import get_scheduler
+from app.services.pdf_splitter import iter_pdf_chunks
+
+logger = logging.getLogger(__name__)
+
+SENT = TRIAGE_PAGES.labels("sent")
+SKIPPED = TRIAGE_PAGES.labels("skipped")
+
+# "birth" also matches "Birthdate"
+LABEL_PATTERN = re.compile(
+    r"(?i)(?<!\w)(" + "|".join(r"\s+".join(map(re.escape, label.split())) for label in sorted(KEY_MAP, key=len, reverse=True)) + r")"
+)
+
+def has_images(page):
+    resources = page.get("/Resources") or {}
+    xobjects = resources.get("/XObject") or {}
+    return any(xobject.get_object().get("/Subtype") == "/Image" for xobject in xobjects.values())
+
+def page_text(page):
+    try:
+        return page.extract_text() or ""
+    except Exception as e:  # malformed content streams: score as unreadable
+        logger.warning(f"Text extraction failed during triage: {e}")
+        return ""
+
+def score_page(page, position, total_pages, lead_pages=PAGE_TRIAGE_LEAD_PAGES, tail_pages=PAGE_TRIAGE_TAIL_PAGES, text=None):
+    """Triage score of one page; ``float("inf")`` for image-only pages.
+    ``text`` is the page's text layer when already read."""
+    text = page_text(page) if text is None else text
+    if len(text.strip()) < LOCAL_TEXT_MIN_CHARS:
+        return float("inf") if has_images(page) else 0.0
+    fields = {KEY_MAP[" ".join(label.lower().split())] for label in LABEL_PATTERN.findall(text)}
+    edge = position < lead_pages or position >= total_pages - tail_pages
+    return len(fields) + (1.0 if edge else 0.0)
+
+class TriageStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.documents = 0
+        self.pages_total = 0
+        self.pages_sent = 0
+        self.fallbacks = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for key, value in counts.items():
+                setattr(self, key, getattr(self, key) + value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "documents": self.documents,
+                "pages_total": self.pages_total,
+                "pages_sent": self.pages_sent,
+                "sent_fraction": self.pages_sent / self.pages_total if self.pages_total else 0.0,
+                "fallbacks": self.fallbacks,
+            }
+
+triage_stats = TriageStats()
+
+def candidate_pages(reader, skipped, texts, min_score=PAGE_TRIAGE_MIN_SCORE):
+    """Yield the page numbers worth sending, scoring pages as they are
+    consumed; pages below ``min_score`` are appended to ``skipped``. Each
+    page's text layer is kept in ``texts`` for the extraction backend."""
+    total_pages = len(reader.pages)
+    for position, page in enumerate(reader.pages):
+        texts[position] = page_text(page)
+        if score_page(page, position, total_pages, text=texts[position]) >= min_score:
+            SENT.inc()
+            yield position
+        else:
+            SKIPPED.inc()
+            skipped.append(position)
+
+def extract_pdf(source, backend, wrap_chunks=None, wrap_extract=None, enabled=PAGE_TRIAGE_ENABLED):
+    """Extract a whole PDF with ``backend`` through the scheduler, triaging
+    its pages first when enabled. ``wrap_chunks`` may wrap the chunk
+    iterator (e.g. to time the split) and ``wrap_extract`` the per-chunk
+    extract function (e.g. to time each chunk)."""
+    wrap_chunks = wrap_chunks or (lambda chunks: chunks)
+    scheduler = get_scheduler()
+    document = backend.document()
+    texts = {}  # page number -> text layer read during triage
+
+    def extract_chunk(chunk):
+        return document.extract(chunk, [texts.pop(page, None) for page in chunk.pages])
+
+    extract_fn = wrap_extract(extract_chunk) if wrap_extract else extract_chunk
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    reader = PdfReader(source)
+    total_pages = len(reader.pages)
+    if not enabled or total_pages < PAGE_TRIAGE_MIN_PAGES:
+        return document.finish(scheduler.extract(extract_fn, wrap_chunks(iter_pdf_chunks(reader))))
+
+    skipped = []
+    sent_chunks = []
+
+    def triaged():
+        for chunk in iter_pdf_chunks(reader, pages=candidate_pages(reader, skipped, texts)):
+            sent_chunks.append(chunk.index)
+            yield chunk
+
+    extracted = scheduler.extract(extract_fn, wrap_chunks(triaged()))
+    pages_sent = total_pages - len(skipped)
+
+    missing = [field for field in PAGE_TRIAGE_REQUIRED_FIELDS if field not in extracted]
+    fallback = bool(missing and skipped and PAGE_TRIAGE_FALLBACK)
+    if fallback:
+        logger.info(f"🔁 Triage missed {missing}; extracting the {len(skipped)} skipped pages")
+        rest = scheduler.extract(
+            extract_fn, wrap_chunks(iter_pdf_chunks(reader, pages=skipped, start_index=len(sent_chunks)))
+        )
+        extracted = merge_extracted([extracted, rest])
+        pages_sent = total_pages
+        TRIAGE_FALLBACKS.inc()
+
+    triage_stats.add(documents=1, pages_total=total_pages, pages_sent=pages_sent, fallbacks=int(fallback))
+    logger.info(f"📄 Triage sent {pages_sent}/{total_pages} pages")
+    return document.finish(extracted)
@@ -0,0 +1,87 @@
+# app/services/pdf_splitter.py
+import io
+import time
+from collections import namedtuple
+
+from pypdf import PdfReader, PdfWriter
+
+from app.config import DOCUMENTAI_MAX_CHUNK_BYTES, DOCUMENTAI_PAGES_PER_CHUNK
+from app.metrics import PAGES_PROCESSED, PDF_SPLIT_SECONDS
+
+# ``pages`` are the 0-based source page numbers in the chunk
+PdfChunk = namedtuple("PdfChunk", ["index", "pages", "content"])
+
+def _encode(reader, pages):
+    writer = PdfWriter()
+    for i in pages:
+        writer.add_page(reader.pages[i])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def _fit(reader, pages, max_chunk_bytes):
+    """Yield (pages, content) pieces of ``pages`` each under max_chunk_bytes,
+    halving the page range until it fits. A single page that is still too
+    large is yielded as is and left to the processor to reject."""
+    content = _encode(reader, pages)
+    if len(content) <= max_chunk_bytes or len(pages) == 1:
+        yield pages, content
+        return
+    content = None  # release the oversized encoding before re-encoding the halves
+    middle = len(pages) // 2
+    yield from _fit(reader, pages[:middle], max_chunk_bytes)
+    yield from _fit(reader, pages[middle:], max_chunk_bytes)
+
+def _groups(pages, size):
+    group = []
+    for page in pages:
+        group.append(page)
+        if len(group) == size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+def iter_pdf_chunks(
+    source,
+    pages_per_chunk=DOCUMENTAI_PAGES_PER_CHUNK,
+    max_chunk_bytes=DOCUMENTAI_MAX_CHUNK_BYTES,
+    pages=None,
+    start_index=0,
+):
+    """Lazily split a PDF into in-memory chunks.
+
+    ``source`` is a path, a binary file object, the PDF bytes or an open
+    PdfReader. Chunks hold at most ``pages_per_chunk`` pages and
+    ``max_chunk_bytes`` encoded bytes; only the chunk being yielded is held
+    in memory. ``pages`` (0-based, ascending, possibly lazy) restricts the
+    chunks to those pages; chunk indexes start at ``start_index``.
+    """
+    if isinstance(source, PdfReader):
+        reader = source
+    else:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        reader = PdfReader(source)
+    if pages is None:
+        pages = range(len(reader.pages))
+
+    index = start_index
+    for group in _groups(pages, pages_per_chunk):
+        pieces = _fit(reader, group, max_chunk_bytes)
+        while True:
+            # Only the split itself is timed, not the consumer of each chunk
+            started = time.perf_counter()
+            piece = next(pieces, None)
+            if piece is None:
+                break
+            PDF_SPLIT_SECONDS.observe(time.perf_counter() - started)
+            PAGES_PROCESSED.inc(len(piece[0]))
+            yield PdfChunk(index, *piece)
+            index += 1
+
+def chunk_subset(chunk, positions):
+    """A PdfChunk of only the pages at ``positions`` (0-based within ``chunk``),
+    keeping the chunk index and the source page numbers."""
+    reader = PdfReader(io.BytesIO(chunk.content))
+    return PdfChunk(chunk.index, [chunk.pages[i] for i in positions], _encode(reader, positions))
@@ -0,0 +1,37 @@
+# app/services/pg_copy.py
+import io
+
+def copy_value(value):
+    """Encode one value for COPY ... FROM STDIN (text format)."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+def copy_rows(db_session, table, columns, rows):
+    """Stream ``rows`` (sequences ordered like ``columns``) into ``table`` with
+    COPY on the session's connection, under psycopg2 or psycopg 3."""
+    data = io.StringIO()
+    for row in rows:
+        data.write("\t".join(copy_value(value) for value in row))
+        data.write("\n")
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    cursor = db_session.connection().connection.cursor()
+    try:
+        if hasattr(cursor, "copy_expert"):  # psycopg2
+            data.seek(0)
+            cursor.copy_expert(sql, data)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(data.getvalue())
+    finally:
+        cursor.close()
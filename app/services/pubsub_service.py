@@ -1,6 +1,8 @@
 import json
 import logging
 import os
+import time
+from concurrent.futures import wait
 from google.cloud import pubsub_v1
 
 logger = logging.getLogger(__name__)
@@ -8,44 +10,90 @@ logger = logging.getLogger(__name__)
 PROJECT_ID = os.getenv("PROJECT_ID")
 TOPIC_ID = os.getenv("PUBSUB_TOPIC_ID", "pdf-processing-topic")
 
+# Documents packed into one message, and the client-side batching of messages
+DOCUMENTS_PER_MESSAGE = int(os.getenv("PUBSUB_DOCUMENTS_PER_MESSAGE", "10"))
+BATCH_MAX_MESSAGES = int(os.getenv("PUBSUB_BATCH_MAX_MESSAGES", "100"))
+BATCH_MAX_LATENCY = float(os.getenv("PUBSUB_BATCH_MAX_LATENCY", "0.05"))
+PUBLISH_TIMEOUT = float(os.getenv("PUBSUB_PUBLISH_TIMEOUT", "10"))
+
 _publisher = None
 
 
 def get_publisher():
     global _publisher
     if _publisher is None:
-        _publisher = pubsub_v1.PublisherClient()
+        _publisher = pubsub_v1.PublisherClient(
+            batch_settings=pubsub_v1.types.BatchSettings(
+                max_messages=BATCH_MAX_MESSAGES,
+                max_latency=BATCH_MAX_LATENCY,
+            )
+        )
     return _publisher
 
 
-def publish_document_message(document_id: int, gcs_path: str):
+def publish_documents(documents, dataset_file="client_dataset.csv"):
+    """Publish documents packed DOCUMENTS_PER_MESSAGE to a message, without waiting.
+
+    ``documents`` is a list of {"document_id", "gcs_path"} dicts. Returns a
+    list of (documents_in_message, future) pairs for resolve_publishes.
+    """
     if not PROJECT_ID:
         raise RuntimeError("PROJECT_ID is not set")
 
     publisher = get_publisher()
     topic_path = publisher.topic_path(PROJECT_ID, TOPIC_ID)
 
-    message = {
-        "documents": [
-            {
-                "document_id": document_id,
-                "gcs_path": gcs_path
-            }
-        ],
-        "dataset_file": "client_dataset.csv"
-    }
-
-    try:
-        future = publisher.publish(
-            topic_path,
-            json.dumps(message).encode("utf-8")
-        )
+    pending = []
+    for start in range(0, len(documents), DOCUMENTS_PER_MESSAGE):
+        chunk = documents[start:start + DOCUMENTS_PER_MESSAGE]
+        # enqueued_at lets the worker record how long the message waited
+        message = {"documents": chunk, "dataset_file": dataset_file, "enqueued_at": time.time()}
+        future = publisher.publish(topic_path, json.dumps(message).encode("utf-8"))
+        pending.append((chunk, future))
+    return pending
+
+
+def resolve_publishes(pending, timeout=PUBLISH_TIMEOUT):
+    """Wait for all publish futures together.
+
+    Returns {document_id: {"message_id": ...}} or {"error": ...} per document.
+    """
+    wait([future for _, future in pending], timeout=timeout)
 
-        message_id = future.result(timeout=10)
-        logger.info(f"📤 Pub/Sub message published: {message_id}")
+    results = {}
+    for chunk, future in pending:
+        try:
+            message_id = future.result(timeout=0)
+            logger.info(f"📤 Pub/Sub message published: {message_id} ({len(chunk)} documents)")
+            outcome = {"message_id": message_id}
+        except Exception as e:
+            logger.error(f"❌ Failed to publish Pub/Sub message: {e}")
+            outcome = {"error": str(e) or type(e).__name__}
+        for document in chunk:
+            results[document["document_id"]] = outcome
+    return results
 
-        return message_id
 
-    except Exception as e:
-        logger.error(f"❌ Failed to publish Pub/Sub message: {e}")
-        raise
+def publish_rematch(batch_size=None, max_batches=None):
+    """Ask a worker to run the incremental re-match; returns the message id.
+
+    The worker runs app.services.incremental_matcher.rematch with these
+    limits (None = its defaults / until nothing is pending).
+    """
+    if not PROJECT_ID:
+        raise RuntimeError("PROJECT_ID is not set")
+
+    publisher = get_publisher()
+    message = {"rematch": {"batch_size": batch_size, "max_batches": max_batches}, "enqueued_at": time.time()}
+    future = publisher.publish(publisher.topic_path(PROJECT_ID, TOPIC_ID), json.dumps(message).encode("utf-8"))
+    message_id = future.result(timeout=PUBLISH_TIMEOUT)
+    logger.info(f"📤 Re-match request published: {message_id}")
+    return message_id
+
+
+def publish_document_message(document_id: int, gcs_path: str):
+    pending = publish_documents([{"document_id": document_id, "gcs_path": gcs_path}])
+    outcome = resolve_publishes(pending)[document_id]
+    if "error" in outcome:
+        raise RuntimeError(outcome["error"])
+    return outcome["message_id"]
@@ -0,0 +1,91 @@
+# app/services/stage_ledger.py
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.models.tables import Document, DocumentStageTiming
+
+logger = logging.getLogger(__name__)
+
+def utc_from_timestamp(seconds):
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+class StageLedger:
+    """Buffers per-document stage timings and writes them in one INSERT.
+
+    Stages are recorded in memory (from any thread) and only reach the DB
+    on ``flush``, which callers run inside a transaction they are about to
+    commit anyway, so timing adds no round trip per stage.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = []
+
+    def record(self, document_id, stage, started, duration, chunk_index=None):
+        """Record a stage that started at epoch ``started`` and took ``duration`` seconds."""
+        row = {
+            "document_id": document_id,
+            "stage": stage,
+            "chunk_index": chunk_index,
+            "started_at": utc_from_timestamp(started),
+            "duration_ms": duration * 1000.0,
+        }
+        with self.lock:
+            self.rows.append(row)
+
+    @contextmanager
+    def stage(self, document_id, stage, chunk_index=None):
+        """Time the enclosed block as ``stage``; recorded even if it raises."""
+        started = time.time()
+        clock = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(document_id, stage, started, time.perf_counter() - clock, chunk_index)
+
+    def timed_chunks(self, document_id, chunks):
+        """Pass ``chunks`` through, recording the time spent producing them
+        (i.e. splitting) as one "split" stage once exhausted."""
+        started = time.time()
+        spent = 0.0
+        iterator = iter(chunks)
+        while True:
+            clock = time.perf_counter()
+            chunk = next(iterator, None)
+            spent += time.perf_counter() - clock
+            if chunk is None:
+                break
+            yield chunk
+        self.record(document_id, "split", started, spent)
+
+    def flush(self, db_session):
+        """Insert the buffered rows of documents that exist, in a savepoint:
+        timings are best effort and must never roll back the caller's
+        transaction (e.g. a message naming a deleted document)."""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if not rows:
+            return 0
+        savepoint = db_session.begin_nested()
+        try:
+            known = set(db_session.execute(
+                select(Document.id).where(Document.id.in_({row["document_id"] for row in rows}))
+            ).scalars())
+            dropped = sum(row["document_id"] not in known for row in rows)
+            rows = [row for row in rows if row["document_id"] in known]
+            if rows:
+                db_session.execute(insert(DocumentStageTiming.__table__), rows)
+            savepoint.commit()
+        except SQLAlchemyError as e:
+            savepoint.rollback()
+            logger.warning(f"Dropped {len(rows)} stage timings: {e}")
+            return 0
+        if dropped:
+            logger.warning(f"Dropped {dropped} stage timings of unknown documents")
+        return len(rows)
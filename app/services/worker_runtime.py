@@ -0,0 +1,179 @@
+# app/services/worker_runtime.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from google.cloud import pubsub_v1
+from google.cloud.pubsub_v1.subscriber.scheduler import ThreadScheduler
+
+from app.config import (
+    WORKER_BATCH_SIZE,
+    WORKER_BATCH_WAIT_SECONDS,
+    WORKER_LEASE_EXTENSION_SECONDS,
+    WORKER_MAX_BYTES,
+    WORKER_MAX_LEASE_DURATION,
+    WORKER_MAX_MESSAGES,
+    WORKER_THREADS,
+)
+from app.metrics import PUBSUB_MESSAGES, PUBSUB_NACKS, PUBSUB_REDELIVERIES
+
+logger = logging.getLogger(__name__)
+
+class LeaseKeeper:
+    """Extends the ack deadline of messages that are still being processed.
+
+    The streaming pull client also leases outstanding messages, but only up
+    to max_lease_duration; this keeps long extractions explicitly alive and
+    works the same against the fake subscriber.
+    """
+
+    def __init__(self, interval=WORKER_LEASE_EXTENSION_SECONDS):
+        self.interval = interval
+        self.messages = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        if interval:
+            self.thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+            self.thread.start()
+
+    def hold(self, message):
+        with self.lock:
+            self.messages[message.message_id] = message
+
+    def release(self, message):
+        with self.lock:
+            self.messages.pop(message.message_id, None)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                held = list(self.messages.values())
+            for message in held:
+                try:
+                    message.modify_ack_deadline(int(self.interval * 2))
+                except Exception as e:
+                    logger.warning(f"Lease extension failed for {message.message_id}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+class TrackedMessage:
+    """A received message that remembers whether it was acked or nacked."""
+
+    def __init__(self, message):
+        self.message = message
+        self.settled = False
+
+    def ack(self):
+        self.message.ack()
+        self.settled = True
+
+    def nack(self):
+        self.message.nack()
+        self.settled = True
+
+    def __getattr__(self, name):
+        return getattr(self.message, name)
+
+class MessageBatcher:
+    """Groups incoming Pub/Sub messages into batches for ``handle_batch``.
+
+    ``submit`` is the subscriber callback: it only queues the message. A
+    dispatcher thread hands up to ``batch_size`` messages (or whatever
+    arrived within ``batch_wait`` seconds) to a pool of ``threads`` workers.
+    ``handle_batch(messages)`` must ack or nack every message it receives;
+    if it raises, only the messages it hadn't settled yet are nacked.
+    """
+
+    def __init__(
+        self,
+        handle_batch,
+        batch_size=WORKER_BATCH_SIZE,
+        batch_wait=WORKER_BATCH_WAIT_SECONDS,
+        threads=WORKER_THREADS,
+        lease_keeper=None,
+    ):
+        self.handle_batch = handle_batch
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="batch")
+        self.lease_keeper = lease_keeper or LeaseKeeper()
+        self.pending = queue.Queue()
+        self.stopped = threading.Event()
+        self.dispatcher = threading.Thread(target=self._dispatch, name="batch-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, message):
+        PUBSUB_MESSAGES.inc()
+        # delivery_attempt is only populated when the subscription has a dead-letter policy
+        if (getattr(message, "delivery_attempt", None) or 1) > 1:
+            PUBSUB_REDELIVERIES.inc()
+        self.lease_keeper.hold(message)
+        self.pending.put(message)
+
+    def _next_batch(self):
+        try:
+            batch = [self.pending.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while not self.stopped.is_set():
+            batch = self._next_batch()
+            if batch:
+                self.executor.submit(self._run_batch, batch)
+
+    def _run_batch(self, messages):
+        tracked = [TrackedMessage(message) for message in messages]
+        try:
+            self.handle_batch(tracked)
+        except Exception as e:
+            # Messages acked after their commit stay acked
+            unsettled = [message for message in tracked if not message.settled]
+            logger.error(
+                f"❌ Batch of {len(messages)} message(s) failed, nacking {len(unsettled)} unsettled: {e}"
+            )
+            for message in unsettled:
+                message.nack()
+            PUBSUB_NACKS.inc(len(unsettled))
+        finally:
+            for message in messages:
+                self.lease_keeper.release(message)
+
+    def stop(self):
+        self.stopped.set()
+        self.dispatcher.join()
+        self.executor.shutdown(wait=True)
+        self.lease_keeper.stop()
+
+def flow_control():
+    return pubsub_v1.types.FlowControl(
+        max_messages=WORKER_MAX_MESSAGES,
+        max_bytes=WORKER_MAX_BYTES,
+        max_lease_duration=WORKER_MAX_LEASE_DURATION,
+    )
+
+def subscribe(subscriber, subscription_path, batcher):
+    """Start a flow-controlled streaming pull feeding ``batcher``.
+
+    Works with pubsub_v1.SubscriberClient and FakeSubscriber alike.
+    """
+    return subscriber.subscribe(
+        subscription_path,
+        callback=batcher.submit,
+        flow_control=flow_control(),
+        scheduler=ThreadScheduler(ThreadPoolExecutor(max_workers=2, thread_name_prefix="pull")),
+    )
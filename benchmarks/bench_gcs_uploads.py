@@ -0,0 +1,46 @@
+# benchmarks/bench_gcs_uploads.py
+"""Sequential vs. parallel uploads against the local fake GCS backend.
+
+Each upload chunk sleeps ``--latency`` seconds to stand in for a network
+round trip, so the numbers reflect request concurrency, not disk speed.
+
+    python -m benchmarks.bench_gcs_uploads --files 50 --size-kb 512 --latency 0.05
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+from app.services import gcs_service
+
+def make_files(count, size):
+    return [(io.BytesIO(os.urandom(size)), f"bench_{i}.pdf") for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=50)
+    parser.add_argument("--size-kb", type=int, default=512)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, default=gcs_service.UPLOAD_WORKERS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        gcs_service._backend = gcs_service.LocalStorageBackend(root, latency=args.latency)
+
+        files = make_files(args.files, args.size_kb * 1024)
+        start = time.perf_counter()
+        for file_obj, name in files:
+            gcs_service.upload_file(file_obj, name)
+        sequential = time.perf_counter() - start
+
+        files = make_files(args.files, args.size_kb * 1024)
+        start = time.perf_counter()
+        gcs_service.upload_files_to_gcs(files, max_workers=args.workers)
+        parallel = time.perf_counter() - start
+
+    print(f"sequential {sequential:8.2f}s  {args.files / sequential:8.1f} files/sec")
+    print(f"parallel   {parallel:8.2f}s  {args.files / parallel:8.1f} files/sec  ({sequential / parallel:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/bench_match_inserts.py
+"""Compare rows/sec of the per-row INSERT path with MatchWriter batches.
+
+Runs against the database configured in the environment (DB_USER, DB_HOST,
+...). Every variant writes into a scratch document inside a transaction
+that is rolled back, so nothing is left behind.
+
+    python -m benchmarks.bench_match_inserts --rows 20000 --batch-size 1000
+"""
+import argparse
+import random
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from app.db import SessionLocal
+from app.services.match_writer import MATCH_COLUMNS, MatchWriter
+
+INSERT_SQL = text(
+    f"INSERT INTO matches ({', '.join(MATCH_COLUMNS)}) "
+    f"VALUES ({', '.join(':' + c for c in MATCH_COLUMNS)})"
+)
+
+def synthetic_rows(document_id, n):
+    rng = random.Random(0)
+    return [
+        {
+            "document_id": document_id,
+            "dataset_index": i,
+            "dataset_name": f"patient {i}",
+            "dataset_doa": date(2023, 1, 15),
+            "dataset_dob": date(1980, 6, 1),
+            "dataset_referral": "back pain after accident",
+            "extracted_name": "patient 42",
+            "extracted_doa": date(2023, 1, 16),
+            "extracted_dob": date(1980, 6, 1),
+            "extracted_referral": "back pain",
+            "name_score": rng.uniform(0, 100),
+            "doa_match": rng.random() < 0.5,
+            "dob_match": rng.random() < 0.5,
+            "referral_score": rng.uniform(0, 100),
+            "referral_match": rng.random() < 0.5,
+            "match_status": "Mismatch",
+        }
+        for i in range(n)
+    ]
+
+def per_row(db, rows, batch_size):
+    for row in rows:
+        db.execute(INSERT_SQL, row)
+
+def executemany(db, rows, batch_size):
+    writer = MatchWriter(db, batch_size=batch_size, method="executemany")
+    writer.add_many(rows)
+    writer.flush()
+
+def copy(db, rows, batch_size):
+    writer = MatchWriter(db, batch_size=batch_size, method="copy")
+    writer.add_many(rows)
+    writer.flush()
+
+def run(variant, n, batch_size):
+    db = SessionLocal()
+    try:
+        document_id = db.execute(
+            text("INSERT INTO documents (file_name, gcs_path, status) VALUES ('bench.pdf', 'gs://bench/bench.pdf', 'bench') RETURNING id")
+        ).scalar()
+        rows = synthetic_rows(document_id, n)
+        start = time.perf_counter()
+        variant(db, rows, batch_size)
+        db.flush()
+        elapsed = time.perf_counter() - start
+    finally:
+        db.rollback()
+        db.close()
+    return n / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    baseline = None
+    for name, variant in (("per-row", per_row), ("executemany", executemany), ("copy", copy)):
+        rate = run(variant, args.rows, args.batch_size)
+        baseline = baseline or rate
+        print(f"{name:12s} {rate:12,.0f} rows/sec  ({rate / baseline:5.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# benchmarks/bench_match_queries.py
+"""Query plans for the /api/matches access patterns, with and without indexes.
+
+Seeds a scratch schema with a multi-million-row copy of matches and
+extracted_fields (same columns, typed dates), runs EXPLAIN ANALYZE on the
+queries the API serves, adds the indexes from app/models/tables.py and runs
+them again. The scratch schema is dropped afterwards.
+
+    python -m benchmarks.bench_match_queries --rows 5000000 --documents 20000
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from app.db import get_engine
+
+SCHEMA = "bench_match_queries"
+
+SEED = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"CREATE TABLE {SCHEMA}.matches (LIKE public.matches INCLUDING DEFAULTS)",
+    f"CREATE TABLE {SCHEMA}.extracted_fields (LIKE public.extracted_fields INCLUDING DEFAULTS)",
+    f"""
+    INSERT INTO {SCHEMA}.matches (
+        id, document_id, dataset_index, dataset_name, dataset_doa, dataset_dob,
+        extracted_name, extracted_doa, extracted_dob, name_score, doa_match, dob_match,
+        referral_score, referral_match, match_status, created_at
+    )
+    SELECT g, 1 + g % :documents, g % 100000, 'patient ' || g,
+           date '2020-01-01' + (g % 1500), date '1950-01-01' + (g % 20000),
+           'patient ' || (g % 997), date '2020-01-01' + (g % 1499), date '1950-01-01' + (g % 19999),
+           (g * 7919) % 101, g % 3 = 0, g % 5 = 0, (g * 104729) % 101, g % 4 = 0,
+           (ARRAY['Strong Match', 'Probable Match', 'Name Match Only', 'Mismatch',
+                  'Mismatch', 'Mismatch', 'Mismatch', 'Mismatch'])[1 + g % 8],
+           now() - (g % 720) * interval '1 hour'
+    FROM generate_series(1, :rows) g
+    """,
+    f"""
+    INSERT INTO {SCHEMA}.extracted_fields (id, document_id, field_name, field_value, created_at)
+    SELECT g, 1 + g % :documents,
+           (ARRAY['name', 'dob', 'doa', 'referral'])[1 + g % 4], 'value ' || g, now()
+    FROM generate_series(1, :fields) g
+    """,
+    f"ALTER TABLE {SCHEMA}.matches ADD PRIMARY KEY (id)",
+    f"ALTER TABLE {SCHEMA}.extracted_fields ADD PRIMARY KEY (id)",
+]
+
+INDEXES = [
+    f"CREATE INDEX ON {SCHEMA}.matches (document_id, match_status, id)",
+    f"CREATE INDEX ON {SCHEMA}.matches (document_id, name_score)",
+    f"CREATE INDEX ON {SCHEMA}.extracted_fields (document_id, field_name)",
+]
+
+QUERIES = {
+    "strong matches of a document": f"""
+        SELECT * FROM {SCHEMA}.matches
+        WHERE document_id = :document_id AND match_status = 'Strong Match'
+        ORDER BY id LIMIT 100""",
+    "next page of a document": f"""
+        SELECT * FROM {SCHEMA}.matches
+        WHERE document_id = :document_id AND match_status = 'Mismatch' AND id > :after_id
+        ORDER BY id LIMIT 100""",
+    "top name scores of a document": f"""
+        SELECT * FROM {SCHEMA}.matches
+        WHERE document_id = :document_id AND name_score >= 90
+        ORDER BY name_score DESC LIMIT 20""",
+    "fields of a document": f"""
+        SELECT * FROM {SCHEMA}.extracted_fields
+        WHERE document_id = :document_id AND field_name = 'name'""",
+}
+
+def explain(conn, params):
+    for label, sql in QUERIES.items():
+        plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}"), params).scalars().all()
+        print(f"\n-- {label}")
+        for line in plan:
+            print(f"   {line}")
+
+def timed(conn, statements, params=None):
+    start = time.perf_counter()
+    for statement in statements:
+        conn.execute(text(statement), params or {})
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--documents", type=int, default=20_000)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    args = parser.parse_args()
+
+    params = {"document_id": args.documents // 2, "after_id": args.rows // 2}
+    with get_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        try:
+            seconds = timed(conn, SEED, {"rows": args.rows, "documents": args.documents, "fields": args.rows // 10})
+            conn.execute(text(f"ANALYZE {SCHEMA}.matches"))
+            conn.execute(text(f"ANALYZE {SCHEMA}.extracted_fields"))
+            print(f"Seeded {args.rows:,} matches over {args.documents:,} documents in {seconds:.1f}s")
+
+            print("\n==== without indexes ====")
+            explain(conn, params)
+
+            seconds = timed(conn, INDEXES)
+            conn.execute(text(f"ANALYZE {SCHEMA}.matches"))
+            conn.execute(text(f"ANALYZE {SCHEMA}.extracted_fields"))
+            print(f"\nBuilt indexes in {seconds:.1f}s")
+
+            print("\n==== with indexes ====")
+            explain(conn, params)
+        finally:
+            if not args.keep:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+if __name__ == "__main__":
+    main()
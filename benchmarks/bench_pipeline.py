@@ -0,0 +1,388 @@
+# benchmarks/bench_pipeline.py
+"""Offline benchmark of the split -> extract -> match -> persist pipeline.
+
+Runs every stage without network access:
+- split: iter_pdf_chunks over documents/*.pdf plus synthetic PDFs of --pages pages.
+- extract: the ExtractionScheduler against FakeDocumentAIProcessor with --latency.
+- detect_column: header detection on a dataset frame.
+- prepare / match: prepare_dataset and match_prepared on synthetic datasets of --dataset-sizes rows.
+- match_retained / match_batch: the worker's top --retain-top-k matching, one
+  document at a time vs. all --documents in one N×M pass.
+- persist: MatchWriter into --db-url (an in-memory SQLite database by default).
+
+Each stage reports throughput, per-op latency percentiles and peak RSS.
+With --baseline the results are compared against a stored JSON run, and
+the exit status is 1 if any stage regressed by more than --tolerance.
+
+    python -m benchmarks.bench_pipeline --dataset-sizes 1000,10000,100000,1000000
+    python -m benchmarks.bench_pipeline --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pypdf import PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.models.tables import Base
+from app.services.extraction_scheduler import ExtractionScheduler
+from app.services.fake_documentai import FakeDocumentAIProcessor
+from app.services.match_writer import MatchWriter
+from app.services.matching_service import (
+    DOA_COLUMNS,
+    DOB_COLUMNS,
+    NAME_COLUMNS,
+    REFERRAL_COLUMNS,
+    detect_column,
+    match_prepared,
+    match_retained,
+    match_retained_batch,
+    prepare_dataset,
+)
+from app.services.pdf_splitter import iter_pdf_chunks
+
+DOCUMENTS_GLOB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "documents", "*.pdf")
+
+# -----------------------
+# Measurement
+# -----------------------
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:  # not Linux: fall back to the lifetime peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+
+class RssSampler(threading.Thread):
+    """Samples RSS every ``interval`` seconds and keeps the peak."""
+
+    def __init__(self, interval=0.005):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = current_rss_mb()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            self.peak = max(self.peak, current_rss_mb())
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return max(self.peak, current_rss_mb())
+
+def measure(stage, work, unit):
+    """Run ``work()`` -> (per-op latencies in seconds, units processed)."""
+    sampler = RssSampler()
+    start_rss = current_rss_mb()
+    sampler.start()
+    start = time.perf_counter()
+    latencies, units = work()
+    seconds = time.perf_counter() - start
+    peak = sampler.stop()
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    result = {
+        "stage": stage,
+        "unit": unit,
+        "ops": len(latencies),
+        "units": units,
+        "seconds": seconds,
+        "throughput": units / seconds if seconds else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else 0.0,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else 0.0,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else 0.0,
+        "peak_rss_mb": peak,
+        "rss_growth_mb": peak - start_rss,
+    }
+    print(
+        f"{stage:24s} {result['throughput']:12,.1f} {unit}/s  "
+        f"p50 {result['p50_ms']:9.2f}ms  p95 {result['p95_ms']:9.2f}ms  p99 {result['p99_ms']:9.2f}ms  "
+        f"peak {peak:8.1f}MB (+{result['rss_growth_mb']:.1f})"
+    )
+    return result
+
+# -----------------------
+# Synthetic inputs
+# -----------------------
+def synthetic_pdf(pages, lines_per_page=40):
+    """A text PDF of ``pages`` pages, roughly the size of a scanned-text bill."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    for number in range(pages):
+        page = writer.add_blank_page(612, 792)
+        lines = [f"Patient Name: Patient {number:05d}   DOB: 01/{number % 28 + 1:02d}/1980   DOA: 03/14/2023"]
+        lines += [f"Line {i}: treatment notes for visit {number}-{i}, lumbar strain, follow up" for i in range(lines_per_page)]
+        ops = "BT /F1 9 Tf 11 TL 40 760 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = DecodedStreamObject()
+        stream.set_data(ops.encode())
+        page[NameObject("/Contents")] = writer._add_object(stream)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font}),
+        })
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+FIRST = np.array(["james", "mary", "john", "patricia", "robert", "jennifer", "michael", "linda",
+                  "william", "elizabeth", "david", "barbara", "richard", "susan", "joseph", "jessica"])
+LAST = np.array(["smith", "johnson", "williams", "brown", "jones", "garcia", "miller", "davis",
+                 "rodriguez", "martinez", "hernandez", "lopez", "gonzalez", "wilson", "anderson", "thomas"])
+REFERRALS = np.array(["lower back pain", "neck strain after collision", "shoulder injury", "",
+                      "whiplash follow up", "knee pain", "headaches since accident", "physical therapy"])
+
+def synthetic_dataset(rows, seed=0):
+    """A dataset frame with the client's column headers and ``rows`` rows."""
+    rng = np.random.default_rng(seed)
+    suffix = rng.integers(0, 10_000, rows).astype(str)
+    names = np.char.add(np.char.add(np.char.add(rng.choice(FIRST, rows), " "), rng.choice(LAST, rows)), suffix)
+    doa = pd.Timestamp("2020-01-01") + pd.to_timedelta(rng.integers(0, 1500, rows), unit="D")
+    dob = pd.Timestamp("1940-01-01") + pd.to_timedelta(rng.integers(0, 25000, rows), unit="D")
+    return pd.DataFrame({
+        "Client Name": names,
+        "Date of Accident": doa.strftime("%m/%d/%Y"),
+        "DOB": dob.strftime("%Y-%m-%d"),
+        "Referral Notes": rng.choice(REFERRALS, rows),
+    })
+
+def synthetic_extracted(dataset_df, count, seed=1):
+    """Extracted records copied (with small typos) from random dataset rows."""
+    rng = np.random.default_rng(seed)
+    records = []
+    for pos in rng.integers(0, len(dataset_df), count):
+        row = dataset_df.iloc[pos]
+        name = row["Client Name"]
+        records.append({
+            "name": name[:-1] if len(name) > 4 else name,
+            "doa": row["Date of Accident"],
+            "dob": row["DOB"],
+            "referral": row["Referral Notes"],
+        })
+    return records
+
+# -----------------------
+# Stages
+# -----------------------
+def split_stage(sources, pages_per_chunk):
+    def work():
+        latencies, pages = [], 0
+        for source in sources:
+            chunks = iter_pdf_chunks(source, pages_per_chunk=pages_per_chunk)
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                latencies.append(time.perf_counter() - start)
+                pages += len(chunk.pages)
+        return latencies, pages
+    return work
+
+def extract_stage(chunks, args):
+    def work():
+        fake = FakeDocumentAIProcessor(latency=args.latency, jitter=args.jitter, seed=0)
+        scheduler = ExtractionScheduler(max_in_flight=args.in_flight, qps=args.qps, backoff_base=0.01)
+        latencies = []
+        lock = threading.Lock()
+
+        def extract(chunk):
+            start = time.perf_counter()
+            result = fake.extract(chunk.content)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            return result
+
+        scheduler.extract(extract, chunks)
+        scheduler.executor.shutdown()
+        return latencies, len(chunks)
+    return work
+
+def detect_stage(df, repeat):
+    def work():
+        latencies = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for candidates in (NAME_COLUMNS, DOA_COLUMNS, DOB_COLUMNS, REFERRAL_COLUMNS):
+                detect_column(df, candidates)
+            latencies.append(time.perf_counter() - start)
+        return latencies, repeat
+    return work
+
+def prepare_stage(df, holder):
+    def work():
+        start = time.perf_counter()
+        holder["dataset"] = prepare_dataset(df)
+        return [time.perf_counter() - start], len(df)
+    return work
+
+def match_stage(dataset, extracted, holder):
+    def work():
+        latencies = []
+        for record in extracted:
+            start = time.perf_counter()
+            holder["results"] = match_prepared(record, dataset)
+            latencies.append(time.perf_counter() - start)
+        return latencies, len(dataset) * len(extracted)
+    return work
+
+def retained_stage(dataset, extracted, top_k):
+    def work():
+        latencies = []
+        for record in extracted:
+            start = time.perf_counter()
+            match_retained(record, dataset, top_k=top_k)
+            latencies.append(time.perf_counter() - start)
+        return latencies, len(dataset) * len(extracted)
+    return work
+
+def batch_stage(dataset, extracted, top_k):
+    def work():
+        start = time.perf_counter()
+        match_retained_batch(extracted, dataset, top_k=top_k)
+        return [time.perf_counter() - start], len(dataset) * len(extracted)
+    return work
+
+def persist_stage(db_url, results, rows, batch_size):
+    def work():
+        engine = create_engine(db_url)
+        Base.metadata.create_all(engine)
+        template = [
+            {
+                "document_id": 1,
+                "dataset_index": r["Dataset_Index"],
+                "dataset_name": r["Dataset_Name"],
+                "dataset_doa": pd.Timestamp(r["Dataset_DOA"]).date() if r["Dataset_DOA"] not in ("None", "NaT") else None,
+                "dataset_dob": pd.Timestamp(r["Dataset_DOB"]).date() if r["Dataset_DOB"] not in ("None", "NaT") else None,
+                "dataset_referral": r["Dataset_Referral"],
+                "extracted_name": r["Extracted_Name"],
+                "extracted_doa": None,
+                "extracted_dob": None,
+                "extracted_referral": r["Extracted_Referral"],
+                "name_score": r["Name_Score"],
+                "doa_match": r["DOA_Match"],
+                "dob_match": r["DOB_Match"],
+                "referral_score": r["Referral_Score"],
+                "referral_match": r["Referral_Match"],
+                "match_status": r["Match_Status"],
+            }
+            for r in results[:rows]
+        ]
+        template = (template * (rows // max(len(template), 1) + 1))[:rows]
+        latencies = []
+        with Session(engine) as db:
+            db.execute(text(
+                "INSERT INTO documents (id, file_name, gcs_path, status) VALUES (1, 'bench.pdf', 'gs://bench', 'bench')"
+            ))
+            writer = MatchWriter(db, batch_size=batch_size, method="executemany")
+            for start_row in range(0, len(template), batch_size):
+                start = time.perf_counter()
+                writer.add_many(template[start_row:start_row + batch_size])
+                writer.flush()
+                latencies.append(time.perf_counter() - start)
+            db.rollback()
+        engine.dispose()
+        return latencies, len(template)
+    return work
+
+# -----------------------
+# Baseline
+# -----------------------
+def machine_id():
+    return f"{platform.machine()} {platform.python_implementation()} {platform.python_version()} cpus={os.cpu_count()}"
+
+def compare(results, baseline, tolerance):
+    """Print throughput/p95 changes vs. ``baseline``; return the regressed stages."""
+    previous = {r["stage"]: r for r in baseline["results"]}
+    regressed = []
+    print(f"\nvs. baseline ({baseline.get('created')}, {baseline.get('machine')}), tolerance {tolerance:.0%}")
+    if baseline.get("machine") != machine_id():
+        print("note: baseline was recorded on a different machine; compare like with like")
+    for r in results:
+        old = previous.get(r["stage"])
+        if old is None:
+            continue
+        throughput = r["throughput"] / old["throughput"] if old["throughput"] else 1.0
+        p95 = r["p95_ms"] / old["p95_ms"] if old["p95_ms"] else 1.0
+        flag = ""
+        if throughput < 1 - tolerance or p95 > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressed.append(r["stage"])
+        print(f"{r['stage']:24s} throughput {throughput:6.2f}x  p95 {p95:6.2f}x{flag}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="10,50", help="page counts of the synthetic PDFs")
+    parser.add_argument("--no-documents", action="store_true", help="skip the PDFs in documents/")
+    parser.add_argument("--pages-per-chunk", type=int, default=15)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Document AI latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--in-flight", type=int, default=4)
+    parser.add_argument("--qps", type=float, default=0, help="0 = no QPS cap")
+    parser.add_argument("--dataset-sizes", default="1000,10000,100000")
+    parser.add_argument("--documents", type=int, default=20, help="extracted records matched per dataset")
+    parser.add_argument("--retain-top-k", type=int, default=50, help="top K kept by match_retained/match_batch")
+    parser.add_argument("--detect-repeat", type=int, default=200)
+    parser.add_argument("--persist-rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--db-url", default="sqlite://")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--save-baseline", help="write the results JSON as a new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    sources = [] if args.no_documents else sorted(glob.glob(DOCUMENTS_GLOB))
+    sources += [synthetic_pdf(int(p)) for p in args.pages.split(",") if p]
+    chunks = [chunk for source in sources for chunk in iter_pdf_chunks(source, pages_per_chunk=args.pages_per_chunk)]
+
+    results = [
+        measure("split", split_stage(sources, args.pages_per_chunk), "pages"),
+        measure("extract", extract_stage(chunks, args), "chunks"),
+    ]
+    match_results = []
+    for size in (int(s) for s in args.dataset_sizes.split(",") if s):
+        df = synthetic_dataset(size)
+        extracted = synthetic_extracted(df, args.documents)
+        holder = {}
+        results.append(measure(f"detect_column[{size}]", detect_stage(df, args.detect_repeat), "calls"))
+        results.append(measure(f"prepare[{size}]", prepare_stage(df, holder), "rows"))
+        results.append(measure(f"match[{size}]", match_stage(holder["dataset"], extracted, holder), "rows"))
+        results.append(measure(f"match_retained[{size}]", retained_stage(holder["dataset"], extracted, args.retain_top_k), "rows"))
+        results.append(measure(f"match_batch[{size}]", batch_stage(holder["dataset"], extracted, args.retain_top_k), "rows"))
+        match_results = match_results or holder["results"]
+        del df, holder
+    results.append(measure("persist", persist_stage(args.db_url, match_results, args.persist_rows, args.batch_size), "rows"))
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": machine_id(),
+        "args": vars(args),
+        "results": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            if compare(results, json.load(f), args.tolerance):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import math
+
+import pandas as pd
+
+from app.services.dataset_cache import MappedCells, load_compiled_dataset
+from app.services.matching_service import prepare_dataset
+
+def test_raw_cells_keep_their_types(tmp_path):
+    path = str(tmp_path / "dataset.xlsx")
+    pd.DataFrame({
+        "Name": ["Ann Lee", None, 12345],
+        "DOA": [pd.Timestamp("2020-01-15 10:30"), None, pd.Timestamp("2022-03-03")],
+        "DOB": ["1978-11-18", "01/02/1980", None],
+        "Referral": [1.5, "Dr é", True],
+    }).to_excel(path, index=False)
+
+    expected = prepare_dataset(pd.read_excel(path))
+    dataset = load_compiled_dataset(path, str(tmp_path / "cache"))
+
+    assert isinstance(dataset.raw_name, MappedCells)
+    for column in ("raw_name", "raw_doa", "raw_dob", "raw_referral"):
+        for got, want in zip(getattr(dataset, column), getattr(expected, column)):
+            assert type(got) is type(want)
+            assert str(got) == str(want) or (isinstance(got, float) and math.isnan(got))
+    assert (dataset.doa == expected.doa)[[0, 2]].all()
+
+def test_take_decodes_only_selected_rows(tmp_path):
+    path = str(tmp_path / "dataset.csv")
+    pd.DataFrame({"Name": ["a", "b", "c"], "DOA": ["2020-01-01"] * 3, "DOB": ["1980-01-01"] * 3}).to_csv(path, index=False)
+    dataset = load_compiled_dataset(path, str(tmp_path / "cache"))
+
+    assert list(dataset.take(range(1, 3)).raw_name) == ["b", "c"]
+    assert dataset.take([2, 0]).raw_name == ["c", "a"]
+    assert dataset.raw_name[-1] == "c"
@@ -0,0 +1,39 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.services.date_normalization import parse_date, parse_dates, to_date
+from app.services.matching_service import match_prepared, prepare_records
+
+@pytest.mark.parametrize("value", [
+    "2020-01-15",
+    "2020-01-15 10:30",
+    "2020-01-15T10:30:00",
+    "01/15/2020",
+    "01/15/2020 10:30",
+    "January 15, 2020",
+])
+def test_parse_date_matches_pandas(value):
+    # The old preprocess_date was pd.to_datetime, time of day included
+    assert parse_date(value) == pd.to_datetime(value)
+
+def test_time_of_day_is_kept():
+    assert str(parse_date("2020-01-15 10:30")) == "2020-01-15 10:30:00"
+    assert parse_dates(["2020-01-15 10:30", "2020-01-16"]).tolist() == [
+        np.datetime64("2020-01-15T10:30").astype("datetime64[us]").item(),
+        np.datetime64("2020-01-16").astype("datetime64[us]").item(),
+    ]
+    # DB date columns still take the date only
+    assert str(to_date("2020-01-15 10:30")) == "2020-01-15"
+
+def test_time_of_day_in_match_records():
+    dataset = prepare_records([SimpleNamespace(
+        id=1, dataset_name="Thomas Ybarra", dataset_doa="2020-01-18", dataset_dob="1978-11-18", dataset_referral="",
+    )])
+    [record] = match_prepared({"name": "Thomas Ybarra", "doa": "2020-01-15 10:30", "dob": "1978-11-18 08:00"}, dataset)
+    assert record["Extracted_DOA"] == "2020-01-15 10:30:00"
+    assert record["DOA_Match"]
+    # A DOB with a time of day is not the dataset's midnight DOB
+    assert not record["DOB_Match"]
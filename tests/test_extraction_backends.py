@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from app.services.extraction_backends import HybridBackend, HybridStats, LocalTextBackend
+from app.services.page_triage import extract_pdf
+
+DOCUMENTS = os.path.join(os.path.dirname(__file__), os.pardir, "documents")
+
+def read_document(name):
+    with open(os.path.join(DOCUMENTS, name), "rb") as f:
+        return f.read()
+
+class RecordingRemote:
+    """Stands in for Document AI and records what was sent to it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def extract(self, chunk):
+        self.calls.append(chunk.pages)
+        return {}
+
+@pytest.mark.parametrize("text, expected", [
+    ("Patient:\nThomas Ybarra\n1114 Ashwood Gln", {"name": "Thomas Ybarra"}),
+    ("Patient Name: Sebastian Prospers Provider: Jamar Toomer, DC", {"name": "Sebastian Prospers"}),
+    ("Patient: Prospers, Sebastian (8/20/1996)", {"name": "Prospers, Sebastian"}),
+    ("Birthdate: November 18, 1978", {"dob": "November 18, 1978"}),
+    # Column headers and other labels ending in "Patient" are not names
+    ("Patient \nApplied\nInsurance Patient\nPatient Number: 9626", {}),
+])
+def test_local_labels(text, expected):
+    assert LocalTextBackend().extract_texts([text])[0] == expected
+
+def test_local_backend_reads_checked_in_statement():
+    extracted = extract_pdf(read_document("100_Chiropractic_Gainesville_Bill.pdf"), LocalTextBackend(), enabled=False)
+    assert extracted == {"name": "Thomas Ybarra", "dob": "November 18, 1978"}
+
+def test_hybrid_keeps_text_layer_documents_local():
+    remote = RecordingRemote()
+    backend = HybridBackend(remote, required_fields=("name", "dob"), stats=HybridStats())
+    extracted = extract_pdf(read_document("Your Spine Matters Injury Center Record.pdf"), backend, enabled=False)
+
+    # Every chunk repeats the header; the merged document keeps it once
+    assert extracted["name"] == "Sebastian Prospers"
+    assert extracted["dob"] == "8/20/1996"
+    assert remote.calls == []
+    assert backend.stats.snapshot()["pages_remote"] == 0
@@ -1,16 +1,28 @@
 import logging
-from datetime import datetime, date
-import pandas as pd
-from sqlalchemy import create_engine,text
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import text, update
 from sqlalchemy.exc import SQLAlchemyError
 from google.cloud import pubsub_v1
 import json
+import multiprocessing
 import os
-from dotenv import load_dotenv
-from fuzzywuzzy import fuzz
-
-# ------------------- Load .env -------------------
+import time
+from app.config import (
+    DOCUMENTAI_WARMUP, LOCATION, MATCH_COMMIT_MODE, MATCH_RETENTION_MIN_SCORE, MATCH_RETENTION_TOP_K,
+    PROCESSOR_ID, REMATCH_BATCH_DOCUMENTS, WORKER_METRICS_PORT, WORKER_PROCESSES,
+)
+from app.metrics import DB_WRITE_SECONDS, start_metrics_server
+from app.db import get_session_factory
+from app.models.tables import Document, MatchStats
+from app.services.documentai_service import warm_up
+from app.services.extraction_backends import get_extraction_backend
+from app.services.gcs_service import download_file_from_gcs
+from app.services.page_triage import extract_pdf
+from app.services.incremental_matcher import rematch
+from app.services.match_policy import match_documents
+from app.services.match_store import load_dataset_snapshot, load_extracted_fields, record_watermarks
+from app.services.match_writer import MatchWriter, match_params
+from app.services.stage_ledger import StageLedger
+from app.services.worker_runtime import MessageBatcher, subscribe
 
 # ------------------- Configure logging -------------------
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -27,9 +39,9 @@ if not all([DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_NAME]):
     logging.error("Database environment variables are missing! Please check your .env file.")
     exit(1)
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
+# Shared factory, sized by the WORKER_DB_* pool settings; the only pool this
+# process opens
+SessionLocal = get_session_factory("worker")
 
 # ------------------- Pub/Sub setup -------------------
 PROJECT_ID = os.getenv("PROJECT_ID")
@@ -39,127 +51,303 @@ if not all([PROJECT_ID, SUBSCRIPTION_ID]):
     logging.error("Pub/Sub environment variables are missing! Please check your .env file.")
     exit(1)
 
-subscriber = pubsub_v1.SubscriberClient()
-subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
 
 # ------------------- Helper Functions -------------------
-def ensure_date(value):
-    """Convert value to datetime.date or return None for invalid/unparseable dates."""
-    if isinstance(value, date):
-        return value
-    if value in (None, "", "NaT") or (isinstance(value, str) and "N/A" in value):
-        return None
-    for fmt in ("%m-%d-%Y", "%Y-%m-%d", "%m/%d/%Y"):
+def set_document_status(db_session, document_ids, status):
+    if document_ids:
+        db_session.execute(update(Document).where(Document.id.in_(document_ids)).values(status=status))
+
+def extract_document(document, db_session, ledger):
+    """Download the document PDF, extract its fields chunk by chunk (through the
+    configured extraction backend) and store them in extracted_fields."""
+    document_id = document.get("document_id")
+    with ledger.stage(document_id, "download"):
+        content = download_file_from_gcs(document["gcs_path"])
+
+    backend = get_extraction_backend(PROJECT_ID, LOCATION, PROCESSOR_ID)
+
+    def timed(extract_fn):
+        def extract_chunk(chunk):
+            with ledger.stage(document_id, "extract_chunk", chunk.index):
+                return extract_fn(chunk)
+        return extract_chunk
+
+    with ledger.stage(document_id, "extract"):
+        extracted = extract_pdf(content, backend, lambda chunks: ledger.timed_chunks(document_id, chunks), timed)
+    if "error" in extracted:
+        logging.warning(f"Document {document_id} had chunk extraction errors: {extracted.pop('error')}")
+
+    if extracted:
+        started = time.perf_counter()
+        db_session.execute(
+            text("INSERT INTO extracted_fields (document_id, field_name, field_value) VALUES (:document_id, :field_name, :field_value)"),
+            [
+                {"document_id": document_id, "field_name": field_name, "field_value": field_value}
+                for field_name, field_value in extracted.items()
+            ]
+        )
+        DB_WRITE_SECONDS.labels("extracted_fields").observe(time.perf_counter() - started)
+    return extracted
+
+def match_document(document_id, extracted, dataset, db_session, ledger):
+    """Match one document against the dataset under the retention policy.
+    Returns ``(results, evaluated)``."""
+    with ledger.stage(document_id, "match"):
+        return match_documents(db_session, [extracted], dataset)[0]
+
+def prematch_documents(documents, dataset, db_session, ledger):
+    """Extract every document of a batch, then match them all against the
+    dataset in one N×M scoring pass.
+
+    Each extraction runs in its own savepoint. Returns
+    ``({document_id: (extracted, results, evaluated)}, failed_ids)``.
+    """
+    extracted, failed = {}, []
+    for document in documents:
+        document_id = document.get("document_id")
+        savepoint = db_session.begin_nested()
         try:
-            return datetime.strptime(value, fmt).date()
-        except (ValueError, TypeError):
-            continue
-    logging.warning(f"Failed to parse date: {value}")
-    return None
-
-def fuzzy_similarity(a, b):
-    """Return fuzzy match score between 0 and 100 using fuzzywuzzy"""
-    if not a or not b:
-        return 0
-    return fuzz.ratio(a.lower(), b.lower())
-
-def process_document(document, dataset_file, db_session):
+            fields = document.get("extracted") or load_extracted_fields(db_session, document_id)
+            if not fields and document.get("gcs_path"):
+                fields = extract_document(document, db_session, ledger)
+            savepoint.commit()
+            extracted[document_id] = fields
+        except Exception as e:
+            savepoint.rollback()
+            logging.error(f"Document {document_id} failed (extraction): {e}")
+            failed.append(document_id)
+    if not extracted:
+        return {}, failed
+
+    started = time.time()
+    clock = time.perf_counter()
+    document_ids = list(extracted)
+    # With blocking, the batch is scored against the union of the documents'
+    # candidates and each document keeps only its own
+    results = match_documents(db_session, [extracted[document_id] for document_id in document_ids], dataset)
+    # Every document waited for the whole pass
+    duration = time.perf_counter() - clock
+    for document_id in document_ids:
+        ledger.record(document_id, "match", started, duration)
+    logging.info(f"🧮 Matched {len(document_ids)} documents in one pass ({duration:.2f}s)")
+    matched = {
+        document_id: (extracted[document_id], records, evaluated)
+        for document_id, (records, evaluated) in zip(document_ids, results)
+    }
+    return matched, failed
+
+def process_document(document, dataset_file, db_session, commit=True, dataset=None, ledger=None, matched=None):
+    """Extract (if needed), match and persist one document.
+
+    ``dataset`` is the load_dataset_snapshot of dataset_records, loaded here
+    when not given.
+    ``matched`` is the document's ``(extracted, results, evaluated)`` from
+    prematch_documents, which skips extraction and matching here.
+    With ``commit=False`` the caller commits, e.g. once per Pub/Sub message;
+    the document's writes then run in a savepoint so a failure only rolls
+    back this document, and the caller flushes ``ledger`` before committing.
+    The document ends up with status "completed" or "failed".
+    """
     document_id = document.get("document_id")
+    ledger = ledger or StageLedger()
+    savepoint = None if commit else db_session.begin_nested()
     try:
-        dataset_rows = db_session.execute("SELECT * FROM dataset_records").fetchall()
-        for idx, row in dataset_rows.iterrows():
-            # Dataset fields
-            dataset_name = row.get("Dataset_Name")
-            dataset_doa = ensure_date(row.get("Dataset_DOA"))
-            dataset_dob = ensure_date(row.get("Dataset_DOB"))
-            dataset_referral = row.get("Dataset_Referral", "")
-
-            # Extracted fields (replace with your extraction logic)
-            extracted_name = row.get("Extracted_Name", "")
-            extracted_doa = ensure_date(row.get("Extracted_DOA"))
-            extracted_dob = ensure_date(row.get("Extracted_DOB"))
-            extracted_referral = row.get("Extracted_Referral", "")
-
-       # Compute fuzzy scores and matches
-            name_score = fuzzy_similarity(dataset_name, extracted_name)
-            doa_match = dataset_doa == extracted_doa
-            dob_match = dataset_dob == extracted_dob
-            referral_score = fuzzy_similarity(dataset_referral, extracted_referral)
-            referral_match = referral_score > 80  # 80% match for referral
-
-            if name_score > 80 and doa_match and dob_match:
-                match_status = "Exact Match"
-            elif name_score > 70 or doa_match or dob_match:
-                match_status = "Partial Match"
-            else:
-                match_status = "Mismatch"
-
-            # Insert into database
-
-            db_session.execute(
-                text("""
-                    INSERT INTO matches 
-                    (document_id, dataset_index, dataset_name, dataset_doa, dataset_dob, dataset_referral,
-                    extracted_name, extracted_doa, extracted_dob, extracted_referral,
-                    name_score, doa_match, dob_match, referral_score, referral_match, match_status)
-                    VALUES 
-                    (:document_id, :dataset_index, :dataset_name, :dataset_doa, :dataset_dob, :dataset_referral,
-                    :extracted_name, :extracted_doa, :extracted_dob, :extracted_referral,
-                    :name_score, :doa_match, :dob_match, :referral_score, :referral_match, :match_status)
-                """),
-                {
-                    "document_id": document_id,
-                    "dataset_index": idx,
-                    "dataset_name": dataset_name,
-                    "dataset_doa": dataset_doa,
-                    "dataset_dob": dataset_dob,
-                    "dataset_referral": dataset_referral,
-                    "extracted_name": extracted_name,
-                    "extracted_doa": extracted_doa,
-                    "extracted_dob": extracted_dob,
-                    "extracted_referral": extracted_referral,
-                    "name_score": name_score,
-                    "doa_match": doa_match,
-                    "dob_match": dob_match,
-                    "referral_score": referral_score,
-                    "referral_match": referral_match,
-                    "match_status": match_status,
-                }
-            )
+        if dataset is None:
+            dataset = load_dataset_snapshot(db_session)
+        if matched is not None:
+            extracted, results, evaluated = matched
+        else:
+            extracted = document.get("extracted") or load_extracted_fields(db_session, document_id)
+            if not extracted and document.get("gcs_path"):
+                extracted = extract_document(document, db_session, ledger)
+            # Persist only the rows kept by the retention policy, and how many were dropped
+            results, evaluated = match_document(document_id, extracted, dataset, db_session, ledger)
 
-        db_session.commit()
+        with ledger.stage(document_id, "persist"):
+            writer = MatchWriter(db_session)
+            for result in results:
+                writer.add(match_params(document_id, result, extracted))
+            writer.flush()
+            db_session.merge(MatchStats(
+                document_id=document_id,
+                dataset_rows=len(dataset),
+                candidates_evaluated=evaluated,
+                candidates_discarded=evaluated - len(results),
+                rows_retained=len(results),
+                retention_top_k=MATCH_RETENTION_TOP_K,
+                retention_min_score=MATCH_RETENTION_MIN_SCORE,
+            ))
+            # The re-matcher picks up dataset rows added after this point
+            record_watermarks(db_session, [document_id], dataset.watermark)
+        set_document_status(db_session, [document_id], "completed")
+
+        if commit:
+            ledger.flush(db_session)
+            db_session.commit()
+        else:
+            savepoint.commit()
         logging.info(f"Document {document_id} processed successfully.")
     except SQLAlchemyError as e:
-        db_session.rollback()
+        (savepoint or db_session).rollback()
         logging.error(f"Document {document_id} failed (DB error): {e}")
+        mark_failed(db_session, document_id, commit, ledger)
     except Exception as e:
+        (savepoint or db_session).rollback()
         logging.error(f"Document {document_id} failed (Unexpected error): {e}")
+        mark_failed(db_session, document_id, commit, ledger)
+
+def mark_failed(db_session, document_id, commit, ledger):
+    set_document_status(db_session, [document_id], "failed")
+    if commit:
+        ledger.flush(db_session)
+        db_session.commit()
+
+def run_rematch(db_session, options):
+    """Run a queued incremental re-match (POST /rematch, upload_dataset).
+
+    It commits batch by batch and resumes from the watermarks, so a failure
+    is logged and the request acked rather than redelivered.
+    """
+    try:
+        totals = rematch(
+            db_session,
+            options.get("batch_size") or REMATCH_BATCH_DOCUMENTS,
+            options.get("max_batches"),
+        )
+        logging.info(f"🔄 Re-match finished: {totals}")
+    except Exception as e:
+        db_session.rollback()
+        logging.error(f"❌ Re-match failed (resumable via POST /rematch): {e}")
 
 # ------------------- Pub/Sub Callback -------------------
-def callback(message):
-    logging.info(f"📩 Received message: {message.data}")
+def handle_batch(messages):
+    """Process a batch of Pub/Sub messages with one session and one dataset load.
+
+    Depending on MATCH_COMMIT_MODE the batch is committed per document, per
+    message or once for the whole batch; messages are acked only after the
+    commit covering them. Re-match requests run after the documents.
+    """
+    received = time.time()
+    db_session = SessionLocal()
+    ledger = StageLedger()
     try:
-        batch = json.loads(message.data)
-        db_session = SessionLocal()
-        for document in batch.get("documents", []):
-            dataset_file = batch.get("dataset_file")
-            if not dataset_file or not os.path.exists(dataset_file):
-                logging.warning(f"Dataset file missing or not found: {dataset_file}")
-                continue
-            process_document(document, dataset_file, db_session)
+        parsed = []
+        for message in messages:
+            logging.info(f"📩 Received message: {message.data}")
+            try:
+                parsed.append((message, json.loads(message.data)))
+            except ValueError as e:
+                logging.error(f"Dropping malformed message {message.message_id}: {e}")
+                message.ack()
+        rematches = [(message, batch) for message, batch in parsed if "rematch" in batch]
+        parsed = [(message, batch) for message, batch in parsed if "rematch" not in batch]
+
+        # Mark the whole batch in one round trip; time spent queued since publish
+        documents = [document for _, batch in parsed for document in batch.get("documents", [])]
+        set_document_status(db_session, [d["document_id"] for d in documents if d.get("document_id") is not None], "processing")
+        db_session.commit()
+        for _, batch in parsed:
+            if batch.get("enqueued_at"):
+                for document in batch.get("documents", []):
+                    if document.get("document_id") is None:
+                        continue
+                    ledger.record(document["document_id"], "queue_wait", batch["enqueued_at"], received - batch["enqueued_at"])
+
+        # A batch of re-match requests alone needs no dataset here
+        dataset = load_dataset_snapshot(db_session) if parsed else None
+
+        # The whole batch shares one N×M scoring pass; extracted fields are
+        # committed first in "document" mode so one document's rollback
+        # can't discard another's
+        matched, failed = {}, []
+        if len(documents) > 1:
+            matched, failed = prematch_documents(
+                [d for d in documents if d.get("document_id") is not None], dataset, db_session, ledger
+            )
+            if MATCH_COMMIT_MODE == "document":
+                db_session.commit()
+
+        settled = []
+        for message, batch in parsed:
+            for document in batch.get("documents", []):
+                if document.get("document_id") in failed:
+                    mark_failed(db_session, document["document_id"], MATCH_COMMIT_MODE == "document", ledger)
+                    continue
+                process_document(
+                    document,
+                    batch.get("dataset_file"),
+                    db_session,
+                    commit=MATCH_COMMIT_MODE == "document",
+                    dataset=dataset,
+                    ledger=ledger,
+                    matched=matched.get(document.get("document_id")),
+                )
+            if MATCH_COMMIT_MODE == "message":
+                ledger.flush(db_session)
+                db_session.commit()
+            if MATCH_COMMIT_MODE == "batch":
+                settled.append(message)
+            else:
+                message.ack()
+        if settled:
+            ledger.flush(db_session)
+            db_session.commit()
+            for message in settled:
+                message.ack()
+
+        for message, batch in rematches:
+            run_rematch(db_session, batch["rematch"] or {})
+            message.ack()
     finally:
         db_session.close()
-    message.ack()
+
+def callback(message):
+    handle_batch([message])
 
 # ------------------- Main Listener -------------------
-def main():
+def run_worker(subscriber=None, metrics_port=WORKER_METRICS_PORT):
+    """Run one flow-controlled, batching subscriber until interrupted."""
+    if metrics_port:
+        start_metrics_server(metrics_port)
+        logging.info(f"📈 Metrics on :{metrics_port}/metrics")
+    if DOCUMENTAI_WARMUP:
+        warm_up(LOCATION)
+    subscriber = subscriber or pubsub_v1.SubscriberClient()
+    subscription_path = subscriber.subscription_path(PROJECT_ID, SUBSCRIPTION_ID)
+    batcher = MessageBatcher(handle_batch)
+    streaming_pull_future = subscribe(subscriber, subscription_path, batcher)
     logging.info("👂 Worker listening for batch messages...")
-    streaming_pull_future = subscriber.subscribe(subscription_path, callback=callback)
     try:
         streaming_pull_future.result()
     except KeyboardInterrupt:
         streaming_pull_future.cancel()
         logging.info("Worker stopped.")
+    finally:
+        batcher.stop()
+
+def main():
+    if WORKER_PROCESSES <= 1:
+        run_worker()
+        return
+
+    # One subscriber per process so matching can use every core
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_worker,
+            kwargs={"metrics_port": WORKER_METRICS_PORT + i if WORKER_METRICS_PORT else 0},
+            name=f"worker-{i}",
+        )
+        for i in range(WORKER_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
 
 if __name__ == "__main__":
     main()